@@ -0,0 +1,101 @@
+"""
+Benchmark: cold-client time to first byte with the session handshake eager,
+lazy or in the background.
+
+By default the client talks to a local server that adds ``--latency`` of
+delay to every response, standing in for the round trip (and TLS handshake)
+to perplexity.ai. ``--startup-work`` simulates what an application does
+between creating the client and issuing its first search, e.g. MCP server
+start-up; a background handshake overlaps with it. Pass ``--live`` to measure
+against the real service instead.
+
+Usage:
+    pip install -e . && python benchmarks/bench_handshake.py [--latency 0.15] [--startup-work 0.2]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from perplexity import Client
+
+MODES = ("eager", "lazy", "background")
+
+
+def make_server(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def _reply(self, content_type: str, body: bytes) -> None:
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            self._reply("application/json", b"{}")
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            body = b'data: {"blocks": []}\r\n\r\nevent: end_of_stream\r\n\r\n'
+            self._reply("text/event-stream", body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def cold_start(mode: str, startup_work: float) -> tuple:
+    """Return (construction time, time to first streamed byte) in seconds."""
+    start = time.perf_counter()
+    client = Client(handshake=mode)
+    constructed = time.perf_counter() - start
+
+    time.sleep(startup_work)
+    with client.search("What is Python?", stream=True) as stream:
+        next(stream, None)
+    return constructed, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency", type=float, default=0.15, help="simulated RTT in seconds")
+    parser.add_argument("--startup-work", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="measure against perplexity.ai")
+    args = parser.parse_args()
+
+    if args.live:
+        endpoints = None
+        print("target: perplexity.ai (live)")
+    else:
+        server = make_server(args.latency)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        endpoints = (
+            patch("perplexity.protocol.ENDPOINT_AUTH_SESSION", f"{base}/api/auth/session"),
+            patch("perplexity.protocol.ENDPOINT_SSE_ASK", f"{base}/rest/sse/perplexity_ask"),
+        )
+        print(f"target: local server, {args.latency * 1000:.0f} ms simulated latency")
+    print(f"startup work before first search: {args.startup_work * 1000:.0f} ms")
+
+    for mode in MODES:
+        timings = []
+        for _ in range(args.repeat):
+            if endpoints:
+                with endpoints[0], endpoints[1]:
+                    timings.append(cold_start(mode, args.startup_work))
+            else:
+                timings.append(cold_start(mode, args.startup_work))
+        construct = statistics.median(t[0] for t in timings) * 1000
+        ttfb = statistics.median(t[1] for t in timings) * 1000
+        print(f"handshake={mode:<12} construct {construct:>8.1f} ms   first byte {ttfb:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: the sans-IO search protocol core without a network.
+
+Feeds a synthetic cumulative answer stream through ``ResponseParser`` in each
+streaming mode, exactly as the sync and async clients do, and times request
+construction.
+
+Usage:
+    pip install -e . && python benchmarks/bench_protocol.py [--events 400] [--chunk-size 16384]
+"""
+
+import argparse
+import time
+from typing import List, Union
+
+from bench_sse import build_stream, split_chunks
+
+from perplexity import codec
+from perplexity.protocol import ResponseParser, SearchProtocol
+
+
+def run_parser(chunks: List[bytes], stream: Union[bool, str]) -> int:
+    parser = ResponseParser(stream)
+    outputs = 0
+    for chunk in chunks:
+        outputs += len(parser.feed(chunk))
+        if parser.done:
+            break
+    # Blocking searches read one key of the final result, like most callers
+    parser.result().get("blocks")
+    return outputs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=400)
+    parser.add_argument("--answer-growth", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=16384)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = build_stream(args.events, args.answer_growth)
+    chunks = split_chunks(body, args.chunk_size)
+    print(f"stream: {args.events} events, {len(body) / 1e6:.1f} MB, {len(chunks)} chunks")
+    print(f"json backend: {codec.backend}")
+
+    for label, stream in (
+        ("stream=False", False),
+        ("stream=True", True),
+        ('stream="delta"', "delta"),
+    ):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run_parser(chunks, stream)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<16} {args.events / best:>10.0f} ev/s   {len(body) / best / 1e6:>8.1f} MB/s")
+
+    iterations = 10000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        SearchProtocol("What is Python?", sources=["web", "scholar"]).search_request([])
+    elapsed = time.perf_counter() - start
+    print(f"{'search_request':<16} {elapsed / iterations * 1e6:>10.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
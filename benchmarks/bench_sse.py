@@ -0,0 +1,114 @@
+"""
+Micro-benchmark: SSE framing and decoding throughput.
+
+Compares the previous ``iter_lines`` + ``str`` splitting loop used by the
+clients with the byte-level framer in ``perplexity.sse``, on a synthetic
+cumulative answer stream. No network access is needed.
+
+Usage:
+    pip install -e . && python benchmarks/bench_sse.py [--events 400] [--answer-growth 200] [--chunk-size 16384]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Iterator, List
+
+from perplexity import codec
+from perplexity.sse import iter_events
+
+
+def build_stream(events: int, growth: int) -> bytes:
+    """Build an SSE body whose events carry a growing cumulative answer."""
+    frames = []
+    for i in range(1, events + 1):
+        answer = "lorem ipsum " * (growth * i // 12)
+        payload = {
+            "backend_uuid": "00000000-0000-0000-0000-000000000000",
+            "blocks": [{"intended_usage": "ask_text", "markdown_block": {"answer": answer}}],
+            "status": "PENDING",
+        }
+        frames.append(f"event: message\r\ndata: {json.dumps(payload)}\r\n\r\n")
+    frames.append("event: end_of_stream\r\ndata: {}\r\n\r\n")
+    return "".join(frames).encode("utf-8")
+
+
+def split_chunks(body: bytes, chunk_size: int) -> List[bytes]:
+    return [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+
+def legacy_iter_lines(chunks: List[bytes], delimiter: bytes) -> Iterator[bytes]:
+    """Mirror of curl_cffi's Response.iter_lines(delimiter=...)."""
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.split(delimiter)
+        pending = (
+            lines.pop() if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1] else None
+        )
+        yield from lines
+    if pending is not None:
+        yield pending
+
+
+def legacy_loop(chunks: List[bytes], decode: bool) -> int:
+    count = 0
+    for chunk in legacy_iter_lines(chunks, b"\r\n\r\n"):
+        content = chunk.decode("utf-8") if isinstance(chunk, bytes) else str(chunk)
+        if "data: " in content:
+            data_str = content.split("data: ", 1)[1]
+            if decode:
+                json.loads(data_str)
+            count += 1
+        elif "event: end_of_stream" in content:
+            break
+    return count
+
+
+def framer_loop(chunks: List[bytes], decode: bool) -> int:
+    count = 0
+    for event in iter_events(chunks):
+        if event.event == "end_of_stream":
+            break
+        if event.data is not None:
+            if decode:
+                codec.loads(event.data)
+            count += 1
+    return count
+
+
+def measure(fn: Callable[[], int], repeat: int) -> float:
+    best = float("inf")
+    events = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = fn()
+        best = min(best, time.perf_counter() - start)
+    return events / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=400)
+    parser.add_argument("--answer-growth", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=16384)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = build_stream(args.events, args.answer_growth)
+    chunks = split_chunks(body, args.chunk_size)
+    print(f"stream: {args.events} events, {len(body) / 1e6:.1f} MB, {len(chunks)} chunks")
+    print(f"json backend: {codec.backend}")
+
+    for label, decode in (("framing only", False), ("framing + json decode", True)):
+        legacy = measure(lambda: legacy_loop(chunks, decode), args.repeat)
+        framer = measure(lambda: framer_loop(chunks, decode), args.repeat)
+        print(
+            f"{label:<24} legacy {legacy:>10.0f} ev/s   framer {framer:>10.0f} ev/s"
+            f"   x{framer / legacy:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
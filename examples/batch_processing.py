@@ -29,20 +29,26 @@ async def process_queries_sequential(queries):
     return results
 
 
-async def process_queries_concurrent(queries):
-    """Process queries concurrently."""
+async def process_queries_concurrent(queries, concurrency=3):
+    """Process queries concurrently, at most `concurrency` at a time."""
     print("\n[Method 2] Concurrent processing")
     print("-" * 60)
 
     client = await perplexity_async.Client()
     start = time()
 
-    # Create tasks for all queries
-    tasks = [client.search(q) for q in queries]
-
-    # Execute concurrently
-    print(f"Processing {len(queries)} queries concurrently...")
-    results = await asyncio.gather(*tasks)
+    # Results arrive as each search finishes; a failed search is reported
+    # without aborting the rest of the batch
+    print(f"Processing {len(queries)} queries, {concurrency} at a time...")
+    results = {}
+    async for query, response in client.search_many(
+        queries, concurrency=concurrency, return_exceptions=True
+    ):
+        if isinstance(response, Exception):
+            print(f"Failed: {query} ({response})")
+        else:
+            print(f"Done: {query}")
+        results[query] = response
 
     elapsed = time() - start
     print(f"Completed in {elapsed:.2f}s")
@@ -79,8 +85,9 @@ async def main():
 
     for i, query in enumerate(queries):
         print(f"\nQuery {i+1}: {query}")
-        if "answer" in results_con[i]:
-            print(f"Answer: {results_con[i]['answer'][:80]}...")
+        response = results_con[query]
+        if not isinstance(response, Exception) and "answer" in response:
+            print(f"Answer: {response['answer'][:80]}...")
 
     print("\n" + "=" * 60)
     print("Batch processing example completed!")
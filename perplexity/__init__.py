@@ -1,5 +1,28 @@
+from .breaker import CircuitBreakers
+from .cache import ResponseCache, UploadCache
 from .client import Client
+from .concurrency import AdaptiveConcurrency
 from .emailnator import Emailnator
+from .hooks import Hooks
 from .labs import LabsClient
+from .optimize import UploadOptimizer
+from .ratelimit import RateLimiter
+from .result import SearchResult
+from .retry import RetryPolicy
+from .timeouts import Timeouts
 
-__all__ = ["Client", "Emailnator", "LabsClient"]
+__all__ = [
+    "AdaptiveConcurrency",
+    "CircuitBreakers",
+    "Client",
+    "Emailnator",
+    "Hooks",
+    "LabsClient",
+    "RateLimiter",
+    "ResponseCache",
+    "RetryPolicy",
+    "SearchResult",
+    "Timeouts",
+    "UploadCache",
+    "UploadOptimizer",
+]
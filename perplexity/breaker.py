@@ -0,0 +1,215 @@
+"""
+Circuit breakers for the Perplexity AI endpoints.
+
+While Perplexity is degraded, every request would otherwise pay the full
+connect or timeout cost before failing. A ``CircuitBreaker`` counts
+consecutive failures of one endpoint (connection errors, timeouts and 5xx
+responses; other 4xx statuses show the service is up) and, past a threshold,
+opens: requests then fail at once with ``CircuitOpenError``. After the
+recovery time a bounded number of trial requests is let through (half-open);
+a success closes the circuit again and a failure re-opens it.
+
+``CircuitBreakers`` keeps one breaker per endpoint name and may be shared by
+several clients talking to the same service.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from .config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_HALF_OPEN_TRIALS, CIRCUIT_RECOVERY_TIME
+from .exceptions import CircuitOpenError, RequestTimeoutError, ValidationError
+from .hooks import Hooks
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one endpoint. Thread-safe.
+
+    Args:
+        endpoint: Endpoint name, used in errors and hook events
+        failure_threshold: Consecutive failures that open the circuit
+            (None never opens it)
+        recovery_time: Seconds the circuit stays open before trial requests
+        half_open_trials: Trial requests allowed in flight while half-open
+        hooks: Receives ``circuit`` events and the ``circuit.<endpoint>`` gauge
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> breaker = CircuitBreaker("ask", failure_threshold=3)
+        >>> breaker.allow()
+        >>> breaker.record(status_code=503)
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        failure_threshold: Optional[int] = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_time: float = CIRCUIT_RECOVERY_TIME,
+        half_open_trials: int = CIRCUIT_HALF_OPEN_TRIALS,
+        hooks: Optional[Hooks] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if failure_threshold is not None and failure_threshold < 1:
+            raise ValidationError("failure_threshold must be at least 1 or None")
+        if recovery_time < 0 or half_open_trials < 1:
+            raise ValidationError("recovery_time must be >= 0 and half_open_trials >= 1")
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_trials = half_open_trials
+        self.hooks = hooks
+        self.state = CLOSED
+        self.failures = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._opened_at = 0.0
+        self._trials = 0
+
+    def __repr__(self) -> str:
+        return f"CircuitBreaker({self.endpoint!r}, state={self.state!r})"
+
+    def allow(self) -> None:
+        """
+        Admit a request, or fail fast.
+
+        Every admitted request must be followed by exactly one ``record``.
+
+        Raises:
+            CircuitOpenError: While open, or half-open with all trials in flight
+        """
+        previous = None
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self._opened_at + self.recovery_time - self._clock()
+                if retry_in > 0:
+                    raise CircuitOpenError(
+                        f"Circuit for '{self.endpoint}' is open after {self.failures} "
+                        f"consecutive failures; retry in {retry_in:.1f}s",
+                        endpoint=self.endpoint,
+                        retry_in=retry_in,
+                    )
+                previous = self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_trials:
+                    raise CircuitOpenError(
+                        f"Circuit for '{self.endpoint}' is half-open and probing",
+                        endpoint=self.endpoint,
+                    )
+                self._trials += 1
+        self._report(previous)
+
+    def record(
+        self, status_code: Optional[int] = None, error: Optional[BaseException] = None
+    ) -> None:
+        """
+        Record the outcome of an admitted request.
+
+        Args:
+            status_code: Response status, if a response arrived
+            error: Exception raised instead, if any. Cancellation and the
+                search's own deadline only release the request's slot.
+        """
+        failed: Optional[bool]
+        if error is None:
+            failed = status_code is not None and status_code >= 500
+        elif isinstance(error, Exception) and not (
+            isinstance(error, RequestTimeoutError) and error.phase == "deadline"
+        ):
+            failed = True
+        else:
+            failed = None  # no verdict on the endpoint's health
+
+        previous = None
+        with self._lock:
+            if self.state == HALF_OPEN and self._trials:
+                self._trials -= 1
+            if failed is None:
+                return
+            if not failed:
+                self.failures = 0
+                if self.state != CLOSED:
+                    previous = self._transition(CLOSED)
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN or (
+                    self.failure_threshold is not None and self.failures >= self.failure_threshold
+                ):
+                    self._opened_at = self._clock()
+                    if self.state != OPEN:
+                        previous = self._transition(OPEN)
+        self._report(previous)
+
+    def _transition(self, state: str) -> str:
+        """Switch state with the lock held; returns the previous state."""
+        previous, self.state = self.state, state
+        self._trials = 0
+        return previous
+
+    def _report(self, previous: Optional[str]) -> None:
+        """Tell the hooks about a state change, outside the lock."""
+        if previous is None or self.hooks is None:
+            return
+        state = self.state
+        self.hooks.emit("circuit", endpoint=self.endpoint, state=state, previous=previous)
+        self.hooks.gauge(f"circuit.{self.endpoint}", state)
+
+
+class CircuitBreakers:
+    """
+    One ``CircuitBreaker`` per endpoint, created on first use.
+
+    Args:
+        failure_threshold: Consecutive failures that open a circuit (None never opens)
+        recovery_time: Seconds a circuit stays open before trial requests
+        half_open_trials: Trial requests allowed in flight while half-open
+        hooks: Receives every breaker's state changes
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> breakers = CircuitBreakers(failure_threshold=3, recovery_time=10)
+        >>> client = Client(breakers=breakers)
+        >>> breakers["ask"].state
+        'closed'
+    """
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_time: float = CIRCUIT_RECOVERY_TIME,
+        half_open_trials: int = CIRCUIT_HALF_OPEN_TRIALS,
+        hooks: Optional[Hooks] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        # Fail on bad settings now rather than on the first request
+        CircuitBreaker("", failure_threshold, recovery_time, half_open_trials)
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_trials = half_open_trials
+        self.hooks = hooks
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def __getitem__(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    endpoint,
+                    self.failure_threshold,
+                    self.recovery_time,
+                    self.half_open_trials,
+                    hooks=self.hooks,
+                    clock=self._clock,
+                )
+            return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Current state of every breaker created so far."""
+        with self._lock:
+            return {name: breaker.state for name, breaker in self._breakers.items()}
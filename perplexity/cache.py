@@ -0,0 +1,545 @@
+"""
+Response cache for Perplexity AI searches.
+
+Identical searches are common (the same question asked by many users or
+retried by a batch), and each one otherwise costs a full round trip on the
+answer stream. A ``ResponseCache`` attached to a client keys completed
+answers on the normalised ``(query, mode, model, sources, language)`` of the
+search and serves repeats without touching the network, the quota or the
+rate limiter. Searches whose answer depends on more than those parameters
+(incognito, follow-ups and searches with attachments) are never cached, nor
+are answers cut short by an error, a deadline or an early ``close()``.
+
+The cache stores the raw final payload of the answer stream in a backend,
+any object with these methods (values are bytes, keys short strings):
+
+- ``get(key)``: the stored value, or None if missing or expired
+- ``set(key, value, ttl)``: store a value for ``ttl`` seconds
+- ``delete(key)`` and ``clear()``
+
+``MemoryCache`` is the in-process LRU backend used by default; ``DiskCache``
+keeps entries in a SQLite database shared by processes and restarts.
+
+An ``UploadCache`` does the same for attachments: it maps the content hash,
+filename and MIME type of a file to the URL it was uploaded to, so attaching
+the same file again costs no upload. Its keys start with ``upload:``, so it
+may share a backend with a ``ResponseCache``.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import codec
+from .config import (
+    CACHE_COMPRESSION_LEVEL,
+    CACHE_DISK_MAX_BYTES,
+    CACHE_DISK_PATH,
+    CACHE_MAX_BYTES,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL,
+    MODEL_MAPPINGS,
+    UPLOAD_CACHE_TTL,
+)
+from .exceptions import ValidationError
+from .logger import get_logger
+from .protocol import ENHANCED_MODES
+
+logger = get_logger("cache")
+
+# A disk cache hit only records its access time when the last record is older than
+# this, so hot entries do not take the write lock on every read
+_TOUCH_INTERVAL = 10.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+"""
+
+
+def _check_positive(**values: int) -> None:
+    for name, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValidationError(f"{name} must be a positive integer, got {value!r}")
+
+
+def _check_value(value: Any) -> None:
+    # A dict or str would only fail later, inside zlib or the size accounting
+    if not isinstance(value, bytes):
+        raise TypeError(f"Cache values must be bytes, got {type(value).__name__}")
+
+
+def search_key(
+    query: str,
+    mode: str = "auto",
+    model: Optional[str] = None,
+    sources: Optional[List[str]] = None,
+    language: str = "en-US",
+) -> str:
+    """
+    Cache key of a search.
+
+    Searches that send the same request share a key: the query's whitespace
+    and Unicode form are normalised, the model is resolved to the one the
+    mode actually uses, sources are deduplicated and sorted, and the
+    language tag is compared case-insensitively.
+
+    Returns:
+        Hex digest identifying the search
+    """
+    normalised = [
+        unicodedata.normalize("NFC", " ".join(query.split())),
+        mode,
+        MODEL_MAPPINGS.get(mode, {}).get(model, "turbo"),
+        sorted(set(sources if sources is not None else ["web"])),
+        language.lower(),
+    ]
+    return hashlib.sha256(codec.dumpb(normalised)).hexdigest()
+
+
+def request_key(protocol: Any) -> Optional[str]:
+    """
+    Key of a search that only depends on its cacheable parameters.
+
+    Args:
+        protocol: ``SearchProtocol`` of the search
+
+    Returns:
+        ``search_key`` of the search, or None for incognito searches,
+        follow-ups and searches with attachments
+    """
+    if protocol.incognito or protocol.follow_up or protocol.uploads:
+        return None
+    return search_key(
+        protocol.query, protocol.mode, protocol.model, protocol.sources, protocol.language
+    )
+
+
+def upload_key(upload: Any) -> str:
+    """
+    Cache key of an attachment.
+
+    Args:
+        upload: ``FileUpload`` of the attachment
+
+    Returns:
+        ``upload:`` followed by a hex digest of the file's contents, filename
+        and MIME type
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    identity = codec.dumpb([digest.hexdigest(), upload.filename, upload.content_type])
+    return "upload:" + hashlib.sha256(identity).hexdigest()
+
+
+class MemoryCache:
+    """
+    Thread-safe in-memory LRU backend with per-entry expiry.
+
+    Bounded both by entry count and by approximate size (key plus value
+    bytes); the least recently used entries are evicted first.
+
+    Args:
+        max_entries: Most entries kept
+        max_bytes: Most bytes kept; larger values are not stored at all
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> cache = ResponseCache(MemoryCache(max_entries=500, max_bytes=16 * 2**20))
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        _check_positive(max_entries=max_entries, max_bytes=max_bytes)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def __repr__(self) -> str:
+        return f"MemoryCache(entries={len(self)}, size={self.size})"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Stored value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """
+        Store a value for ``ttl`` seconds, evicting the least recently used entries.
+
+        Raises:
+            TypeError: If the value is not bytes
+        """
+        _check_value(value)
+        size = len(key) + len(value)
+        with self._lock:
+            self._remove(key)
+            if ttl <= 0 or size > self.max_bytes:
+                return
+            self._entries[key] = (value, self._clock() + ttl)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        """Forget a value; unknown keys are ignored."""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Forget every value."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(key) + len(entry[0])
+
+
+class DiskCache:
+    """
+    SQLite backend shared by threads, processes and restarts.
+
+    Values are zlib-compressed in a database in WAL mode, so readers in any
+    number of processes never wait for a writer, and writers wait up to
+    ``timeout`` seconds for each other. Once the stored size exceeds
+    ``max_bytes`` the least recently used entries are evicted; expired
+    entries are dropped when read, when over budget and by ``compact``.
+    Errors while reading or writing are logged and count as misses, so a
+    damaged or locked cache never fails a search.
+
+    Args:
+        path: Database file (``CACHE_DISK_PATH`` if None); missing parent
+            directories are created
+        max_bytes: Size budget of the stored, compressed entries
+        compress_level: zlib level from 0 (store) to 9
+        timeout: Seconds to wait for another writer's lock
+        clock: Wall clock, shared by all processes; replaceable in tests
+
+    Example:
+        >>> cache = ResponseCache(DiskCache("/var/cache/perplexity.sqlite3"))
+        >>> client = Client(cache=cache)  # every worker pointing at the file shares it
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = CACHE_DISK_MAX_BYTES,
+        compress_level: int = CACHE_COMPRESSION_LEVEL,
+        timeout: float = 5.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        _check_positive(max_bytes=max_bytes)
+        if isinstance(compress_level, bool) or compress_level not in range(10):
+            raise ValidationError(f"compress_level must be 0 to 9, got {compress_level!r}")
+        self.path = str(path if path is not None else CACHE_DISK_PATH)
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.timeout = timeout
+        self._clock = clock
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        # WAL is a property of the database file, so this sets it up for every process
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"DiskCache({self.path!r}, max_bytes={self.max_bytes})"
+
+    def __len__(self) -> int:
+        row = (
+            self._connect()
+            .execute("SELECT COUNT(*) FROM entries WHERE expires_at > ?", (self._clock(),))
+            .fetchone()
+        )
+        return int(row[0])
+
+    @property
+    def size(self) -> int:
+        """Bytes taken by the stored entries (keys and compressed values)."""
+        row = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Stored value, or None if missing, expired or unreadable."""
+        now = self._clock()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at <= now:
+                with self._write() as conn:
+                    conn.execute(
+                        "DELETE FROM entries WHERE key = ? AND expires_at <= ?", (key, now)
+                    )
+                return None
+            if now - accessed_at > _TOUCH_INTERVAL:
+                with self._write() as conn:
+                    conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return zlib.decompress(value)
+        except (sqlite3.Error, zlib.error) as e:
+            logger.warning(f"Disk cache read of {key} failed: {e}")
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """
+        Store a value for ``ttl`` seconds, evicting entries over the size budget.
+
+        Raises:
+            TypeError: If the value is not bytes
+        """
+        _check_value(value)
+        blob = zlib.compress(value, self.compress_level)
+        size = len(key) + len(blob)
+        if ttl <= 0 or size > self.max_bytes:
+            self.delete(key)
+            return
+        now = self._clock()
+        try:
+            with self._write() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, expires_at, accessed_at, value) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, size, now + ttl, now, blob),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache write of {key} failed: {e}")
+
+    def delete(self, key: str) -> None:
+        """Forget a value; unknown keys are ignored."""
+        try:
+            with self._write() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache delete of {key} failed: {e}")
+
+    def clear(self) -> None:
+        """Forget every value."""
+        try:
+            with self._write() as conn:
+                conn.execute("DELETE FROM entries")
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache clear failed: {e}")
+
+    def compact(self) -> int:
+        """
+        Drop expired entries, enforce the size budget and give the freed space
+        back to the file system.
+
+        Safe to run while other processes use the cache; it waits for their
+        writes like any writer.
+
+        Returns:
+            Number of entries removed, 0 if the cache could not be compacted
+        """
+        try:
+            with self._write() as conn:
+                before = conn.total_changes
+                self._evict(conn, self._clock())
+                removed = conn.total_changes - before
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache compaction failed: {e}")
+            return 0
+        return removed
+
+    def close(self) -> None:
+        """Close the calling thread's connection; later calls reopen it."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use and after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in a transaction holding the database's write lock."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then the least recently used ones over the budget."""
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+        conn.execute(
+            """
+            DELETE FROM entries WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (
+                        ORDER BY accessed_at DESC, rowid DESC
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                    ) AS kept
+                    FROM entries
+                )
+                WHERE kept > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+
+
+class ResponseCache:
+    """
+    Caches completed answers, shareable between clients.
+
+    A search is cached for the TTL named after its mode if there is one,
+    then for ``"enhanced"`` (pro, reasoning and deep research), then for
+    ``"*"``; modes without a TTL are not cached.
+
+    Args:
+        backend: Where answers are stored (``MemoryCache()`` if None)
+        ttl: Entry name to seconds an answer stays fresh; defaults to ``CACHE_TTL``
+
+    Example:
+        >>> cache = ResponseCache(ttl={"auto": 600, "enhanced": 3600})
+        >>> client = Client(cache=cache)
+        >>> client.search("What is Python?")  # network
+        >>> client.search("what is  Python?")  # cache
+    """
+
+    def __init__(self, backend: Any = None, ttl: Optional[Dict[str, float]] = None):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = dict(ttl if ttl is not None else CACHE_TTL)
+        for name, seconds in self.ttl.items():
+            if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0:
+                raise ValidationError(f"Cache TTL for '{name}' must be a non-negative number")
+
+    def __repr__(self) -> str:
+        return f"ResponseCache({self.backend!r}, ttl={self.ttl!r})"
+
+    def ttl_for(self, mode: str) -> float:
+        """Seconds answers in a mode stay fresh (0 if the mode is not cached)."""
+        for name in (mode, "enhanced" if mode in ENHANCED_MODES else None, "*"):
+            if name in self.ttl:
+                return self.ttl[name]
+        return 0.0
+
+    def key(self, protocol: Any) -> Optional[str]:
+        """
+        Cache key of a search, or None if it must bypass the cache.
+
+        Args:
+            protocol: ``SearchProtocol`` of the search
+        """
+        if not self.ttl_for(protocol.mode):
+            return None
+        return request_key(protocol)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached final payload of a search, or None."""
+        return self.backend.get(key)
+
+    def put(self, key: str, mode: str, payload: bytes) -> None:
+        """Store the final payload of a completed search."""
+        ttl = self.ttl_for(mode)
+        if ttl:
+            self.backend.set(key, payload, ttl)
+
+    def clear(self) -> None:
+        """Forget every cached answer."""
+        self.backend.clear()
+
+
+class UploadCache:
+    """
+    Remembers where attachments were uploaded, shareable between clients.
+
+    Uploaded files are private to the account that uploaded them, so only
+    share an upload cache between clients signed in to the same account.
+
+    Args:
+        backend: Where URLs are stored (``MemoryCache()`` if None); may be the
+            backend of a ``ResponseCache``
+        ttl: Seconds an uploaded file's URL is reused
+
+    Example:
+        >>> client = Client(cookies, upload_cache=UploadCache(DiskCache()))
+        >>> client.search("Summarise this", files={"report.pdf": data})  # uploads
+        >>> client.search("List its authors", files={"report.pdf": data})  # reuses the URL
+    """
+
+    def __init__(self, backend: Any = None, ttl: float = UPLOAD_CACHE_TTL):
+        if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValidationError(f"Upload cache TTL must be a positive number, got {ttl!r}")
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = ttl
+
+    def __repr__(self) -> str:
+        return f"UploadCache({self.backend!r}, ttl={self.ttl!r})"
+
+    def key(self, upload: Any) -> str:
+        """Cache key of an attachment (see ``upload_key``)."""
+        return upload_key(upload)
+
+    def get(self, key: str) -> Optional[str]:
+        """URL an identical file was uploaded to, or None."""
+        url = self.backend.get(key)
+        return url.decode("utf-8") if url is not None else None
+
+    def put(self, key: str, url: str) -> None:
+        """Remember the URL a file was uploaded to."""
+        self.backend.set(key, url.encode("utf-8"), self.ttl)
+
+    def clear(self) -> None:
+        """Forget every uploaded file (and anything else in a shared backend)."""
+        self.backend.clear()
@@ -1,38 +1,55 @@
-import json
-import mimetypes
 import random
 import re
 import sys
-from typing import Any, Dict, Generator, List, Optional, Union
-from uuid import uuid4
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from curl_cffi import CurlMime, requests
+from curl_cffi import requests
+from curl_cffi.requests.exceptions import Timeout as CurlTimeout
 
 from .config import (
+    BATCH_CONCURRENCY,
     DEFAULT_HEADERS,
-    ENDPOINT_AUTH_SESSION,
     ENDPOINT_AUTH_SIGNIN,
     ENDPOINT_SSE_ASK,
-    ENDPOINT_UPLOAD_URL,
-    MODEL_MAPPINGS,
     SIGNIN_URL_PATTERN,
+    UPLOAD_CONCURRENCY,
 )
+from .breaker import CircuitBreakers
+from .cache import ResponseCache, UploadCache, request_key
+from .coalesce import Flight, Flights, Subscription
+from .concurrency import AdaptiveConcurrency
 from .emailnator import Emailnator
-from .exceptions import (
-    AccountCreationError,
-    AuthenticationError,
-    FileUploadError,
-    NetworkError,
-    RateLimitError,
-    ValidationError,
-)
+from .exceptions import AccountCreationError, RequestTimeoutError, ValidationError
+from .hooks import Hooks
 from .logger import get_logger
-from .utils import (
-    parse_nested_json_response,
-    validate_file_data,
-    validate_query_limits,
-    validate_search_params,
+from .optimize import UploadOptimizer
+from .protocol import (
+    FileData,
+    FileUpload,
+    HTTPRequest,
+    ResponseParser,
+    SearchProtocol,
+    check_search_status,
+    handshake_request,
+)
+from .ratelimit import RateLimiter
+from .result import SearchResult
+from .retry import RetryPolicy
+from .stream import ConflatingIterator, SearchStream
+from .timeouts import Timeouts
+from .transport import (
+    SessionPool,
+    abort_response,
+    close_response,
+    iter_chunks,
+    read_body,
+    request_kwargs,
+    send_timeout_error,
 )
+from .utils import validate_concurrency, validate_handshake
 
 logger = get_logger("client")
 
@@ -40,17 +57,75 @@ logger = get_logger("client")
 class Client:
     """
     A client for interacting with the Perplexity AI API.
+
+    A client may be shared between threads: quota counters are updated under a
+    lock and each request borrows a curl session of its own from a pool.
+
+    Args:
+        cookies: Perplexity account cookies, or None for an anonymous client
+        handshake: When to open the auth session: 'eager' (during construction,
+            the default), 'lazy' (on the first request) or 'background' (started
+            during construction without waiting for it). Requests issued before
+            the handshake completes wait for it, and it runs only once.
+        timeouts: Default time limits for every request (see ``Timeouts``)
+        retry: When to re-send a failed ask request; None (the default) sends
+            it once, ``RetryPolicy()`` retries with the default backoff
+        hooks: Instrumentation callbacks (see ``Hooks``)
+        rate_limiter: Token buckets every ask request draws from (see
+            ``RateLimiter``); pass the same limiter to several clients to share it
+        breakers: Per-endpoint circuit breakers (``CircuitBreakers()`` reporting to
+            ``hooks`` if None); requests to an endpoint whose circuit is open fail
+            at once with ``CircuitOpenError``
+        cache: Response cache for completed answers (see ``ResponseCache``); off if
+            None. Cache hits cost no request, quota or rate limiter token.
+        coalesce: Let identical searches in flight at the same time share one
+            answer stream (see ``perplexity.coalesce``); only searches a cache
+            could answer are coalesced
+        upload_cache: Reuses the URL of an attachment already uploaded with the
+            same contents, filename and MIME type (see ``UploadCache``); off if None
+        upload_concurrency: Most attachments of one search uploaded at once
+        upload_optimizer: Shrinks images and text documents before they are
+            uploaded (see ``UploadOptimizer``); off if None
     """
 
-    def __init__(self, cookies: Optional[Dict[str, str]] = None):
+    def __init__(
+        self,
+        cookies: Optional[Dict[str, str]] = None,
+        handshake: str = "eager",
+        timeouts: Optional[Timeouts] = None,
+        retry: Optional[RetryPolicy] = None,
+        hooks: Optional[Hooks] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        cache: Optional[ResponseCache] = None,
+        coalesce: bool = False,
+        upload_cache: Optional[UploadCache] = None,
+        upload_concurrency: int = UPLOAD_CONCURRENCY,
+        upload_optimizer: Optional[UploadOptimizer] = None,
+    ):
+        validate_handshake(handshake)
+        validate_concurrency(upload_concurrency, "upload_concurrency")
         if cookies is None:
             cookies = {}
+        self.timeouts = timeouts if timeouts is not None else Timeouts()
+        self.retry = retry if retry is not None else RetryPolicy(max_attempts=1)
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.rate_limiter = rate_limiter
+        self.breakers = breakers if breakers is not None else CircuitBreakers(hooks=self.hooks)
+        self.cache = cache
+        self.upload_cache = upload_cache
+        self.upload_concurrency = upload_concurrency
+        self.upload_optimizer = upload_optimizer
+        self._flights = Flights() if coalesce else None
         # Initialize an HTTP session with default headers and optional cookies
         self.session = requests.Session(
             headers=DEFAULT_HEADERS.copy(),
             cookies=cookies,
             impersonate="chrome",
         )
+        # Extra sessions for concurrent requests share the primary one's cookie jar
+        self._sessions = SessionPool(self.session, self._new_session)
+        self._quota_lock = threading.Lock()
 
         # Flags and counters for account and query management
         self.own = bool(cookies)  # Indicates if the client uses its own account
@@ -63,11 +138,15 @@ class Client:
         # Unique timestamp for session identification
         self.timestamp = format(random.getrandbits(32), "08x")
 
-        # Initialize session by making a GET request
-        try:
-            self.session.get(ENDPOINT_AUTH_SESSION)
-        except Exception as e:
-            logger.warning(f"Initial session handshake notice: {e}")
+        # Initialize session by making a GET request, now or on first use
+        self._handshake_lock = threading.Lock()
+        self._handshake_done = False
+        if handshake == "eager":
+            self._ensure_handshake()
+        elif handshake == "background":
+            threading.Thread(
+                target=self._ensure_handshake, name="perplexity-handshake", daemon=True
+            ).start()
 
     def create_account(self, cookies: Dict[str, str], max_attempts: int = 5) -> bool:
         """
@@ -92,19 +171,21 @@ class Client:
                 # Initialize Emailnator client
                 emailnator_cli = Emailnator(cookies)
 
+                self._ensure_handshake()
                 cookie_csrf = self.session.cookies.get_dict().get("next-auth.csrf-token", "")
                 csrf_token = cookie_csrf.split("%")[0] if cookie_csrf else ""
 
                 # Send a POST request to initiate account creation
-                resp = self.session.post(
-                    ENDPOINT_AUTH_SIGNIN,
-                    data={
-                        "email": emailnator_cli.email,
-                        "csrfToken": csrf_token,
-                        "callbackUrl": "https://www.perplexity.ai/",
-                        "json": "true",
-                    },
-                )
+                with self._sessions.session() as session:
+                    resp = session.post(
+                        ENDPOINT_AUTH_SIGNIN,
+                        data={
+                            "email": emailnator_cli.email,
+                            "csrfToken": csrf_token,
+                            "callbackUrl": "https://www.perplexity.ai/",
+                            "json": "true",
+                        },
+                    )
 
                 # Check if the response is successful
                 if resp.ok:
@@ -138,13 +219,15 @@ class Client:
         new_account_link = match.group(1)
 
         # Complete the account creation process
-        resp = self.session.get(new_account_link)
+        with self._sessions.session() as session:
+            resp = session.get(new_account_link)
         if not resp.ok:
             raise AccountCreationError(f"Failed to authenticate with callback link: {resp.status_code}")
 
         # Update query and file upload limits
-        self.copilot = 5
-        self.file_upload = 10
+        with self._quota_lock:
+            self.copilot = 5
+            self.file_upload = 10
 
         return True
 
@@ -154,12 +237,17 @@ class Client:
         mode: str = "auto",
         model: Optional[str] = None,
         sources: Optional[List[str]] = None,
-        files: Optional[Dict[str, Union[bytes, str]]] = None,
-        stream: bool = False,
+        files: Optional[Dict[str, FileData]] = None,
+        stream: Union[bool, str] = False,
         language: str = "en-US",
         follow_up: Optional[Dict[str, Any]] = None,
         incognito: bool = False,
-    ) -> Union[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
+        retain: str = "last",
+        timeouts: Optional[Timeouts] = None,
+        deadline: Optional[float] = None,
+        partial_ok: bool = False,
+        retry: Optional[RetryPolicy] = None,
+    ) -> Union[SearchResult, SearchStream]:
         """
         Executes a search query on Perplexity AI.
 
@@ -168,164 +256,480 @@ class Client:
         - mode: Search mode ('auto', 'pro', 'reasoning', 'deep research').
         - model: Specific model to use for the query.
         - sources: List of sources ('web', 'scholar', 'social').
-        - files: Dictionary of files to upload.
-        - stream: Whether to stream the response.
+        - files: Dictionary of files to upload: filename to contents (bytes or text),
+          a pathlib.Path, a binary file object or a buffer such as mmap. Files on
+          disk are streamed rather than loaded into memory.
+        - stream: Whether to stream the response. Pass "delta" to receive only the
+          newly appended answer text, steps and citations of each event, or
+          "latest" to receive only the newest snapshot whenever the consumer asks
+          for the next one (intermediate snapshots are dropped undecoded).
         - language: Language code (ISO 639).
         - follow_up: Information for follow-up queries.
         - incognito: Whether to enable incognito mode.
+        - retain: What a streamed search keeps after yielding each result: 'none',
+          'last' (default) or 'all' (debugging). Exposed as ``.retained``.
+        - timeouts: Time limits for this search, overriding the client's.
+        - deadline: Seconds the whole search (uploads and streaming included) may take.
+        - partial_ok: When the deadline hits a blocking search mid-answer, cancel the
+          transfer and return the latest snapshot (``partial`` set, with ``elapsed``
+          seconds and the ``steps`` reached) instead of raising. Requires a deadline.
+        - retry: Retry policy for this search, overriding the client's. Only the ask
+          request is re-sent, and never once the answer stream has started.
 
         Returns:
-        - Response dict or generator yielding response dicts if streaming.
-        """
-        if sources is None:
-            sources = ["web"]
-        if files is None:
-            files = {}
-
-        # Validate input parameters and query limits
-        validate_search_params(mode=mode, model=model, sources=sources, own_account=self.own)
-        if files:
-            validate_file_data(files)
-        validate_query_limits(
-            copilot_remaining=self.copilot,
-            file_upload_remaining=self.file_upload,
+        - SearchResult, or a SearchStream yielding SearchResult snapshots (or delta
+          dicts with stream="delta") if streaming. Use the stream in a ``with``
+          block (or call ``close()``) to release the connection when stopping early.
+
+        Raises:
+        - RequestTimeoutError: If a time limit is exceeded; ``phase`` names which.
+        """
+        protocol = SearchProtocol(
+            query,
             mode=mode,
-            files_count=len(files),
+            model=model,
+            sources=sources,
+            files=files,
+            stream=stream,
+            language=language,
+            follow_up=follow_up,
+            incognito=incognito,
+            own_account=self.own,
+            retain=retain,
+            timeouts=timeouts if timeouts is not None else self.timeouts,
+            deadline=deadline,
+            partial_ok=partial_ok,
         )
 
-        # Update query and file upload counters
-        if mode in ["pro", "reasoning", "deep research"]:
-            self.copilot = max(0, self.copilot - 1) if self.copilot != float("inf") else self.copilot
-        if files:
-            self.file_upload = (
-                max(0, self.file_upload - len(files))
-                if self.file_upload != float("inf")
-                else self.file_upload
+        key = self.cache.key(protocol) if self.cache is not None else None
+        if self.cache is not None and key is not None:
+            payload = self.cache.get(key)
+            self.hooks.emit("cache", hit=payload is not None, mode=mode)
+            if payload is not None:
+                parser, replayed = protocol.cached_parser(payload)
+                if stream:
+                    return SearchStream(iter(replayed), parser)
+                return parser.result()
+
+        flights = self._flights
+        flight_key = request_key(protocol) if flights is not None else None
+        if flights is not None and flight_key is not None:
+            return self._search_shared(flights, protocol, flight_key, key, retry)
+
+        resp = self._open(protocol, retry)
+        parser = protocol.response_parser(keep_final=key is not None)
+        chunks = iter_chunks(resp, protocol.timer)
+        close = partial(self._close_stream, resp, parser, key, mode)
+
+        def stream_response():
+            """
+            Generator for streaming responses.
+            """
+            for chunk in chunks:
+                yield from parser.feed(chunk)
+                if parser.done:
+                    return
+            yield from parser.close()
+
+        if stream == "latest":
+            # The reader thread releases the response once it stops reading
+            results = ConflatingIterator(
+                chunks,
+                parser,
+                abort=partial(abort_response, resp),
+                release=partial(close_response, resp),
             )
-
-        # Upload files and prepare the query payload
-        uploaded_files = []
-        for filename, file in files.items():
-            file_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-            file_size = len(file) if isinstance(file, (bytes, str)) else sys.getsizeof(file)
-            file_upload_resp = self.session.post(
-                ENDPOINT_UPLOAD_URL,
-                params={"version": "2.18", "source": "default"},
-                json={
-                    "content_type": file_type,
-                    "file_size": file_size,
-                    "filename": filename,
-                    "force_image": False,
-                    "source": "default",
-                },
+            return SearchStream(
+                results, parser, close=partial(self._cache_answer, key, mode, parser)
             )
-            if not file_upload_resp.ok:
-                raise FileUploadError(f"Failed to get upload URL: {file_upload_resp.status_code}")
-
-            file_upload_info = file_upload_resp.json()
-
-            # Upload the file to the server
-            mp = CurlMime()
-            for key, value in file_upload_info.get("fields", {}).items():
-                mp.addpart(name=key, data=value)
-            mp.addpart(
-                name="file",
-                content_type=file_type,
-                filename=filename,
-                data=file,
+        if stream:
+            return SearchStream(stream_response(), parser, close=close)
+
+        # Blocking searches only return the last snapshot, so intermediate
+        # events are framed but never decoded
+        try:
+            for chunk in chunks:
+                parser.feed(chunk)
+                if parser.done:
+                    break
+        except RequestTimeoutError as e:
+            return protocol.partial_result(parser, e)
+        finally:
+            close_response(resp)
+        parser.close()
+        self._cache_answer(key, mode, parser)
+
+        return parser.result()
+
+    def search_many(
+        self,
+        queries: Iterable[str],
+        max_workers: Union[int, AdaptiveConcurrency] = BATCH_CONCURRENCY,
+        ordered: bool = False,
+        **kwargs: Any,
+    ) -> Iterator[Tuple[str, SearchResult]]:
+        """
+        Runs several searches concurrently on a thread pool.
+
+        Parameters:
+        - queries: The search queries.
+        - max_workers: Maximum number of searches in flight at once, or an
+          AdaptiveConcurrency controller that adjusts it to the service's health.
+        - ordered: Yield results in the order of ``queries`` instead of as they complete.
+        - **kwargs: Options passed to search() for every query (streaming is not supported).
+
+        Returns:
+        - Iterator of (query, SearchResult) pairs. If a search fails its exception is
+          raised when its pair would have been yielded, and searches that have not
+          started yet are cancelled; the same happens when the caller stops early.
+        """
+        if not isinstance(max_workers, AdaptiveConcurrency):
+            validate_concurrency(max_workers, "max_workers")
+        if kwargs.get("stream"):
+            raise ValidationError("search_many() does not support streaming")
+
+        return self._search_many(list(queries), max_workers, ordered, kwargs)
+
+    def _search_many(
+        self,
+        queries: List[str],
+        max_workers: Union[int, AdaptiveConcurrency],
+        ordered: bool,
+        kwargs: Dict[str, Any],
+    ) -> Iterator[Tuple[str, SearchResult]]:
+        """
+        Generator behind search_many(); the pool only starts once iteration does.
+        """
+        if isinstance(max_workers, AdaptiveConcurrency):
+            controller: Optional[AdaptiveConcurrency] = max_workers
+            workers = max_workers.maximum
+        else:
+            controller, workers = None, max_workers
+        executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="perplexity-search",
+        )
+        stop = threading.Event()
+        futures: Dict[Future, str] = {}
+        try:
+            for query in queries:
+                if controller is None:
+                    future = executor.submit(self._search_one, query, kwargs)
+                else:
+                    future = executor.submit(self._search_in_slot, controller, stop, query, kwargs)
+                futures[future] = query
+            for future in futures if ordered else as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _search_one(self, query: str, kwargs: Dict[str, Any]) -> SearchResult:
+        """
+        Runs one search of a batch; search_many() rejects streaming, so it is blocking.
+        """
+        result = self.search(query, **kwargs)
+        assert isinstance(result, SearchResult)
+        return result
+
+    def _search_in_slot(
+        self,
+        controller: AdaptiveConcurrency,
+        stop: threading.Event,
+        query: str,
+        kwargs: Dict[str, Any],
+    ) -> SearchResult:
+        """
+        Runs one search of an adaptive batch once the controller grants a slot.
+        """
+        with controller.slot():
+            if stop.is_set():
+                # The batch was abandoned while this worker waited
+                raise CancelledError()
+            return self._search_one(query, kwargs)
+
+    def _open(self, protocol: SearchProtocol, retry: Optional[RetryPolicy]):
+        """
+        Charges the quota, uploads the attachments and returns the answer response.
+        """
+        # Validate and update query and file upload counters
+        with self._quota_lock:
+            self.copilot, self.file_upload = protocol.reserve_quota(self.copilot, self.file_upload)
+
+        self._ensure_handshake()
+
+        # Upload files, then send the query request
+        attachments = self._upload_files(protocol)
+        return (retry or self.retry).call(
+            partial(self._ask, protocol, attachments),
+            timer=protocol.timer,
+            hooks=self.hooks,
+            endpoint=ENDPOINT_SSE_ASK,
+        )
+
+    def _search_shared(
+        self,
+        flights: Flights,
+        protocol: SearchProtocol,
+        flight_key: str,
+        cache_key: Optional[str],
+        retry: Optional[RetryPolicy],
+    ) -> Union[SearchResult, SearchStream]:
+        """
+        Runs a search on the identical search's answer stream, leading it if there is none.
+        """
+        flight, subscription, leader = flights.join(
+            flight_key, protocol.timer.timeouts, keep_all=protocol.stream in (True, "delta")
+        )
+        if leader:
+            threading.Thread(
+                target=self._pump,
+                args=(flights, flight, protocol, retry, cache_key),
+                name="perplexity-flight",
+                daemon=True,
+            ).start()
+        else:
+            self.hooks.emit("coalesce", mode=protocol.mode, subscribers=len(flight.subscriptions))
+
+        parser = ResponseParser(protocol.stream, protocol.retain)
+        results = self._follow(flights, protocol, flight, subscription, parser)
+        if protocol.stream:
+            leave = partial(flights.leave, flight, subscription)
+            return SearchStream(results, parser, close=leave)
+        try:
+            for _ in results:
+                pass
+        except RequestTimeoutError as e:
+            return protocol.partial_result(parser, e)
+        return parser.result()
+
+    def _pump(
+        self,
+        flights: Flights,
+        flight: Flight,
+        protocol: SearchProtocol,
+        retry: Optional[RetryPolicy],
+        cache_key: Optional[str],
+    ) -> None:
+        """
+        Sends a shared search on a background thread and hands its answer stream to
+        the subscribers.
+        """
+        try:
+            resp = self._open(protocol, retry)
+        except Exception as e:
+            flights.finish(flight, e)
+            return
+        if not flights.attach(flight, partial(abort_response, resp)):
+            # Every search left while the request was being sent
+            close_response(resp)
+            return
+
+        flight.timer.start_stream()
+        error = None
+        try:
+            for chunk in iter_chunks(resp, flight.timer):
+                if flights.feed(flight, chunk):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            close_response(resp)
+        payload = flight.latest if flight.complete else None
+        if self.cache is not None and cache_key is not None and payload is not None:
+            self.cache.put(cache_key, protocol.mode, payload)
+        flights.finish(flight, error)
+
+    def _follow(
+        self,
+        flights: Flights,
+        protocol: SearchProtocol,
+        flight: Flight,
+        subscription: Subscription,
+        parser: ResponseParser,
+    ) -> Iterator[Any]:
+        """
+        Yields one search's results from a shared answer stream, within its deadline.
+        """
+        try:
+            while True:
+                taken = flights.take(flight, subscription, protocol.timer.remaining())
+                if taken is None:
+                    raise protocol.timer.expired("deadline")
+                payloads, done = taken
+                yield from parser.feed_payloads(payloads, end=done and flight.complete)
+                if done:
+                    if flight.error is not None:
+                        raise flight.error
+                    yield from parser.close()
+                    return
+        finally:
+            flights.leave(flight, subscription)
+
+    def _ask(self, protocol: SearchProtocol, attachments: List[str]):
+        """
+        Sends the ask request and returns the response once its status is OK.
+        """
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(
+                protocol.mode, protocol.timer.remaining(), self.hooks
             )
+            if waited is None:
+                # No token would be available before the deadline
+                raise protocol.timer.expired("deadline")
+        resp = self._send(protocol.search_request(attachments), stream=True)
+        try:
+            check_search_status(resp.status_code, resp.headers)
+        except Exception:
+            close_response(resp)
+            raise
+        return resp
 
-            upload_resp = self.session.post(file_upload_info["s3_bucket_url"], multipart=mp)
+    def _close_stream(self, resp, parser: ResponseParser, key: Optional[str], mode: str) -> None:
+        """
+        Releases a streamed search's response, caching the answer if it completed.
+        """
+        close_response(resp)
+        self._cache_answer(key, mode, parser)
 
-            if not upload_resp.ok:
-                raise FileUploadError(f"File upload to storage failed: {upload_resp.status_code}")
+    def _cache_answer(self, key: Optional[str], mode: str, parser: ResponseParser) -> None:
+        """
+        Stores a completed answer in the response cache, if the search is cacheable.
+        """
+        payload = parser.final_payload() if key is not None else None
+        if self.cache is not None and key is not None and payload is not None:
+            self.cache.put(key, mode, payload)
 
-            # Extract the uploaded file URL
-            if "image/upload" in file_upload_info.get("s3_object_url", ""):
-                uploaded_url = re.sub(
-                    r"/private/s--.*?--/v\d+/user_uploads/",
-                    "/private/user_uploads/",
-                    upload_resp.json().get("secure_url", file_upload_info.get("s3_object_url", "")),
-                )
+    def _upload_files(self, protocol: SearchProtocol) -> List[str]:
+        """
+        Uploads the attachments on a thread pool and returns their URLs in order.
+
+        The first failure is raised at once; uploads that have not started are
+        cancelled and those in progress stop before their next request.
+        """
+        if len(protocol.uploads) <= 1 or self.upload_concurrency == 1:
+            return [self._upload_file(protocol, upload) for upload in protocol.uploads]
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.upload_concurrency, len(protocol.uploads)),
+            thread_name_prefix="perplexity-upload",
+        )
+        cancelled = threading.Event()
+        futures = [
+            executor.submit(self._upload_file, protocol, u, cancelled) for u in protocol.uploads
+        ]
+        try:
+            for future in as_completed(futures):
+                future.result()
+            return [future.result() for future in futures]
+        finally:
+            cancelled.set()
+            if sys.version_info >= (3, 9):
+                executor.shutdown(wait=False, cancel_futures=True)
             else:
-                uploaded_url = file_upload_info.get("s3_object_url", "")
-
-            uploaded_files.append(uploaded_url)
-
-        model_pref = MODEL_MAPPINGS.get(mode, {}).get(model, "turbo")
-
-        # Prepare the JSON payload for the query
-        json_data = {
-            "query_str": query,
-            "params": {
-                "attachments": (
-                    uploaded_files + follow_up.get("attachments", [])
-                    if follow_up and isinstance(follow_up, dict)
-                    else uploaded_files
-                ),
-                "frontend_context_uuid": str(uuid4()),
-                "frontend_uuid": str(uuid4()),
-                "is_incognito": incognito,
-                "language": language,
-                "last_backend_uuid": (
-                    follow_up.get("backend_uuid") if follow_up and isinstance(follow_up, dict) else None
-                ),
-                "mode": "concise" if mode == "auto" else "copilot",
-                "model_preference": model_pref,
-                "source": "default",
-                "sources": sources,
-                "version": "2.18",
-            },
-        }
-
-        # Send the query request and handle the response
-        resp = self.session.post(ENDPOINT_SSE_ASK, json=json_data, stream=True)
-
-        if resp.status_code == 429:
-            raise RateLimitError("Perplexity rate limit reached. Please wait before retrying.")
-        if resp.status_code in (401, 403):
-            raise AuthenticationError(f"Authentication failed: status code {resp.status_code}")
-        if resp.status_code >= 400:
-            raise NetworkError(f"Perplexity request failed with status code {resp.status_code}")
-
-        chunks: List[Dict[str, Any]] = []
-
-        def stream_response(resp_obj):
-            """
-            Generator for streaming responses.
-            """
-            for chunk in resp_obj.iter_lines(delimiter=b"\r\n\r\n"):
-                content = chunk.decode("utf-8") if isinstance(chunk, bytes) else str(chunk)
-
-                if "data: " in content:
-                    try:
-                        data_str = content.split("data: ", 1)[1]
-                        content_json = json.loads(data_str)
-                        content_json = parse_nested_json_response(content_json)
-                        chunks.append(content_json)
-                        yield chunks[-1]
-                    except (json.JSONDecodeError, KeyError, IndexError):
-                        continue
-
-                elif "event: end_of_stream" in content:
-                    return
+                for future in futures:
+                    future.cancel()
+                executor.shutdown(wait=False)
 
-        if stream:
-            return stream_response(resp)
+    def _upload_file(
+        self,
+        protocol: SearchProtocol,
+        upload: FileUpload,
+        cancelled: Optional[threading.Event] = None,
+    ) -> str:
+        """
+        Uploads one attachment and returns its URL, reusing a cached upload.
 
-        for chunk in resp.iter_lines(delimiter=b"\r\n\r\n"):
-            content = chunk.decode("utf-8") if isinstance(chunk, bytes) else str(chunk)
+        Raises ``CancelledError`` before each request once ``cancelled`` is set.
+        """
 
-            if "data: " in content:
-                try:
-                    data_str = content.split("data: ", 1)[1]
-                    content_json = json.loads(data_str)
-                    content_json = parse_nested_json_response(content_json)
-                    chunks.append(content_json)
-                except (json.JSONDecodeError, KeyError, IndexError):
-                    continue
+        def check_cancelled() -> None:
+            if cancelled is not None and cancelled.is_set():
+                raise CancelledError()
+
+        key: Optional[str] = None
+        url: Optional[str] = None
+        if self.upload_cache is not None:
+            key = self.upload_cache.key(upload)
+            url = self.upload_cache.get(key)
+        cached = url is not None
+        sent = upload
+        if url is None:
+            if self.upload_optimizer is not None:
+                sent = self.upload_optimizer.optimize(upload)
+            check_cancelled()
+            resp = self._send(protocol.upload_url_request(sent))
+            upload_info = protocol.parse_upload_info(resp.status_code, resp.content)
+
+            # Streamed, so a large upload is only cut off if it stalls
+            request = protocol.upload_request(sent, upload_info)
+            check_cancelled()
+            upload_resp = self._send(request, stream=True)
+            body = read_body(upload_resp, request)
+            url = protocol.uploaded_url(upload_info, upload_resp.status_code, body)
+            if self.upload_cache is not None and key is not None:
+                self.upload_cache.put(key, url)
+        self.hooks.emit(
+            "upload",
+            filename=upload.filename,
+            size=upload.size,
+            cached=cached,
+            saved=upload.size - sent.size,
+        )
+        return url
 
-            elif "event: end_of_stream" in content:
-                return chunks[-1] if chunks else {}
+    def _ensure_handshake(self) -> None:
+        """
+        Performs the session handshake once; concurrent callers wait for it.
+        """
+        if self._handshake_done:
+            return
+        with self._handshake_lock:
+            if self._handshake_done:
+                return
+            try:
+                self._send(handshake_request(self.timeouts))
+            except Exception as e:
+                logger.warning(f"Initial session handshake notice: {e}")
+            self._handshake_done = True
 
-        return chunks[-1] if chunks else {}
+    def _send(self, request: HTTPRequest, stream: bool = False):
+        """
+        Sends a request, through its endpoint's circuit breaker if it has one.
+        """
+        if request.endpoint is None:
+            return self._transmit(request, stream)
+        breaker = self.breakers[request.endpoint]
+        breaker.allow()
+        try:
+            resp = self._transmit(request, stream)
+        except BaseException as e:
+            breaker.record(error=e)
+            raise
+        breaker.record(resp.status_code)
+        return resp
+
+    def _transmit(self, request: HTTPRequest, stream: bool = False):
+        """
+        Sends a request described by the protocol core over a pooled session.
+        """
+        with self._sessions.session() as session:
+            send = getattr(session, request.method.lower())
+            try:
+                return send(request.url, stream=stream, **request_kwargs(request))
+            except CurlTimeout as e:
+                raise send_timeout_error(request, stream, e) from e
+
+    def _new_session(self) -> requests.Session:
+        """
+        Creates an additional session sharing the primary session's cookie jar.
+        """
+        # A Cookies object would be copied; the jar itself is shared, so cookies
+        # set by any session are sent by all of them
+        return requests.Session(
+            headers=DEFAULT_HEADERS.copy(),
+            cookies=self.session.cookies.jar,
+            impersonate="chrome",
+        )
@@ -0,0 +1,291 @@
+"""
+Single-flight coalescing of identical Perplexity AI searches.
+
+When several threads or tasks ask the same question at the same time, only
+the first one (the leader) starts an ask request, on a background thread or
+task of its own, and every search, the leader included, subscribes to its
+answer stream. The stream is framed once and each ``data:`` payload is
+handed to every subscriber, which decodes it in its own streaming mode. A
+search joining late starts from the latest snapshot and then receives every
+later one; blocking and ``stream="latest"`` subscribers only ever hold the
+newest payload.
+
+Only searches that a response cache could answer are coalesced (see
+``perplexity.cache.request_key``). The shared stream enforces the leader's
+first-event and idle limits; each search waits within its own deadline and
+leaves when it passes. Errors raised before the stream starts reach every
+subscriber. Once the last subscriber has left, the upstream transfer is
+cancelled.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .sse import Buffer, SSEDecoder
+from .timeouts import Timeouts, TimeoutTracker
+
+
+class Subscription:
+    """
+    Payloads of a shared answer stream not yet taken by one search.
+
+    Attributes:
+        keep_all: Queue every payload (streamed searches) instead of only the newest
+        left: Whether the search has left the flight
+    """
+
+    __slots__ = ("payloads", "keep_all", "left", "wakeup")
+
+    def __init__(self, keep_all: bool, wakeup: Optional[asyncio.Event] = None):
+        self.payloads: Deque[bytes] = deque()
+        self.keep_all = keep_all
+        self.left = False
+        self.wakeup = wakeup
+
+    def push(self, payload: bytes) -> None:
+        if not self.keep_all:
+            self.payloads.clear()
+        self.payloads.append(payload)
+        self.wake()
+
+    def take(self) -> List[bytes]:
+        payloads = list(self.payloads)
+        self.payloads.clear()
+        return payloads
+
+    def wake(self) -> None:
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+
+class Flight:
+    """
+    One upstream answer stream and the searches subscribed to it.
+
+    Sans-IO: the leader's driver feeds it the body chunks, and ``Flights``
+    or ``AsyncFlights`` take care of locking and waiting.
+
+    Args:
+        key: Request key shared by the coalesced searches
+        timeouts: Limits of the leader's search; all but the deadline apply
+            to the shared stream
+
+    Attributes:
+        latest: Most recent payload, handed to searches that join late
+        done: Whether the stream has ended
+        complete: Whether it ended with ``end_of_stream``
+        error: Exception that ended it, if any
+        cancel: Aborts the upstream transfer, once there is one
+        abandoned: Whether every search left before the stream ended
+    """
+
+    def __init__(self, key: str, timeouts: Timeouts):
+        self.key = key
+        self.timer = TimeoutTracker(
+            Timeouts(timeouts.connect, timeouts.first_event, timeouts.idle, total=None)
+        )
+        self.subscriptions: List[Subscription] = []
+        self.latest: Optional[bytes] = None
+        self.done = False
+        self.complete = False
+        self.error: Optional[BaseException] = None
+        self.cancel: Optional[Callable[[], Any]] = None
+        self.abandoned = False
+        self._decoder = SSEDecoder()
+
+    def __repr__(self) -> str:
+        return f"Flight({self.key[:12]}, subscribers={len(self.subscriptions)})"
+
+    def subscribe(self, keep_all: bool, wakeup: Optional[asyncio.Event] = None) -> Subscription:
+        """Add a search, starting from the latest payload if there is one."""
+        subscription = Subscription(keep_all, wakeup)
+        if self.latest is not None:
+            subscription.push(self.latest)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def feed(self, chunk: Buffer) -> bool:
+        """
+        Frame a chunk of the upstream body and hand its payloads out.
+
+        Returns:
+            True once ``end_of_stream`` has arrived
+
+        Raises:
+            RequestTimeoutError: If the stream exceeded its first-event or idle limit
+        """
+        events = self._decoder.feed(chunk)
+        for event in events:
+            if event.event == "end_of_stream":
+                self.complete = True
+                break
+            if event.data is not None:
+                self.latest = bytes(event.data)
+                for subscription in self.subscriptions:
+                    subscription.push(self.latest)
+        if not self.complete:
+            self.timer.on_chunk(len(events))
+        return self.complete
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Mark the stream as ended, by ``error`` if given."""
+        self.done = True
+        self.error = error
+        for subscription in self.subscriptions:
+            subscription.wake()
+
+    def leave(self, subscription: Subscription) -> bool:
+        """
+        Remove a search.
+
+        Returns:
+            True if it was the last one and the upstream should be cancelled
+        """
+        if subscription.left:
+            return False
+        subscription.left = True
+        self.subscriptions.remove(subscription)
+        self.abandoned = not self.subscriptions and not self.done
+        return self.abandoned
+
+
+class Flights:
+    """
+    In-flight searches of one client, for threads.
+
+    Example:
+        >>> flight, subscription, leader = flights.join(key, timeouts, keep_all=False)
+        >>> payloads, done = flights.take(flight, subscription, timeout=5)
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._flights: Dict[str, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(
+        self, key: str, timeouts: Timeouts, keep_all: bool
+    ) -> Tuple[Flight, Subscription, bool]:
+        """
+        Subscribe to the flight for ``key``, starting one if there is none.
+
+        Returns:
+            The flight, the new subscription, and whether the caller leads the
+            flight (and must send the request and feed the stream)
+        """
+        with self._cond:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = Flight(key, timeouts)
+            return flight, flight.subscribe(keep_all), leader
+
+    def attach(self, flight: Flight, cancel: Callable[[], Any]) -> bool:
+        """
+        Record how to cancel a flight's upstream transfer once it has started.
+
+        Returns:
+            False if every search already left, in which case the caller
+            cancels the transfer itself
+        """
+        with self._cond:
+            if flight.abandoned:
+                return False
+            flight.cancel = cancel
+            return True
+
+    def feed(self, flight: Flight, chunk: Buffer) -> bool:
+        """``Flight.feed`` for the upstream reader, waking the subscribers."""
+        with self._cond:
+            try:
+                return flight.feed(chunk)
+            finally:
+                self._cond.notify_all()
+
+    def finish(self, flight: Flight, error: Optional[BaseException] = None) -> None:
+        """End a flight; searches starting afterwards start a new one."""
+        with self._cond:
+            flight.finish(error)
+            self._drop(flight)
+            self._cond.notify_all()
+
+    def take(
+        self, flight: Flight, subscription: Subscription, timeout: Optional[float]
+    ) -> Optional[Tuple[List[bytes], bool]]:
+        """
+        Wait for payloads.
+
+        Returns:
+            New payloads and whether the stream has ended after them, or None
+            if ``timeout`` passed first
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: subscription.payloads or flight.done, timeout):
+                return None
+            return subscription.take(), flight.done
+
+    def leave(self, flight: Flight, subscription: Subscription) -> None:
+        """Unsubscribe, cancelling the upstream if nobody is left. Idempotent."""
+        with self._cond:
+            abandoned = flight.leave(subscription)
+            if abandoned:
+                self._drop(flight)
+        if abandoned and flight.cancel is not None:
+            flight.cancel()
+
+    def _drop(self, flight: Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+
+class AsyncFlights(Flights):
+    """
+    In-flight searches of one async client.
+
+    Same interface as ``Flights`` except that ``take`` is awaited. Only
+    used from the event loop thread, so no lock is needed.
+    """
+
+    def join(
+        self, key: str, timeouts: Timeouts, keep_all: bool
+    ) -> Tuple[Flight, Subscription, bool]:
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = self._flights[key] = Flight(key, timeouts)
+        return flight, flight.subscribe(keep_all, asyncio.Event()), leader
+
+    def feed(self, flight: Flight, chunk: Buffer) -> bool:
+        return flight.feed(chunk)
+
+    def finish(self, flight: Flight, error: Optional[BaseException] = None) -> None:
+        flight.finish(error)
+        self._drop(flight)
+
+    async def take(  # type: ignore[override]
+        self, flight: Flight, subscription: Subscription, timeout: Optional[float]
+    ) -> Optional[Tuple[List[bytes], bool]]:
+        if not subscription.payloads and not flight.done:
+            wakeup = subscription.wakeup
+            assert wakeup is not None  # set by join
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return subscription.take(), flight.done
+
+    def leave(self, flight: Flight, subscription: Subscription) -> None:
+        abandoned = flight.leave(subscription)
+        if abandoned:
+            self._drop(flight)
+            if flight.cancel is not None:
+                flight.cancel()
+
+    async def aleave(self, flight: Flight, subscription: Subscription) -> None:
+        """``leave`` for ``AsyncSearchStream.aclose``."""
+        self.leave(flight, subscription)
@@ -0,0 +1,162 @@
+"""
+JSON codec for Perplexity AI library.
+
+All JSON encoding and decoding in the library goes through this module so
+the backend can be swapped in one place. ``orjson`` or ``msgspec`` is used
+when installed, with the standard library ``json`` module as a fallback.
+
+Set ``PERPLEXITY_JSON_BACKEND`` to ``orjson``, ``msgspec`` or ``json`` before
+import, or call ``set_backend()``, to force a backend, e.g. for benchmarking.
+"""
+
+import json
+from typing import Any, Callable, Dict, Tuple, Union
+
+from .config import JSON_BACKEND
+from .exceptions import ValidationError
+from .logger import get_logger
+
+logger = get_logger("codec")
+
+# Raised by loads() whatever the active backend
+JSONDecodeError = json.JSONDecodeError
+
+JSONInput = Union[bytes, bytearray, memoryview, str]
+
+_BACKEND_ORDER = ("orjson", "msgspec", "json")
+
+
+def _stdlib_backend() -> Tuple[Callable[[JSONInput], Any], Callable[[Any], bytes]]:
+    def loads(data: JSONInput) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        try:
+            return json.loads(data)
+        except UnicodeDecodeError as e:
+            raise JSONDecodeError(str(e), "", 0) from e
+
+    def dumpb(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    return loads, dumpb
+
+
+def _orjson_backend() -> Tuple[Callable[[JSONInput], Any], Callable[[Any], bytes]]:
+    import orjson
+
+    # orjson.JSONDecodeError already subclasses json.JSONDecodeError
+    return orjson.loads, orjson.dumps
+
+
+def _msgspec_backend() -> Tuple[Callable[[JSONInput], Any], Callable[[Any], bytes]]:
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder()
+
+    def loads(data: JSONInput) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            doc = data if isinstance(data, str) else bytes(data).decode("utf-8", "replace")
+            raise JSONDecodeError(str(e), doc, 0) from e
+
+    return loads, encoder.encode
+
+
+_BACKENDS: Dict[str, Callable[[], Tuple[Callable[[JSONInput], Any], Callable[[Any], bytes]]]] = {
+    "orjson": _orjson_backend,
+    "msgspec": _msgspec_backend,
+    "json": _stdlib_backend,
+}
+
+backend = "json"
+_loads, _dumpb = _stdlib_backend()
+
+
+def set_backend(name: str = "auto") -> str:
+    """
+    Select the JSON backend.
+
+    Args:
+        name: 'orjson', 'msgspec', 'json', or 'auto' for the fastest installed one
+
+    Returns:
+        Name of the backend now in use
+
+    Raises:
+        ValidationError: If the backend name is unknown
+        ImportError: If a specific backend is requested but not installed
+
+    Example:
+        >>> set_backend("json")
+        'json'
+    """
+    global backend, _loads, _dumpb
+
+    if name != "auto" and name not in _BACKENDS:
+        raise ValidationError(
+            f"Invalid JSON backend '{name}'. Must be one of: auto, {', '.join(_BACKEND_ORDER)}"
+        )
+
+    for candidate in _BACKEND_ORDER if name == "auto" else (name,):
+        try:
+            _loads, _dumpb = _BACKENDS[candidate]()
+        except ImportError:
+            if name != "auto":
+                raise
+            continue
+        backend = candidate
+        break
+
+    logger.debug(f"Using '{backend}' JSON backend")
+    return backend
+
+
+def loads(data: JSONInput) -> Any:
+    """
+    Decode a JSON document.
+
+    Args:
+        data: JSON text as bytes, bytearray, memoryview or str
+
+    Returns:
+        Decoded Python object
+
+    Raises:
+        JSONDecodeError: If the document is not valid JSON
+    """
+    return _loads(data)
+
+
+def dumpb(obj: Any) -> bytes:
+    """
+    Encode an object as compact UTF-8 JSON bytes.
+
+    Args:
+        obj: JSON-serialisable object
+
+    Returns:
+        Encoded JSON bytes
+    """
+    return _dumpb(obj)
+
+
+def dumps(obj: Any) -> str:
+    """
+    Encode an object as a compact JSON string.
+
+    Args:
+        obj: JSON-serialisable object
+
+    Returns:
+        Encoded JSON string
+    """
+    return _dumpb(obj).decode("utf-8")
+
+
+try:
+    set_backend(JSON_BACKEND)
+except (ValidationError, ImportError) as e:
+    logger.warning(f"JSON backend '{JSON_BACKEND}' unavailable ({e}); falling back to auto")
+    set_backend("auto")
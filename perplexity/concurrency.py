@@ -0,0 +1,171 @@
+"""
+Adaptive concurrency for batches of Perplexity AI searches.
+
+``AdaptiveConcurrency`` replaces a fixed in-flight limit with one that
+follows the service's health (additive increase, multiplicative decrease):
+every healthy completion grows the limit by ``1 / limit``, i.e. by about one
+per round of searches, and a ``RateLimitError`` or a search much slower than
+usual cuts it by ``backoff``. Only searches started after the last cut can
+trigger the next one, so a burst of 429s from one round counts once.
+
+The async ``search_many`` sizes its window from the controller; threads (the
+sync ``search_many``, the MCP server) wait for a slot with ``slot()``.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from .config import (
+    ADAPTIVE_BACKOFF,
+    ADAPTIVE_LATENCY_FACTOR,
+    ADAPTIVE_MAX_CONCURRENCY,
+    ADAPTIVE_MIN_CONCURRENCY,
+    BATCH_CONCURRENCY,
+)
+from .exceptions import RateLimitError, ValidationError
+from .hooks import Hooks
+
+# Completions needed before latency spikes are judged against the typical latency
+_WARMUP = 5
+# Weight of the newest latency in the moving average
+_SMOOTHING = 0.2
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller for the number of searches in flight.
+
+    Args:
+        initial: Starting limit
+        minimum: Lowest limit
+        maximum: Highest limit
+        backoff: Factor applied to the limit on a 429 or latency spike
+        latency_factor: A search slower than this many times the moving
+            average of recent latencies counts as a spike
+        hooks: Receives the ``concurrency_limit`` gauge whenever it changes
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> controller = AdaptiveConcurrency(maximum=32, hooks=hooks)
+        >>> async for query, result in client.search_many(queries, concurrency=controller):
+        ...     print(query, controller.limit)
+    """
+
+    def __init__(
+        self,
+        initial: int = BATCH_CONCURRENCY,
+        minimum: int = ADAPTIVE_MIN_CONCURRENCY,
+        maximum: int = ADAPTIVE_MAX_CONCURRENCY,
+        backoff: float = ADAPTIVE_BACKOFF,
+        latency_factor: float = ADAPTIVE_LATENCY_FACTOR,
+        hooks: Optional[Hooks] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValidationError(
+                "Concurrency limits must satisfy 1 <= minimum <= initial <= maximum"
+            )
+        if not 0 < backoff < 1:
+            raise ValidationError("backoff must be between 0 and 1")
+        if not latency_factor > 1:
+            raise ValidationError("latency_factor must be greater than 1")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.hooks = hooks
+        self.in_flight = 0
+        self._limit = float(initial)
+        self._clock = clock
+        self._latency: Optional[float] = None
+        self._samples = 0
+        self._last_cut = float("-inf")
+        self._cond = threading.Condition()
+        self._publish(initial)
+
+    def __repr__(self) -> str:
+        return (
+            f"AdaptiveConcurrency(limit={self.limit}, minimum={self.minimum}, "
+            f"maximum={self.maximum})"
+        )
+
+    @property
+    def limit(self) -> int:
+        """Current in-flight limit."""
+        return int(self._limit)
+
+    def start(self) -> float:
+        """
+        Count a search as in flight without waiting for a slot.
+
+        Returns:
+            Start time, to pass to ``finish``
+        """
+        with self._cond:
+            self.in_flight += 1
+        return self._clock()
+
+    def finish(self, started: float, error: Optional[BaseException] = None) -> None:
+        """
+        Record a search's outcome and adjust the limit.
+
+        Args:
+            started: Value returned by ``start``
+            error: Exception the search raised, None on success
+        """
+        now = self._clock()
+        latency = now - started
+        with self._cond:
+            self.in_flight -= 1
+            before = self.limit
+            spike = (
+                error is None
+                and self._samples >= _WARMUP
+                and self._latency is not None
+                and latency > self.latency_factor * self._latency
+            )
+            if isinstance(error, RateLimitError) or spike:
+                if started >= self._last_cut:
+                    self._limit = max(float(self.minimum), self._limit * self.backoff)
+                    self._last_cut = now
+            elif error is None:
+                self._limit = min(float(self.maximum), self._limit + 1 / self._limit)
+            if error is None:
+                self._samples += 1
+                self._latency = (
+                    latency
+                    if self._latency is None
+                    else _SMOOTHING * latency + (1 - _SMOOTHING) * self._latency
+                )
+            self._cond.notify_all()
+            after = self.limit
+        if after != before:
+            self._publish(after)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Block the calling thread until a slot is free, and hold it.
+
+        The outcome of the ``with`` body is recorded on exit.
+
+        Example:
+            >>> with controller.slot():
+            ...     result = client.search(query)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        started = self._clock()
+        try:
+            yield
+        except BaseException as e:
+            self.finish(started, e)
+            raise
+        self.finish(started)
+
+    def _publish(self, limit: int) -> None:
+        if self.hooks is not None:
+            self.hooks.gauge("concurrency_limit", limit)
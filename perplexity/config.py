@@ -7,12 +7,19 @@ Modify these values to customize behavior without changing core code.
 
 import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 # API Configuration
 API_BASE_URL = "https://www.perplexity.ai"
 API_VERSION = "2.18"
-API_TIMEOUT = 30
+API_TIMEOUT = 30  # seconds; wait for the first event, between events and for stalled uploads
+
+# Timeouts (seconds; None disables a limit)
+CONNECT_TIMEOUT = 10
+FIRST_EVENT_TIMEOUT = API_TIMEOUT
+IDLE_TIMEOUT = API_TIMEOUT
+SEARCH_DEADLINE = None  # total time for one search, uploads included
+CLOSE_TIMEOUT = 1.0  # wait for an aborted transfer to end before tearing it down
 
 # Endpoints
 ENDPOINT_AUTH_SESSION = f"{API_BASE_URL}/api/auth/session"
@@ -21,6 +28,9 @@ ENDPOINT_SSE_ASK = f"{API_BASE_URL}/rest/sse/perplexity_ask"
 ENDPOINT_UPLOAD_URL = f"{API_BASE_URL}/rest/uploads/create_upload_url"
 ENDPOINT_SOCKET_IO = f"{API_BASE_URL}/socket.io/"
 
+# Headers for JSON request bodies (encoded with perplexity.codec)
+JSON_HEADERS = {"content-type": "application/json"}
+
 # Emailnator Configuration
 EMAILNATOR_BASE_URL = "https://www.emailnator.com"
 EMAILNATOR_GENERATE_ENDPOINT = f"{EMAILNATOR_BASE_URL}/generate-email"
@@ -36,8 +46,14 @@ SEARCH_MODES = ["auto", "pro", "reasoning", "deep research"]
 SEARCH_SOURCES = ["web", "scholar", "social"]
 SEARCH_LANGUAGES = ["en-US", "en-GB", "pt-BR", "es-ES", "fr-FR", "de-DE"]
 
+# Streaming Modes (in addition to stream=True / stream=False)
+STREAM_MODES = ["delta", "latest"]
+
+# What a streamed search keeps after yielding ("all" is meant for debugging)
+RETENTION_POLICIES = ["none", "last", "all"]
+
 # Model Mappings
-MODEL_MAPPINGS: Dict[str, Dict[str, str]] = {
+MODEL_MAPPINGS: Dict[str, Dict[Optional[str], str]] = {
     "auto": {None: "turbo"},
     "pro": {
         None: "pplx_pro",
@@ -126,10 +142,37 @@ EMAILNATOR_HEADERS = {
 }
 
 # Retry Configuration
-RETRY_MAX_ATTEMPTS = 3
+RETRY_MAX_ATTEMPTS = 3  # attempts per ask request, the first one included
 RETRY_BACKOFF_FACTOR = 2
+RETRY_BASE_DELAY = 0.5  # seconds; ceiling of the first jittered backoff
+RETRY_MAX_DELAY = 30.0  # seconds; longer Retry-After waits are not honoured
 RETRY_EXCEPTIONS = (ConnectionError, TimeoutError)
 
+# Circuit breakers (per endpoint): consecutive failures that open the circuit, seconds
+# before a trial request is let through, and how many trials may run at once
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_TIME = 30.0
+CIRCUIT_HALF_OPEN_TRIALS = 1
+
+# Session handshake: "eager" at construction, "lazy" on the first request,
+# or "background" started at construction without blocking it
+HANDSHAKE_MODES = ["eager", "lazy", "background"]
+
+# Concurrency (default number of searches search_many() keeps in flight, and of the
+# attachments of one search uploaded at once)
+BATCH_CONCURRENCY = 4
+UPLOAD_CONCURRENCY = 4
+
+# Adaptive concurrency (AIMD): bounds of the in-flight limit, factor applied to it on a
+# 429 or latency spike, and how many times the typical latency counts as a spike
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 16
+ADAPTIVE_BACKOFF = 0.5
+ADAPTIVE_LATENCY_FACTOR = 3.0
+
+# JSON Backend ("auto" picks orjson, then msgspec, then the stdlib json module)
+JSON_BACKEND = os.environ.get("PERPLEXITY_JSON_BACKEND", "auto")
+
 # Logging Configuration
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 LOG_LEVEL = "INFO"
@@ -144,6 +187,41 @@ RATE_LIMIT_MIN_DELAY = 1.0  # seconds
 RATE_LIMIT_MAX_DELAY = 3.0  # seconds
 RATE_LIMIT_ENABLED = True
 
+# Token buckets for Client(rate_limiter=RateLimiter()): name -> (requests per second, burst).
+# "auto" covers auto mode, "enhanced" pro, reasoning and deep research; a mode's own
+# name gives it a separate bucket and "*" catches every other mode.
+RATE_LIMIT_BUCKETS = {"auto": (0.5, 5), "enhanced": (0.1, 2)}
+
+# Response cache (Client(cache=ResponseCache())): bounds of the in-memory LRU, and seconds
+# an answer stays fresh per mode, looked up like RATE_LIMIT_BUCKETS (modes without an
+# entry are not cached)
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL = {"auto": 300.0, "enhanced": 1800.0}
+
+# Disk cache backend (perplexity.cache.DiskCache): database shared by every process of the
+# user, size budget of its compressed entries, and zlib level
+_CACHE_HOME = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+CACHE_DISK_PATH = str(Path(_CACHE_HOME) / "perplexity-ai" / "cache.sqlite3")
+CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+CACHE_COMPRESSION_LEVEL = 6
+
+# Upload cache (Client(upload_cache=UploadCache())): seconds the URL of an uploaded
+# attachment is reused for identical files
+UPLOAD_CACHE_TTL = 3600.0
+
+# Size of the chunks attachments on disk are read in (e.g. to hash them for the upload cache)
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# Upload optimiser (Client(upload_optimizer=UploadOptimizer())): longest image side kept,
+# JPEG/WebP quality images are re-encoded at, sizes of the files worth optimising, and
+# number of worker threads
+UPLOAD_IMAGE_MAX_DIMENSION = 2048
+UPLOAD_IMAGE_QUALITY = 85
+UPLOAD_OPTIMIZE_MIN_BYTES = 16 * 1024
+UPLOAD_OPTIMIZE_MAX_BYTES = 64 * 1024 * 1024
+UPLOAD_OPTIMIZE_WORKERS = 2
+
 # Validation Patterns
 EMAIL_SUBJECT_PATTERN = "Sign in to Perplexity"
 SIGNIN_URL_PATTERN = r'"(https://www\.perplexity\.ai/api/auth/callback/email\?callbackUrl=.*?)"'
@@ -5,6 +5,8 @@ This module defines all custom exceptions used throughout the library
 for better error handling and debugging.
 """
 
+from typing import Optional
+
 
 class PerplexityError(Exception):
     """Base exception for all Perplexity AI errors."""
@@ -19,15 +21,66 @@ class AuthenticationError(PerplexityError):
 
 
 class RateLimitError(PerplexityError):
-    """Raised when rate limit is exceeded."""
+    """
+    Raised when rate limit is exceeded.
 
-    pass
+    Attributes:
+        retry_after: Seconds the server asked to wait (``Retry-After``), if given
+    """
 
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
-class NetworkError(PerplexityError):
-    """Raised when network request fails."""
 
-    pass
+class NetworkError(PerplexityError):
+    """
+    Raised when network request fails.
+
+    Attributes:
+        status_code: HTTP status of the failed response, None if there was none
+        retry_after: Seconds the server asked to wait (``Retry-After``), if given
+    """
+
+    def __init__(
+        self,
+        message: str = "",
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RequestTimeoutError(NetworkError, TimeoutError):
+    """
+    Raised when a request exceeds one of its time limits.
+
+    Attributes:
+        phase: Limit that was hit: 'connect', 'first_event', 'idle' or 'deadline'
+        timeout: The limit in seconds
+    """
+
+    def __init__(self, message: str, phase: str = "deadline", timeout: float = 0.0):
+        super().__init__(message)
+        self.phase = phase
+        self.timeout = timeout
+
+
+class CircuitOpenError(NetworkError):
+    """
+    Raised without sending a request while the endpoint's circuit breaker is open.
+
+    Attributes:
+        endpoint: Name of the failing endpoint
+        retry_in: Seconds until the breaker lets a trial request through
+    """
+
+    def __init__(self, message: str, endpoint: str = "", retry_in: float = 0.0):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.retry_in = retry_in
 
 
 class InvalidModeError(PerplexityError):
@@ -0,0 +1,108 @@
+"""
+Instrumentation hooks for Perplexity AI clients.
+
+A ``Hooks`` registry maps event names to callbacks. Clients emit events at
+points worth observing (a retry being scheduled, for instance) and every
+callback registered for that event, or for ``"*"``, receives the event name
+and a dict of fields. Callbacks run synchronously on the emitting thread or
+event loop, so they should be quick; an exception raised by a callback is
+logged and never reaches the search that emitted the event.
+
+Events:
+    retry: A failed ask request will be re-sent. Fields: ``attempt`` (number
+        of the attempt that failed), ``delay`` (seconds until the next one),
+        ``error`` (the exception) and ``endpoint``.
+    throttle: A rate limiter delays an ask request. Fields: ``mode``,
+        ``bucket`` and ``wait`` (seconds).
+    circuit: A circuit breaker changed state. Fields: ``endpoint``, ``state``
+        ('closed', 'open' or 'half_open') and ``previous``.
+    cache: A cacheable search was looked up in the response cache. Fields:
+        ``hit`` (whether it was served from the cache) and ``mode``.
+    upload: An attachment was uploaded, or found in the upload cache. Fields:
+        ``filename``, ``size`` (bytes), ``cached`` (whether the upload was
+        skipped) and ``saved`` (bytes the upload optimiser took off).
+    coalesce: A search joined an identical one in flight instead of sending
+        its own request. Fields: ``mode`` and ``subscribers`` (searches now
+        sharing the answer stream).
+    metric: A gauge changed. Fields: ``name`` and ``value``. The latest value
+        of every gauge is also kept in ``Hooks.metrics``.
+
+Gauges:
+    concurrency_limit: Current in-flight limit of an ``AdaptiveConcurrency``.
+    circuit.<endpoint>: State of the endpoint's circuit breaker, once it changed.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger("hooks")
+
+Handler = Callable[[str, Dict[str, Any]], None]
+
+
+class Hooks:
+    """
+    Registry of instrumentation callbacks, safe to share between clients.
+
+    Example:
+        >>> hooks = Hooks()
+        >>> hooks.on("retry", lambda event, data: print(data["attempt"], data["delay"]))
+        >>> client = Client(hooks=hooks)
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Copy-on-write, so emit() never takes the lock
+        self._handlers: Dict[str, Tuple[Handler, ...]] = {}
+        self.metrics: Dict[str, Any] = {}
+
+    def on(self, event: str, handler: Optional[Handler] = None) -> Any:
+        """
+        Register a callback for an event, or for every event with ``"*"``.
+
+        Args:
+            event: Event name
+            handler: Callable taking ``(event, data)``; if omitted, returns a
+                decorator that registers the decorated function
+
+        Returns:
+            The handler (or the decorator)
+        """
+        if handler is None:
+            return lambda func: self.on(event, func)
+        with self._lock:
+            self._handlers[event] = self._handlers.get(event, ()) + (handler,)
+        return handler
+
+    def off(self, event: str, handler: Handler) -> None:
+        """Unregister a callback; unknown callbacks are ignored."""
+        with self._lock:
+            handlers = self._handlers.get(event, ())
+            self._handlers[event] = tuple(h for h in handlers if h is not handler)
+
+    def emit(self, event: str, **data: Any) -> None:
+        """
+        Call every callback registered for ``event`` and for ``"*"``.
+
+        Args:
+            event: Event name
+            **data: Event fields
+        """
+        for handler in self._handlers.get(event, ()) + self._handlers.get("*", ()):
+            try:
+                handler(event, data)
+            except Exception as e:
+                logger.warning(f"Hook for '{event}' failed: {e}")
+
+    def gauge(self, name: str, value: Any) -> None:
+        """
+        Record the current value of a gauge and emit a ``metric`` event.
+
+        Args:
+            name: Gauge name
+            value: New value
+        """
+        self.metrics[name] = value
+        self.emit("metric", name=name, value=value)
@@ -1,4 +1,3 @@
-import json
 import random
 import socket
 import ssl
@@ -9,6 +8,7 @@ from typing import Any, Dict, Generator, List, Optional, Union
 from curl_cffi import requests
 from websocket import WebSocketApp
 
+from . import codec
 from .config import DEFAULT_HEADERS, ENDPOINT_SOCKET_IO, LABS_MODELS
 from .exceptions import AuthenticationError, NetworkError, ValidationError
 from .logger import get_logger
@@ -32,7 +32,7 @@ class LabsClient:
         poll_url = f"{ENDPOINT_SOCKET_IO}?EIO=4&transport=polling&t={self.timestamp}"
         try:
             resp = self.session.get(poll_url)
-            self.sid = json.loads(resp.text[1:])["sid"]
+            self.sid = codec.loads(resp.text[1:])["sid"]
         except Exception as e:
             raise NetworkError(f"Failed to establish Labs polling session: {e}") from e
 
@@ -90,7 +90,7 @@ class LabsClient:
                 ws.send("3")  # Respond to ping messages
 
             elif message.startswith("42"):
-                response = json.loads(message[2:])[1]
+                response = codec.loads(message[2:])[1]
 
                 if isinstance(response, dict) and "final" in response:
                     self.last_answer = response
@@ -127,7 +127,7 @@ class LabsClient:
         # Send the query via WebSocket
         self.ws.send(
             "42"
-            + json.dumps(
+            + codec.dumps(
                 [
                     "perplexity_labs",
                     {
@@ -1,6 +1,8 @@
 import json
 import os
 import sys
+import threading
+from collections.abc import Mapping
 from typing import Any, Optional
 
 try:
@@ -15,7 +17,10 @@ except ImportError:  # mcp 1.x
 
     _HTTP_BIND_ON_RUN = False
 
-from perplexity import Client
+from perplexity import Client, ResponseCache
+from perplexity.cache import DiskCache
+from perplexity.concurrency import AdaptiveConcurrency
+from perplexity.config import ADAPTIVE_MAX_CONCURRENCY, BATCH_CONCURRENCY
 from perplexity.logger import setup_logger
 
 logger = setup_logger("mcp")
@@ -29,6 +34,73 @@ else:
     mcp = _Server("perplexity", host=HOST, port=PORT)
 
 client: Optional[Client] = None
+concurrency: Optional[AdaptiveConcurrency] = None
+_concurrency_lock = threading.Lock()
+
+
+def _make_cache() -> Optional[ResponseCache]:
+    """Response cache chosen by MCP_CACHE: 'off' (default), 'memory' or 'disk'.
+
+    The disk cache lives at MCP_CACHE_PATH (default under the XDG cache dir) and is
+    shared by every server and worker process pointing at the same file.
+    """
+    kind = os.environ.get("MCP_CACHE", "off")
+    if kind == "memory":
+        return ResponseCache()
+    if kind == "disk":
+        try:
+            return ResponseCache(DiskCache(os.environ.get("MCP_CACHE_PATH") or None))
+        except Exception as e:
+            logger.error(f"Could not open the disk cache, caching disabled: {e}")
+            return None
+    if kind != "off":
+        logger.error("MCP_CACHE must be 'off', 'memory' or 'disk'; caching disabled.")
+    return None
+
+
+def _max_concurrency() -> int:
+    """MCP_MAX_CONCURRENCY, or the default if it is unset or not a positive integer."""
+    value = os.environ.get("MCP_MAX_CONCURRENCY")
+    if value is None:
+        return ADAPTIVE_MAX_CONCURRENCY
+    try:
+        maximum = int(value)
+    except ValueError:
+        maximum = 0
+    if maximum < 1:
+        logger.error(
+            f"MCP_MAX_CONCURRENCY must be a positive integer, got {value!r}; "
+            f"using {ADAPTIVE_MAX_CONCURRENCY}."
+        )
+        return ADAPTIVE_MAX_CONCURRENCY
+    return maximum
+
+
+def _get_concurrency() -> AdaptiveConcurrency:
+    """Lazily build the limit shared by tool calls.
+
+    Tool calls run concurrently; the number reaching Perplexity at once adapts to
+    429s and latency (AIMD), up to MCP_MAX_CONCURRENCY. Changes to the limit are
+    reported to the client's hooks as the concurrency_limit metric.
+    """
+    global concurrency
+    with _concurrency_lock:
+        if concurrency is None:
+            maximum = _max_concurrency()
+            initial = min(BATCH_CONCURRENCY, maximum)
+            concurrency = AdaptiveConcurrency(
+                initial=initial, maximum=maximum, hooks=_get_client().hooks
+            )
+        return concurrency
+
+
+def _build_client(cookies: dict) -> Client:
+    """Client shared by the tools.
+
+    It doesn't hold up server start-up on the auth-session round trip, and identical
+    questions asked by several MCP clients at once share one answer stream.
+    """
+    return Client(cookies, handshake="background", cache=_make_cache(), coalesce=True)
 
 
 def _get_client() -> Client:
@@ -42,13 +114,13 @@ def _get_client() -> Client:
                 cookies = json.loads(cookies_env)
             except json.JSONDecodeError:
                 logger.error("PERPLEXITY_COOKIES is not valid JSON.")
-        client = Client(cookies)
+        client = _build_client(cookies)
     return client
 
 
 def _extract_answer(resp: Any) -> str:
-    """Safely extract the markdown answer text from search response dict."""
-    if not isinstance(resp, dict):
+    """Safely extract the markdown answer text from a search response mapping."""
+    if not isinstance(resp, Mapping):
         return str(resp) if resp else ""
     for block in resp.get("blocks", []):
         if isinstance(block, dict) and block.get("intended_usage") == "ask_text":
@@ -58,6 +130,14 @@ def _extract_answer(resp: Any) -> str:
     return resp.get("answer", "")
 
 
+def _search(query: str, **kwargs: Any) -> str:
+    """Run one search through the shared concurrency limit and extract its answer."""
+    cli = _get_client()
+    with _get_concurrency().slot():
+        resp = cli.search(query, **kwargs)
+    return _extract_answer(resp)
+
+
 def perplexity_ask(query: str) -> str:
     """Ask Perplexity a question and get a concise AI-generated answer.
 
@@ -70,10 +150,8 @@ def perplexity_ask(query: str) -> str:
     - Returns plain text only (no citations, images, or structured results).
     - Answers may not reflect the very latest real-time information.
     """
-    cli = _get_client()
     try:
-        resp = cli.search(query, mode="auto")
-        return _extract_answer(resp)
+        return _search(query, mode="auto")
     except Exception as e:
         logger.error(f"perplexity_ask error: {e}")
         return f"Error executing query: {e}"
@@ -92,10 +170,8 @@ def perplexity_research(query: str) -> str:
     - Returns plain text only (no citations, images, or structured results).
     - Only one model is available in this mode (cannot select a specific model).
     """
-    cli = _get_client()
     try:
-        resp = cli.search(query, mode="deep research")
-        return _extract_answer(resp)
+        return _search(query, mode="deep research")
     except Exception as e:
         logger.error(f"perplexity_research error: {e}")
         return f"Error executing research query: {e}"
@@ -113,10 +189,8 @@ def perplexity_reason(query: str) -> str:
     - Does not support follow-up context, file uploads, or source filtering.
     - Returns plain text only (no citations, images, or structured results).
     """
-    cli = _get_client()
     try:
-        resp = cli.search(query, mode="reasoning")
-        return _extract_answer(resp)
+        return _search(query, mode="reasoning")
     except Exception as e:
         logger.error(f"perplexity_reason error: {e}")
         return f"Error executing reasoning query: {e}"
@@ -134,10 +208,8 @@ def perplexity_search(query: str) -> str:
     - Does not support follow-up context or file uploads.
     - Returns plain text only (no citations, images, or structured results).
     """
-    cli = _get_client()
     try:
-        resp = cli.search(query, mode="pro", sources=["web"])
-        return _extract_answer(resp)
+        return _search(query, mode="pro", sources=["web"])
     except Exception as e:
         logger.error(f"perplexity_search error: {e}")
         return f"Error executing search query: {e}"
@@ -155,7 +227,7 @@ def main():
     else:
         cookies = {}
 
-    client = Client(cookies)
+    client = _build_client(cookies)
 
     mcp.tool()(perplexity_ask)
 
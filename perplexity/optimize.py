@@ -0,0 +1,215 @@
+"""
+Opt-in optimisation of attachments before they are uploaded.
+
+Upload latency is dominated by payload size, so an ``UploadOptimizer``
+attached to a client shrinks attachments before they are sent:
+
+- Images (JPEG, PNG and WebP) are turned upright, downscaled when their
+  longest side exceeds ``max_dimension``, stripped of EXIF and other
+  metadata (the colour profile is kept) and re-encoded, JPEG and WebP at
+  ``quality``. This needs Pillow (``pip install "perplexity-api[images]"``);
+  without it images are uploaded as they are.
+- Text documents in UTF-16, UTF-32 or UTF-8 with a byte order mark are
+  converted to plain UTF-8 in Unicode NFC form.
+
+An optimised file keeps its filename and format, and replaces the original
+only when it is smaller. Files that cannot be decoded are uploaded
+unchanged. The bytes saved are reported in the ``saved`` field of the
+``upload`` hook event.
+
+The async client runs the work on the optimiser's own thread pool, so it
+never blocks the event loop; the sync client runs it on the thread that
+uploads the file.
+"""
+
+import codecs
+import io
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+
+from .config import (
+    UPLOAD_IMAGE_MAX_DIMENSION,
+    UPLOAD_IMAGE_QUALITY,
+    UPLOAD_OPTIMIZE_MAX_BYTES,
+    UPLOAD_OPTIMIZE_MIN_BYTES,
+    UPLOAD_OPTIMIZE_WORKERS,
+)
+from .exceptions import ValidationError
+from .logger import get_logger
+from .protocol import FileUpload
+from .utils import validate_concurrency
+
+logger = get_logger("optimize")
+
+# Pillow format of each image type worth re-encoding (animated GIFs are left alone)
+_IMAGE_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+
+_TEXT_TYPES = ("application/json", "application/xml", "application/javascript")
+
+# UTF-32 first: its little-endian mark starts with the UTF-16 one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def _pillow() -> Optional[Tuple[Any, Any]]:
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+class UploadOptimizer:
+    """
+    Shrinks images and text documents before they are uploaded.
+
+    Args:
+        max_dimension: Longest image side in pixels; larger images are downscaled
+        quality: JPEG and WebP quality (1-95) images are re-encoded at
+        min_bytes: Smaller files are uploaded as they are
+        max_bytes: Larger files are uploaded as they are, so files streamed
+            from disk are not loaded into memory
+        max_workers: Threads of the pool the async client optimises on
+
+    Raises:
+        ValidationError: If a limit is out of range
+
+    Example:
+        >>> optimizer = UploadOptimizer(max_dimension=1600, quality=80)
+        >>> client = Client(cookies, upload_optimizer=optimizer)
+        >>> client.search("What is in this photo?", files={"photo.jpg": Path("photo.jpg")})
+    """
+
+    def __init__(
+        self,
+        max_dimension: int = UPLOAD_IMAGE_MAX_DIMENSION,
+        quality: int = UPLOAD_IMAGE_QUALITY,
+        min_bytes: int = UPLOAD_OPTIMIZE_MIN_BYTES,
+        max_bytes: int = UPLOAD_OPTIMIZE_MAX_BYTES,
+        max_workers: int = UPLOAD_OPTIMIZE_WORKERS,
+    ):
+        validate_concurrency(max_workers, "max_workers")
+        for name, value in (("max_dimension", max_dimension), ("min_bytes", min_bytes)):
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ValidationError(f"{name} must be a positive integer, got {value!r}")
+        if isinstance(quality, bool) or not isinstance(quality, int) or not 1 <= quality <= 95:
+            raise ValidationError(f"quality must be an integer from 1 to 95, got {quality!r}")
+        if not isinstance(max_bytes, int) or max_bytes < min_bytes:
+            raise ValidationError("max_bytes must be an integer no smaller than min_bytes")
+
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        if _pillow() is None:
+            logger.info(
+                "Pillow is not installed: images are uploaded without optimisation "
+                '(pip install "perplexity-api[images]")'
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f"UploadOptimizer(max_dimension={self.max_dimension}, quality={self.quality}, "
+            f"min_bytes={self.min_bytes}, max_bytes={self.max_bytes})"
+        )
+
+    def optimize(self, upload: FileUpload) -> FileUpload:
+        """
+        Shrink an attachment.
+
+        Args:
+            upload: The attachment
+
+        Returns:
+            A smaller attachment with the same filename, or ``upload`` itself
+            if it could not be made smaller
+        """
+        if not self.min_bytes <= upload.size <= self.max_bytes or isinstance(upload.data, str):
+            return upload
+        image_format = _IMAGE_FORMATS.get(upload.content_type)
+        is_text = upload.content_type.startswith("text/") or upload.content_type in _TEXT_TYPES
+        if image_format is None and not is_text:
+            return upload
+
+        data = b"".join(upload.chunks())
+        try:
+            if image_format is not None:
+                optimized = self._shrink_image(data, image_format)
+            else:
+                optimized = _normalize_text(data)
+        except Exception as e:
+            # A file Pillow or the codecs cannot read is still uploaded, as it is
+            logger.debug(f"Could not optimise {upload.filename}: {e}")
+            return upload
+        if optimized is None or len(optimized) >= upload.size:
+            return upload
+        return FileUpload(upload.filename, optimized)
+
+    def submit(self, upload: FileUpload) -> "Future[FileUpload]":
+        """``optimize`` on the optimiser's thread pool."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="perplexity-optimize"
+                )
+            return self._executor.submit(self.optimize, upload)
+
+    def close(self) -> None:
+        """Shut the thread pool down; it is started again if needed."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _shrink_image(self, data: bytes, image_format: str) -> Optional[bytes]:
+        pillow = _pillow()
+        if pillow is None:
+            return None
+        Image, ImageOps = pillow
+
+        with Image.open(io.BytesIO(data)) as original:
+            if getattr(original, "n_frames", 1) > 1:
+                return None  # animated
+            # Applies the EXIF orientation, which is about to be stripped
+            image = ImageOps.exif_transpose(original)
+            image.load()
+        if max(image.size) > self.max_dimension:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        # Saving without exif= or pnginfo= drops that metadata
+        options = {}
+        if image.info.get("icc_profile"):
+            options["icc_profile"] = image.info["icc_profile"]
+        if image_format == "PNG":
+            options["optimize"] = True
+        else:
+            options["quality"] = self.quality
+        if image_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, image_format, **options)
+        return out.getvalue()
+
+
+def _normalize_text(data: bytes) -> Optional[bytes]:
+    """UTF-8 in NFC form, or None if the encoding is not known for sure."""
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            text = data.decode(encoding)
+            break
+    else:
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    return unicodedata.normalize("NFC", text).encode("utf-8")
@@ -0,0 +1,711 @@
+"""
+Transport-agnostic (sans-IO) core of the Perplexity search protocol.
+
+This module knows how to validate a search, which HTTP requests it takes to
+upload attachments and ask the question, how status codes map to library
+exceptions and how the SSE response body turns into results. It never
+performs I/O itself: the sync and async ``Client`` classes are thin drivers
+that send the described requests and feed the response bytes back in, so
+both share the same code paths and the core can be exercised without a
+network.
+"""
+
+import mimetypes
+import mmap
+import os
+import re
+import time
+from collections import deque
+from collections.abc import Mapping
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import Any, BinaryIO, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from uuid import uuid4
+
+from . import codec
+from .config import (
+    API_VERSION,
+    ENDPOINT_AUTH_SESSION,
+    ENDPOINT_SSE_ASK,
+    ENDPOINT_UPLOAD_URL,
+    FILE_CHUNK_SIZE,
+    JSON_HEADERS,
+    MODEL_MAPPINGS,
+)
+from .exceptions import (
+    AuthenticationError,
+    FileUploadError,
+    NetworkError,
+    RateLimitError,
+    RequestTimeoutError,
+    ValidationError,
+)
+from .result import SearchResult
+from .sse import Buffer, SSEDecoder
+from .stream import DeltaAccumulator, FinalSnapshot
+from .timeouts import Timeouts, TimeoutTracker
+from .utils import (
+    validate_file_data,
+    validate_query_limits,
+    validate_retention,
+    validate_search_params,
+    validate_stream_mode,
+)
+
+ENHANCED_MODES = ("pro", "reasoning", "deep research")
+
+# Contents of an attachment: bytes or text, a path, a binary file object or a buffer
+FileData = Union[bytes, str, os.PathLike, BinaryIO, bytearray, memoryview, mmap.mmap]
+
+
+class HTTPRequest:
+    """
+    Description of an HTTP request for a driver to send.
+
+    Attributes:
+        method: HTTP method
+        url: Absolute URL
+        params: Query string parameters
+        headers: Extra headers merged over the session defaults
+        data: Encoded request body
+        multipart: Multipart form body, for storage uploads
+        timeout: curl ``(connect, read)`` timeout, or None for no limit
+        expires_at: ``time.monotonic()`` deadline of the search, if any
+        endpoint: Short endpoint name ('ask', 'upload_url' or 'upload') for
+            per-endpoint policies such as circuit breakers, None for others
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "params",
+        "headers",
+        "data",
+        "multipart",
+        "timeout",
+        "expires_at",
+        "endpoint",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        data: Optional[bytes] = None,
+        multipart: Optional["MultipartBody"] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        expires_at: Optional[float] = None,
+        endpoint: Optional[str] = None,
+    ):
+        self.method = method
+        self.url = url
+        self.params = params
+        self.headers = headers
+        self.data = data
+        self.multipart = multipart
+        self.timeout = timeout
+        self.expires_at = expires_at
+        self.endpoint = endpoint
+
+    def __repr__(self) -> str:
+        return f"HTTPRequest({self.method} {self.url})"
+
+
+class FileUpload:
+    """
+    A file attached to a search.
+
+    Files on disk are not loaded: paths, and binary file objects opened on a
+    regular file and not yet read from, are streamed from disk when the file
+    is uploaded. Other file objects are read once here; buffers (``mmap``,
+    ``memoryview``, ``bytearray``) are kept as they are.
+
+    Attributes:
+        filename: Name the file is uploaded under
+        data: In-memory contents, or None if they are streamed from ``path``
+        path: File the contents are streamed from, or None
+        content_type: MIME type guessed from the filename
+        size: Size of the contents in bytes
+    """
+
+    __slots__ = ("filename", "data", "path", "content_type", "size")
+
+    def __init__(self, filename: str, data: FileData):
+        self.filename = filename
+        self.path, self.data = _file_source(data)
+        self.content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        self.size = os.stat(self.path).st_size if self.path is not None else _data_size(self.data)
+
+    def chunks(self) -> Iterator[Any]:
+        """The contents as bytes-like chunks, read from disk in ``FILE_CHUNK_SIZE`` pieces."""
+        if self.path is None:
+            yield self.data.encode("utf-8") if isinstance(self.data, str) else self.data
+            return
+        with open(self.path, "rb") as f:
+            yield from iter(partial(f.read, FILE_CHUNK_SIZE), b"")
+
+
+def _file_source(data: FileData) -> Tuple[Optional[str], Any]:
+    """Path to stream an attachment from, or its in-memory contents."""
+    # mmap also has read(), which would copy the mapping
+    if isinstance(data, (bytes, str, bytearray, memoryview, mmap.mmap)):
+        return None, data
+    if isinstance(data, os.PathLike):
+        return os.fspath(data), None
+    name = getattr(data, "name", None)
+    if isinstance(name, str) and os.path.isfile(name) and data.seekable() and not data.tell():
+        return name, None
+    return None, data.read()
+
+
+def _data_size(data: Any) -> int:
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    with memoryview(data) as view:
+        return view.nbytes
+
+
+class MultipartBody:
+    """
+    Multipart form for a storage upload: signed form fields plus the file part.
+    """
+
+    __slots__ = ("fields", "upload")
+
+    def __init__(self, fields: Dict[str, Any], upload: FileUpload):
+        self.fields = fields
+        self.upload = upload
+
+
+def handshake_request(timeouts: Optional[Timeouts] = None) -> HTTPRequest:
+    """
+    Request that initialises the session cookies.
+
+    Args:
+        timeouts: Limits for the request (library defaults if None)
+
+    Returns:
+        GET request for the auth session endpoint
+    """
+    timer = TimeoutTracker(timeouts)
+    return HTTPRequest(
+        "GET",
+        ENDPOINT_AUTH_SESSION,
+        timeout=timer.request_timeout(timer.timeouts.idle),
+        expires_at=timer.expires_at,
+    )
+
+
+def parse_retry_after(value: Any, now: Optional[float] = None) -> Optional[float]:
+    """
+    Parse a ``Retry-After`` header value.
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP date
+        now: Current UNIX time for HTTP dates (``time.time()`` if None)
+
+    Returns:
+        Seconds to wait (at least 0), or None if absent or malformed
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def check_search_status(status_code: int, headers: Optional[Mapping] = None) -> None:
+    """
+    Map the status code of the ask endpoint to a library exception.
+
+    Args:
+        status_code: HTTP status code
+        headers: Response headers, used for ``Retry-After``
+
+    Raises:
+        RateLimitError: On 429
+        AuthenticationError: On 401 or 403
+        NetworkError: On any other 4xx/5xx status
+    """
+    if status_code < 400:
+        return
+    retry_after = parse_retry_after(headers.get("retry-after")) if headers is not None else None
+    if status_code == 429:
+        raise RateLimitError(
+            "Perplexity rate limit reached. Please wait before retrying.",
+            retry_after=retry_after,
+        )
+    if status_code in (401, 403):
+        raise AuthenticationError(f"Authentication failed: status code {status_code}")
+    raise NetworkError(
+        f"Perplexity request failed with status code {status_code}",
+        status_code=status_code,
+        retry_after=retry_after,
+    )
+
+
+class ResponseParser:
+    """
+    Turns the raw SSE body of the ask endpoint into results.
+
+    Depending on the streaming mode, ``feed`` returns the results a streaming
+    consumer should receive (``SearchResult`` snapshots for ``stream=True``,
+    delta dicts for ``stream="delta"``) and ``result`` returns the final
+    snapshot for blocking searches, whose intermediate events are never
+    decoded. With ``stream="latest"`` events are only framed; ``take_latest``
+    hands out the newest snapshot on demand and every snapshot superseded in
+    the meantime is dropped undecoded (counted in ``dropped``).
+
+    Streamed results are retained according to ``retain``: ``"none"`` keeps
+    nothing once a result has been handed out, ``"last"`` keeps only the most
+    recent one and ``"all"`` keeps every one (for debugging; memory then grows
+    with the square of the answer length, since snapshots are cumulative).
+
+    Given a ``TimeoutTracker``, every chunk is reported to it, so a stream that
+    sends keep-alive bytes but no events past the first-event or idle limit,
+    or runs past the deadline, raises ``RequestTimeoutError``.
+
+    ``complete`` turns True once the ``end_of_stream`` event arrives. Streamed
+    searches only keep the raw final payload for ``result`` when created with
+    ``keep_final`` (the response cache needs it).
+
+    Example:
+        >>> parser = ResponseParser(stream=True)
+        >>> for chunk in body_chunks:
+        ...     for snapshot in parser.feed(chunk):
+        ...         print(snapshot.answer)
+        ...     if parser.done:
+        ...         break
+    """
+
+    def __init__(
+        self,
+        stream: Union[bool, str] = False,
+        retain: str = "last",
+        timer: Optional[TimeoutTracker] = None,
+        keep_final: bool = False,
+    ):
+        validate_retention(retain)
+        self.stream = stream
+        self.retain = retain
+        self.timer = timer
+        self.done = False
+        self.complete = False
+        self.dropped = 0
+        self.retained: Deque[Any] = deque(maxlen=None if retain == "all" else 1)
+        self._decoder = SSEDecoder()
+        self._final = FinalSnapshot()
+        self._accumulator = DeltaAccumulator() if stream == "delta" else None
+        self._keep_final = keep_final
+        self._fresh = False
+
+    def feed(self, chunk: Buffer) -> List[Any]:
+        """
+        Consume a chunk of the response body.
+
+        Args:
+            chunk: Raw bytes as received from the transport
+
+        Returns:
+            Results to hand to a streaming consumer (empty for blocking searches)
+
+        Raises:
+            RequestTimeoutError: If the chunk shows a time limit was exceeded
+        """
+        if self.done:
+            return []
+
+        outputs, events = self._consume(chunk)
+        if self.timer is not None and not self.done:
+            self.timer.on_chunk(events)
+        return outputs
+
+    def _consume(self, chunk: Buffer) -> Tuple[List[Any], int]:
+        """Frame and dispatch a chunk; returns the outputs and the number of events."""
+        outputs: List[Any] = []
+        events = self._decoder.feed(chunk)
+        for event in events:
+            if event.event == "end_of_stream":
+                self.done = True
+                self.complete = True
+                break
+            if not self.stream:
+                self._final.feed(event)
+                continue
+            if self.stream == "latest":
+                if event.data is not None:
+                    self.dropped += self._fresh
+                    self._fresh = True
+                    self._final.feed(event)
+                continue
+            if event.data is None:
+                continue
+            if self._keep_final:
+                self._final.feed(event)
+
+            try:
+                if self._accumulator is not None:
+                    delta = self._accumulator.feed_raw(event.data)
+                    if delta:
+                        outputs.append(delta)
+                    continue
+                content_json = codec.loads(event.data)
+            except codec.JSONDecodeError:
+                continue
+            outputs.append(SearchResult(content_json))
+
+        if self.retain != "none":
+            self.retained.extend(outputs)
+        return outputs, len(events)
+
+    def close(self) -> List[Any]:
+        """
+        Signal the end of the body and flush any unterminated event.
+
+        Returns:
+            Results completed by the flush
+        """
+        if self.done:
+            return []
+        outputs, _ = self._consume(b"\n\n")
+        self.done = True
+        return outputs
+
+    def feed_payloads(self, payloads: Sequence[Buffer], end: bool = False) -> List[Any]:
+        """
+        Consume ``data:`` payloads framed elsewhere, e.g. cached or shared by
+        a coalesced search.
+
+        Args:
+            payloads: Raw payloads, oldest first
+            end: Whether the stream completed after them
+
+        Returns:
+            Results to hand to a streaming consumer; with ``stream="latest"``
+            only the newest snapshot
+        """
+        body = b"".join(
+            b"".join(b"data: " + line + b"\n" for line in bytes(payload).split(b"\n")) + b"\n"
+            for payload in payloads
+        )
+        if end:
+            body += b"event: end_of_stream\n\n"
+        outputs = self.feed(body) if body else []
+        if self.stream == "latest":
+            latest = self.take_latest()
+            outputs = [latest] if latest is not None else []
+        return outputs
+
+    def take_latest(self) -> Optional[SearchResult]:
+        """
+        Newest snapshot not yet handed out, for ``stream="latest"``.
+
+        Returns:
+            Lazily decoded SearchResult, or None if nothing new arrived
+        """
+        if not self._fresh:
+            return None
+        self._fresh = False
+        snapshot = self._final.decode()
+        if self.retain != "none":
+            self.retained.append(snapshot)
+        return snapshot
+
+    def result(self) -> SearchResult:
+        """
+        Final snapshot of the response.
+
+        Returns:
+            Lazily decoded SearchResult over the last ``data:`` payload
+        """
+        return self._final.decode()
+
+    def final_payload(self) -> Optional[bytes]:
+        """
+        Raw final payload of a completed response, as the response cache stores it.
+
+        Returns:
+            The last ``data:`` payload, or None if the stream did not reach
+            ``end_of_stream`` or carried no payload
+        """
+        return self._final.payload if self.complete else None
+
+    def partial_result(self, elapsed: Optional[float] = None) -> Optional[SearchResult]:
+        """
+        Most recent snapshot of an unfinished blocking search.
+
+        Args:
+            elapsed: Seconds the search ran before it was cut short
+
+        Returns:
+            SearchResult marked ``partial``, or None if no snapshot arrived
+        """
+        if not self._final.received:
+            return None
+        return self._final.decode(partial=True, elapsed=elapsed)
+
+
+class SearchProtocol:
+    """
+    Sans-IO description of a single ``search`` call.
+
+    Validates the parameters on construction, then hands out the requests to
+    send (attachment uploads first, then the ask request) and a
+    ``ResponseParser`` for the answer stream.
+
+    Example:
+        >>> protocol = SearchProtocol("What is Python?")
+        >>> request = protocol.search_request(attachments=[])
+        >>> parser = protocol.response_parser()
+    """
+
+    def __init__(
+        self,
+        query: str,
+        mode: str = "auto",
+        model: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+        files: Optional[Dict[str, FileData]] = None,
+        stream: Union[bool, str] = False,
+        language: str = "en-US",
+        follow_up: Optional[Dict[str, Any]] = None,
+        incognito: bool = False,
+        own_account: bool = False,
+        retain: str = "last",
+        timeouts: Optional[Timeouts] = None,
+        deadline: Optional[float] = None,
+        partial_ok: bool = False,
+    ):
+        if sources is None:
+            sources = ["web"]
+        if files is None:
+            files = {}
+
+        validate_search_params(mode=mode, model=model, sources=sources, own_account=own_account)
+        validate_stream_mode(stream)
+        validate_retention(retain)
+        if files:
+            validate_file_data(files)
+        if partial_ok and stream:
+            raise ValidationError(
+                "partial_ok applies to blocking searches; streams already yield partial results"
+            )
+
+        self.query = query
+        self.mode = mode
+        self.model = model
+        self.sources = sources
+        self.stream = stream
+        self.retain = retain
+        self.language = language
+        self.follow_up = follow_up if isinstance(follow_up, Mapping) and follow_up else None
+        self.incognito = incognito
+        self.uploads = [FileUpload(filename, data) for filename, data in files.items()]
+        # The deadline clock starts here, so it also covers uploads
+        self.timer = TimeoutTracker(timeouts, deadline)
+        if partial_ok and self.timer.total is None:
+            raise ValidationError("partial_ok requires a deadline")
+        self.partial_ok = partial_ok
+
+    def reserve_quota(
+        self, copilot_remaining: float, file_upload_remaining: float
+    ) -> Tuple[float, float]:
+        """
+        Check the account limits and charge this search against them.
+
+        Args:
+            copilot_remaining: Remaining enhanced queries
+            file_upload_remaining: Remaining file uploads
+
+        Returns:
+            Updated (copilot_remaining, file_upload_remaining)
+
+        Raises:
+            ValidationError: If the limits are exceeded
+        """
+        validate_query_limits(
+            copilot_remaining=copilot_remaining,
+            file_upload_remaining=file_upload_remaining,
+            mode=self.mode,
+            files_count=len(self.uploads),
+        )
+
+        if self.mode in ENHANCED_MODES:
+            copilot_remaining = max(0, copilot_remaining - 1)
+        if self.uploads:
+            file_upload_remaining = max(0, file_upload_remaining - len(self.uploads))
+        return copilot_remaining, file_upload_remaining
+
+    def upload_url_request(self, upload: FileUpload) -> HTTPRequest:
+        """Request for a signed storage URL for one attachment."""
+        return HTTPRequest(
+            "POST",
+            ENDPOINT_UPLOAD_URL,
+            params={"version": API_VERSION, "source": "default"},
+            headers=JSON_HEADERS,
+            data=codec.dumpb(
+                {
+                    "content_type": upload.content_type,
+                    "file_size": upload.size,
+                    "filename": upload.filename,
+                    "force_image": False,
+                    "source": "default",
+                }
+            ),
+            timeout=self.timer.request_timeout(self.timer.timeouts.idle),
+            expires_at=self.timer.expires_at,
+            endpoint="upload_url",
+        )
+
+    def upload_request(self, upload: FileUpload, upload_info: Dict[str, Any]) -> HTTPRequest:
+        """Multipart request that stores the attachment in the signed bucket."""
+        return HTTPRequest(
+            "POST",
+            upload_info["s3_bucket_url"],
+            multipart=MultipartBody(upload_info.get("fields", {}), upload),
+            timeout=self.timer.request_timeout(self.timer.timeouts.idle),
+            expires_at=self.timer.expires_at,
+            endpoint="upload",
+        )
+
+    def parse_upload_info(self, status_code: int, body: bytes) -> Dict[str, Any]:
+        """
+        Parse the response of ``upload_url_request``.
+
+        Raises:
+            FileUploadError: If the upload URL could not be obtained
+        """
+        if status_code >= 400:
+            raise FileUploadError(f"Failed to get upload URL: {status_code}")
+        try:
+            upload_info = codec.loads(body)
+        except codec.JSONDecodeError as e:
+            raise FileUploadError(f"Invalid upload URL response: {e}") from e
+        if not isinstance(upload_info, dict) or "s3_bucket_url" not in upload_info:
+            raise FileUploadError("Upload URL response is missing 's3_bucket_url'")
+        return upload_info
+
+    def uploaded_url(self, upload_info: Dict[str, Any], status_code: int, body: bytes) -> str:
+        """
+        Resolve the attachment URL from the storage upload response.
+
+        Raises:
+            FileUploadError: If the storage upload failed
+        """
+        if status_code >= 400:
+            raise FileUploadError(f"File upload to storage failed: {status_code}")
+
+        object_url: str = upload_info.get("s3_object_url", "")
+        if "image/upload" not in object_url:
+            return object_url
+
+        try:
+            secure_url = codec.loads(body).get("secure_url", object_url)
+        except (codec.JSONDecodeError, AttributeError):
+            secure_url = object_url
+        return re.sub(r"/private/s--.*?--/v\d+/user_uploads/", "/private/user_uploads/", secure_url)
+
+    def search_request(self, attachments: List[str]) -> HTTPRequest:
+        """
+        The ask request itself.
+
+        Args:
+            attachments: URLs of the uploaded attachments, in order
+
+        Returns:
+            Streaming POST request for the ask endpoint
+        """
+        follow_up = self.follow_up
+        json_data = {
+            "query_str": self.query,
+            "params": {
+                "attachments": (
+                    attachments + list(follow_up.get("attachments", []))
+                    if follow_up
+                    else attachments
+                ),
+                "frontend_context_uuid": str(uuid4()),
+                "frontend_uuid": str(uuid4()),
+                "is_incognito": self.incognito,
+                "language": self.language,
+                "last_backend_uuid": follow_up.get("backend_uuid") if follow_up else None,
+                "mode": "concise" if self.mode == "auto" else "copilot",
+                "model_preference": MODEL_MAPPINGS.get(self.mode, {}).get(self.model, "turbo"),
+                "source": "default",
+                "sources": self.sources,
+                "version": API_VERSION,
+            },
+        }
+        return HTTPRequest(
+            "POST",
+            ENDPOINT_SSE_ASK,
+            headers=JSON_HEADERS,
+            data=codec.dumpb(json_data),
+            timeout=self.timer.stream_timeout(),
+            expires_at=self.timer.expires_at,
+            endpoint="ask",
+        )
+
+    def response_parser(self, keep_final: bool = False) -> ResponseParser:
+        """
+        New parser for the answer stream in this search's streaming mode.
+
+        Call once the response headers have arrived: the first-event limit
+        starts counting from here.
+
+        Args:
+            keep_final: Keep the final payload of streamed searches too
+        """
+        self.timer.start_stream()
+        return ResponseParser(self.stream, self.retain, timer=self.timer, keep_final=keep_final)
+
+    def cached_parser(self, payload: Buffer) -> Tuple[ResponseParser, List[Any]]:
+        """
+        Parser that replays a cached answer instead of reading the network.
+
+        Args:
+            payload: Final payload stored by the response cache
+
+        Returns:
+            The parser (``result()`` is the cached snapshot) and the one result
+            a streamed search yields
+        """
+        parser = ResponseParser(self.stream, self.retain)
+        return parser, parser.feed_payloads([payload], end=True)
+
+    def partial_result(self, parser: ResponseParser, error: RequestTimeoutError) -> SearchResult:
+        """
+        Answer to return when the answer stream hits a time limit.
+
+        With ``partial_ok`` a search cut short by its deadline returns the most
+        recent snapshot instead of failing; the caller must still cancel the
+        transfer.
+
+        Args:
+            parser: Parser of the interrupted answer stream
+            error: The time limit that was hit
+
+        Returns:
+            Latest snapshot, marked ``partial`` with the elapsed time
+
+        Raises:
+            RequestTimeoutError: ``error`` itself, unless it is the deadline,
+                ``partial_ok`` is set and at least one snapshot arrived
+        """
+        if self.partial_ok and error.phase == "deadline":
+            result = parser.partial_result(elapsed=self.timer.elapsed())
+            if result is not None:
+                return result
+        raise error
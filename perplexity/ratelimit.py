@@ -0,0 +1,185 @@
+"""
+Client-side rate limiting for Perplexity AI searches.
+
+``RateLimiter`` holds one token bucket per group of search modes and can be
+attached to any number of sync or async clients, which then draw a token
+before every ask request (retries included). Buckets allow short bursts and
+refill at a steady rate, so a busy application runs at the highest rate the
+buckets sustain instead of tripping the server's own limits.
+
+Reservations are made under a short lock and the waiting happens outside it,
+with ``time.sleep`` or ``asyncio.sleep``, so one limiter can be shared by
+threads and tasks alike. Callers are served in the order they reserved.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from .config import RATE_LIMIT_BUCKETS
+from .exceptions import ValidationError
+from .hooks import Hooks
+from .protocol import ENHANCED_MODES
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Args:
+        rate: Tokens added per second
+        burst: Capacity, i.e. how many requests may go out back to back
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> bucket = TokenBucket(rate=2, burst=5)
+        >>> wait = bucket.reserve()
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        if isinstance(rate, bool) or not rate > 0:
+            raise ValidationError("Token bucket rate must be a positive number")
+        if isinstance(burst, bool) or not burst >= 1:
+            raise ValidationError("Token bucket burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def __repr__(self) -> str:
+        return f"TokenBucket(rate={self.rate}, burst={self.burst})"
+
+    @property
+    def available(self) -> float:
+        """Tokens available right now (negative while reservations are queued)."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def reserve(self, tokens: float = 1, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take tokens, on credit if the bucket is short.
+
+        Args:
+            tokens: Tokens to take (at most ``burst``)
+            max_wait: Longest acceptable wait; nothing is taken if it is exceeded
+
+        Returns:
+            Seconds to wait before using the tokens, or None if over ``max_wait``
+        """
+        if tokens > self.burst:
+            raise ValidationError(f"Cannot take {tokens} tokens from a bucket of {self.burst}")
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= tokens
+            return wait
+
+    def refund(self, tokens: float = 1) -> None:
+        """Return tokens whose reservation was abandoned."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    Token buckets per search mode, shareable between clients, threads and tasks.
+
+    A search draws from the bucket named after its mode if there is one, then
+    from ``"enhanced"`` for pro, reasoning and deep research, then from
+    ``"*"``. Modes without a bucket are not limited.
+
+    Args:
+        buckets: Bucket name to ``(requests per second, burst)``; defaults to
+            ``RATE_LIMIT_BUCKETS``
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> limiter = RateLimiter({"auto": (1, 10), "enhanced": (0.2, 3)})
+        >>> client_a = Client(rate_limiter=limiter)
+        >>> client_b = Client(rate_limiter=limiter)  # shares the same budget
+    """
+
+    def __init__(
+        self,
+        buckets: Optional[Dict[str, Tuple[float, float]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        specs = buckets if buckets is not None else RATE_LIMIT_BUCKETS
+        self.buckets: Dict[str, TokenBucket] = {
+            name: TokenBucket(rate, burst, clock) for name, (rate, burst) in specs.items()
+        }
+
+    def __repr__(self) -> str:
+        return f"RateLimiter({self.buckets!r})"
+
+    def bucket_for(self, mode: str) -> Optional[str]:
+        """Name of the bucket a search mode draws from, or None if unlimited."""
+        for name in (mode, "enhanced" if mode in ENHANCED_MODES else None, "*"):
+            if name in self.buckets:
+                return name
+        return None
+
+    def acquire(
+        self, mode: str, max_wait: Optional[float] = None, hooks: Optional[Hooks] = None
+    ) -> Optional[float]:
+        """
+        Wait for a token for one request, blocking the calling thread.
+
+        Args:
+            mode: Search mode of the request
+            max_wait: Longest acceptable wait, e.g. the time left before a deadline
+            hooks: Receives a ``throttle`` event before any wait
+
+        Returns:
+            Seconds waited, or None (without waiting) if over ``max_wait``
+        """
+        wait = self._reserve(mode, max_wait, hooks)
+        if wait:
+            try:
+                time.sleep(wait)
+            except BaseException:
+                self._refund(mode)
+                raise
+        return wait
+
+    async def aacquire(
+        self, mode: str, max_wait: Optional[float] = None, hooks: Optional[Hooks] = None
+    ) -> Optional[float]:
+        """Async ``acquire``: waits with ``asyncio.sleep`` and refunds the token if cancelled."""
+        wait = self._reserve(mode, max_wait, hooks)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                self._refund(mode)
+                raise
+        return wait
+
+    def _refund(self, mode: str) -> None:
+        """Return the token reserved by a wait that was interrupted."""
+        name = self.bucket_for(mode)
+        if name is not None:
+            self.buckets[name].refund()
+
+    def _reserve(
+        self, mode: str, max_wait: Optional[float], hooks: Optional[Hooks]
+    ) -> Optional[float]:
+        name = self.bucket_for(mode)
+        if name is None:
+            return 0.0
+        wait = self.buckets[name].reserve(max_wait=max_wait)
+        if wait and hooks is not None:
+            hooks.emit("throttle", mode=mode, bucket=name, wait=wait)
+        return wait
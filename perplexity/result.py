@@ -0,0 +1,269 @@
+"""
+Lazy search result container for Perplexity AI responses.
+
+The ask endpoint nests its payload several levels deep: the ``text`` field
+is a JSON string holding the list of steps, and the FINAL step's ``answer``
+is itself another JSON string. ``SearchResult`` keeps the raw payload and
+only decodes those levels when a caller actually reads them.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from . import codec
+from .logger import get_logger
+
+logger = get_logger("result")
+
+_MISSING = object()
+
+# Held in a result's dict until it is filled in, so that C code which reads
+# the storage of a dict subclass directly (``json.dumps`` skips an empty one)
+# goes through the filling methods instead
+_UNFILLED = object()
+
+# Keys computed from the nested payload rather than read from it directly
+_DERIVED_KEYS = ("answer", "chunks", "steps", "web_results")
+
+
+class SearchResult(Dict[str, Any]):
+    """
+    Lazily decoded dict holding a single search response.
+
+    It is the dict returned by previous versions (``isinstance(result, dict)``,
+    ``json.dumps(result)``, ``result["key"] = value``), but looking a key up
+    (``result["answer"]``, ``result.get("blocks", [])``, ``"chunks" in result``)
+    only decodes the nested levels it needs, memoising them. ``result["text"]``
+    returns the decoded step list, as ``parse_nested_json_response`` did. The
+    dict itself is only filled in by the first operation on the whole of it,
+    such as iterating, comparing, serialising or changing it.
+
+    Args:
+        raw: Raw ``data:`` payload (bytes or str) or an already decoded dict
+        partial: True if the search stopped at its deadline before finishing
+        elapsed: Seconds the search ran, when known
+
+    Example:
+        >>> result = client.search("What is Python?")
+        >>> print(result.answer)
+        >>> payload = result.to_dict()
+    """
+
+    __slots__ = ("_raw", "_data", "_memo", "_filled", "partial", "elapsed")
+
+    def __init__(
+        self,
+        raw: Union[bytes, str, Dict[str, Any], None] = None,
+        partial: bool = False,
+        elapsed: Optional[float] = None,
+    ):
+        super().__init__()
+        dict.__setitem__(self, _UNFILLED, None)  # type: ignore[misc]
+        self._raw: Union[bytes, str, Dict[str, Any]] = raw if raw is not None else {}
+        self._data: Optional[Dict[str, Any]] = self._raw if isinstance(self._raw, dict) else None
+        self._memo: Dict[str, Any] = {}
+        self._filled = False
+        self.partial = partial
+        self.elapsed = elapsed
+
+    @property
+    def raw(self) -> Union[bytes, str, Dict[str, Any]]:
+        """The payload exactly as received."""
+        return self._raw
+
+    @property
+    def answer(self) -> str:
+        """Final answer text, or an empty string if the response has none."""
+        answer: str = self.get("answer", "")
+        return answer
+
+    @property
+    def chunks(self) -> List[Any]:
+        """Answer chunks from the FINAL step."""
+        chunks: List[Any] = self.get("chunks", [])
+        return chunks
+
+    @property
+    def steps(self) -> List[Dict[str, Any]]:
+        """Decoded step list from the ``text`` field."""
+        steps: List[Dict[str, Any]] = self.get("steps", [])
+        return steps
+
+    @property
+    def web_results(self) -> List[Dict[str, Any]]:
+        """Citations attached to the answer."""
+        web_results: List[Dict[str, Any]] = self.get("web_results", [])
+        return web_results
+
+    @property
+    def blocks(self) -> List[Dict[str, Any]]:
+        """Structured answer blocks."""
+        blocks: List[Dict[str, Any]] = self.get("blocks", [])
+        return blocks
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Materialise the result as a plain dict.
+
+        Returns:
+            Dict shaped like the output of ``parse_nested_json_response``
+        """
+        return dict(self._fill())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key: str) -> Any:
+        if self._filled:
+            return dict.__getitem__(self, key)
+        if key in _DERIVED_KEYS:
+            value = self._derive(key)
+            if value is not _MISSING:
+                return value
+        elif key == "text":
+            steps = self._derive("steps")
+            if steps is not _MISSING:
+                return steps
+        return self._payload()[key]
+
+    def __contains__(self, key: object) -> bool:
+        if self._filled:
+            return dict.__contains__(self, key)
+        try:
+            self[key]  # type: ignore[index]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SearchResult):
+            other._fill()
+        return dict.__eq__(self._fill(), other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        if self.partial:
+            return f"SearchResult({self.to_dict()!r}, partial=True)"
+        return f"SearchResult({self.to_dict()!r})"
+
+    def __reduce__(self) -> Any:
+        return SearchResult, (self.to_dict(), self.partial, self.elapsed)
+
+    def copy(self) -> "SearchResult":
+        return SearchResult(self.to_dict(), self.partial, self.elapsed)
+
+    def _fill(self) -> "SearchResult":
+        """Fill the dict in with every key, decoding whatever is still encoded."""
+        if not self._filled:
+            payload = self._payload()
+            keys = list(payload)
+            keys += [
+                k for k in _DERIVED_KEYS if k not in payload and self._derive(k) is not _MISSING
+            ]
+            items = {key: self[key] for key in keys}
+            dict.clear(self)
+            dict.update(self, items)
+            self._filled = True
+        return self
+
+    def _payload(self) -> Dict[str, Any]:
+        """Decode the outer JSON payload on first use."""
+        if self._data is None:
+            assert not isinstance(self._raw, dict)  # decoded payloads are set in __init__
+            try:
+                data = codec.loads(self._raw)
+            except (codec.JSONDecodeError, TypeError, UnicodeDecodeError) as e:
+                logger.warning(f"Could not decode search response payload: {e}")
+                data = {}
+            self._data = data if isinstance(data, dict) else {}
+        return self._data
+
+    def _derive(self, key: str) -> Any:
+        """Compute and memoise one of the nested values."""
+        value = self._memo.get(key, _MISSING)
+        if value is _MISSING and key not in self._memo:
+            value = getattr(self, f"_compute_{key}")()
+            self._memo[key] = value
+        return value
+
+    def _compute_steps(self) -> Any:
+        raw_text = self._payload().get("text")
+        if not raw_text:
+            return _MISSING
+        try:
+            steps = codec.loads(raw_text) if isinstance(raw_text, str) else raw_text
+        except (codec.JSONDecodeError, TypeError):
+            return _MISSING
+        return steps if isinstance(steps, list) else _MISSING
+
+    def _compute_final(self) -> Any:
+        steps = self._derive("steps")
+        if steps is _MISSING:
+            return _MISSING
+        for step in steps:
+            if isinstance(step, dict) and step.get("step_type") == "FINAL":
+                content = step.get("content", {})
+                if not isinstance(content, dict) or "answer" not in content:
+                    return _MISSING
+                try:
+                    raw_answer = content["answer"]
+                    answer = codec.loads(raw_answer) if isinstance(raw_answer, str) else raw_answer
+                except (codec.JSONDecodeError, TypeError):
+                    return _MISSING
+                return answer if isinstance(answer, dict) else _MISSING
+        return _MISSING
+
+    def _compute_answer(self) -> Any:
+        final = self._derive("final")
+        return final.get("answer", "") if final is not _MISSING else _MISSING
+
+    def _compute_chunks(self) -> Any:
+        final = self._derive("final")
+        return final.get("chunks", []) if final is not _MISSING else _MISSING
+
+    def _compute_web_results(self) -> Any:
+        final = self._derive("final")
+        if final is not _MISSING and "web_results" in final:
+            return final["web_results"]
+        for block in self._payload().get("blocks") or ():
+            if isinstance(block, dict) and isinstance(block.get("web_result_block"), dict):
+                return block["web_result_block"].get("web_results", [])
+        return _MISSING
+
+
+def _filling(name: str) -> Callable[..., Any]:
+    """A dict method of ``SearchResult`` that fills the dict in before running."""
+    method = getattr(dict, name)
+
+    def run(self: SearchResult, *args: Any, **kwargs: Any) -> Any:
+        return method(self._fill(), *args, **kwargs)
+
+    run.__name__ = name
+    run.__doc__ = method.__doc__
+    return run
+
+
+# Operations on the whole dict, or changing it, see every key
+for _name in (
+    "__iter__",
+    "__len__",
+    "__reversed__",
+    "__or__",
+    "__ior__",
+    "keys",
+    "values",
+    "items",
+    "__setitem__",
+    "__delitem__",
+    "pop",
+    "popitem",
+    "setdefault",
+    "update",
+    "clear",
+):
+    if hasattr(dict, _name):  # __reversed__ and the | operators are Python 3.8/3.9+
+        setattr(SearchResult, _name, _filling(_name))
@@ -0,0 +1,214 @@
+"""
+Retry policy for Perplexity AI searches.
+
+``RetryPolicy`` decides whether a failed ask request may be sent again and
+how long to wait first. It is shared by the sync and async clients: ``call``
+sleeps with ``time.sleep`` and ``acall`` with ``asyncio.sleep``, and both
+stay within the search's deadline.
+
+A search is only retried while the server has not started answering, i.e.
+up to and including the status check of the ask request. Once the answer
+stream is open nothing is re-sent, so a streaming consumer never sees answer
+bytes from two different attempts and a blocking search is never asked twice
+after the server accepted it.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from curl_cffi.const import CurlECode
+from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError
+
+from .config import RETRY_BACKOFF_FACTOR, RETRY_BASE_DELAY, RETRY_MAX_ATTEMPTS, RETRY_MAX_DELAY
+from .exceptions import NetworkError, RateLimitError, RequestTimeoutError, ValidationError
+from .hooks import Hooks
+from .logger import get_logger
+from .timeouts import TimeoutTracker
+
+logger = get_logger("retry")
+
+# curl failures that happen before any byte of the request is sent
+_PRE_SEND_ERRORS = (
+    CurlECode.COULDNT_RESOLVE_HOST,
+    CurlECode.COULDNT_CONNECT,
+    CurlECode.QUIC_CONNECT_ERROR,
+)
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    """
+    When and how often to re-send a failed ask request.
+
+    Retries 429s, 5xx responses, failures to connect and connect timeouts.
+    The wait before attempt ``n + 1`` is the server's ``Retry-After`` when it
+    sent one, otherwise a "full jitter" backoff drawn uniformly from
+    ``[0, min(max_delay, base_delay * backoff_factor ** (n - 1))]``.
+
+    Args:
+        max_attempts: Attempts in total, the first one included (1 disables retries)
+        base_delay: Backoff ceiling for the first retry, in seconds
+        max_delay: Cap on the backoff; a longer ``Retry-After`` ends the retries
+        backoff_factor: Growth of the backoff ceiling per attempt
+        rand: Source of uniform numbers in [0, 1), replaceable in tests
+
+    Example:
+        >>> client = Client(retry=RetryPolicy(max_attempts=5, max_delay=10))
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        backoff_factor: float = RETRY_BACKOFF_FACTOR,
+        rand: Callable[[], float] = random.random,
+    ):
+        if isinstance(max_attempts, bool) or not isinstance(max_attempts, int) or max_attempts < 1:
+            raise ValidationError("max_attempts must be a positive integer")
+        if base_delay < 0 or max_delay < 0 or backoff_factor < 1:
+            raise ValidationError("Retry delays must be non-negative and backoff_factor >= 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self._rand = rand
+
+    def __repr__(self) -> str:
+        return (
+            f"RetryPolicy(max_attempts={self.max_attempts}, base_delay={self.base_delay}, "
+            f"max_delay={self.max_delay}, backoff_factor={self.backoff_factor})"
+        )
+
+    @staticmethod
+    def retryable(error: BaseException) -> bool:
+        """
+        Whether an error leaves the ask request safe and worth re-sending.
+
+        Args:
+            error: Exception raised by the attempt
+
+        Returns:
+            True for rate limiting, server errors and failures to connect; a
+            connection that broke or timed out after the request may have
+            been sent is not retried
+        """
+        if isinstance(error, RateLimitError):
+            return True
+        if isinstance(error, RequestTimeoutError):
+            # Only a connect timeout is known to precede the server's answer
+            return error.phase == "connect"
+        if isinstance(error, NetworkError):
+            return error.status_code is not None and error.status_code >= 500
+        return isinstance(error, CurlConnectionError) and error.code in _PRE_SEND_ERRORS
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        Wait before the attempt after ``attempt``.
+
+        Args:
+            attempt: Number of the attempt that failed, starting at 1
+            error: Exception raised by that attempt
+
+        Returns:
+            Seconds to wait
+        """
+        retry_after: Optional[float] = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.max_delay, self.base_delay * self.backoff_factor ** (attempt - 1))
+        return self._rand() * ceiling
+
+    def next_delay(
+        self, attempt: int, error: BaseException, remaining: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Decide whether to retry after a failed attempt.
+
+        Args:
+            attempt: Number of the attempt that failed, starting at 1
+            error: Exception raised by that attempt
+            remaining: Seconds left before the search's deadline, if it has one
+
+        Returns:
+            Seconds to wait before retrying, or None to give up
+        """
+        if attempt >= self.max_attempts or not self.retryable(error):
+            return None
+        delay = self.backoff(attempt, error)
+        if delay > self.max_delay:
+            return None
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def call(
+        self,
+        func: Callable[[], T],
+        timer: Optional[TimeoutTracker] = None,
+        hooks: Optional[Hooks] = None,
+        **context: Any,
+    ) -> T:
+        """
+        Run ``func`` until it succeeds or the policy gives up.
+
+        Args:
+            func: The attempt to run
+            timer: Tracker of the search's deadline
+            hooks: Receives a ``retry`` event before each wait
+            **context: Extra fields for the ``retry`` event
+
+        Returns:
+            The first successful result
+
+        Raises:
+            Exception: The last attempt's error when the policy gives up
+        """
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                delay = self._schedule(attempt, e, timer, hooks, context)
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(
+        self,
+        func: Callable[[], Awaitable[T]],
+        timer: Optional[TimeoutTracker] = None,
+        hooks: Optional[Hooks] = None,
+        **context: Any,
+    ) -> T:
+        """Async ``call``: awaits ``func()`` and waits with ``asyncio.sleep``."""
+        attempt = 1
+        while True:
+            try:
+                return await func()
+            except Exception as e:
+                delay = self._schedule(attempt, e, timer, hooks, context)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _schedule(
+        self,
+        attempt: int,
+        error: Exception,
+        timer: Optional[TimeoutTracker],
+        hooks: Optional[Hooks],
+        context: dict,
+    ) -> float:
+        """Delay before the next attempt; re-raises ``error`` when giving up."""
+        remaining = timer.remaining() if timer is not None else None
+        delay = self.next_delay(attempt, error, remaining)
+        if delay is None:
+            raise error
+        logger.warning(
+            f"Attempt {attempt}/{self.max_attempts} failed: {error}. Retrying in {delay:.2f}s..."
+        )
+        if hooks is not None:
+            hooks.emit("retry", attempt=attempt, delay=delay, error=error, **context)
+        return delay
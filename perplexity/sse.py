@@ -0,0 +1,218 @@
+"""
+Server-sent events framing for Perplexity AI responses.
+
+The framer works directly on the raw ``bytes`` delivered by the transport:
+lines are located with ``bytes.find`` and ``data:`` values are handed out as
+``memoryview`` slices of the received buffer, so a JSON decoder can consume
+them without first decoding the frame to ``str`` or copying it.
+"""
+
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional, Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_LF = 0x0A
+_CR = 0x0D
+_COLON = 0x3A
+_SPACE = 0x20
+
+
+class SSEEvent:
+    """
+    A single dispatched server-sent event.
+
+    Attributes:
+        event: Event type (``message`` unless an ``event:`` field was sent)
+        data: Event data as a zero-copy view for single-line data, bytes for
+            multi-line data, or None if the event carried no ``data:`` field
+        id: Last event ID seen on the stream, if any
+    """
+
+    __slots__ = ("event", "data", "id")
+
+    def __init__(
+        self,
+        event: str = "message",
+        data: Optional[Buffer] = None,
+        id: Optional[str] = None,
+    ):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    def __repr__(self) -> str:
+        size = len(self.data) if self.data is not None else 0
+        return f"SSEEvent(event={self.event!r}, data=<{size} bytes>, id={self.id!r})"
+
+
+class SSEDecoder:
+    """
+    Incremental SSE parser following the WHATWG event stream format.
+
+    Accepts arbitrary chunks of the response body (lines may be split across
+    chunks and terminated by CRLF, LF or CR), supports ``event:``, ``data:``,
+    ``id:`` and comment lines, and joins multi-line ``data:`` fields with
+    ``\\n``. Unlike the browser API, an event with an ``event:`` field but no
+    data is still dispatched, since Perplexity signals ``end_of_stream`` that way.
+
+    Example:
+        >>> decoder = SSEDecoder()
+        >>> for chunk in resp.iter_content():
+        ...     for event in decoder.feed(chunk):
+        ...         print(event.event, bytes(event.data or b""))
+    """
+
+    __slots__ = ("_pending", "_event", "_data", "_last_id")
+
+    def __init__(self) -> None:
+        self._pending: List[bytes] = []
+        self._event: Optional[str] = None
+        self._data: List[memoryview] = []
+        self._last_id: Optional[str] = None
+
+    def feed(self, chunk: Buffer) -> List[SSEEvent]:
+        """
+        Consume a chunk of the response body.
+
+        Args:
+            chunk: Raw bytes as received from the transport
+
+        Returns:
+            Events completed by this chunk, in order
+        """
+        if not isinstance(chunk, bytes):
+            chunk = bytes(chunk)
+        if not chunk:
+            return []
+
+        # Until a line terminator arrives there is nothing to parse; keep the
+        # pieces and join them once so long lines are not copied repeatedly.
+        if b"\n" not in chunk and b"\r" not in chunk:
+            self._pending.append(chunk)
+            return []
+        if self._pending:
+            self._pending.append(chunk)
+            chunk = b"".join(self._pending)
+            self._pending = []
+
+        events: List[SSEEvent] = []
+        view = memoryview(chunk)
+        size = len(chunk)
+        pos = 0
+
+        while pos < size:
+            lf = chunk.find(b"\n", pos)
+            cr = chunk.find(b"\r", pos, lf if lf != -1 else size)
+            if cr != -1:
+                if cr + 1 == size:
+                    # Possibly the first half of a CRLF split across chunks
+                    break
+                end = cr
+                next_pos = cr + 2 if chunk[cr + 1] == _LF else cr + 1
+            elif lf != -1:
+                end = lf
+                next_pos = lf + 1
+            else:
+                break
+
+            event = self._process_line(chunk, view, pos, end)
+            if event is not None:
+                events.append(event)
+            pos = next_pos
+
+        if pos < size:
+            self._pending.append(chunk[pos:])
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """
+        Dispatch whatever is left when the stream ends without a blank line.
+
+        Returns:
+            The final pending event, if any
+        """
+        events = self.feed(b"\n\n") if self._pending else []
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(
+        self, buf: bytes, view: memoryview, start: int, end: int
+    ) -> Optional[SSEEvent]:
+        if start == end:
+            return self._dispatch()
+        if buf[start] == _COLON:
+            return None  # comment
+
+        colon = buf.find(b":", start, end)
+        if colon == -1:
+            field = buf[start:end]
+            value_start = end
+        else:
+            field = buf[start:colon]
+            value_start = colon + 1
+            if value_start < end and buf[value_start] == _SPACE:
+                value_start += 1
+
+        if field == b"data":
+            self._data.append(view[value_start:end])
+        elif field == b"event":
+            self._event = buf[value_start:end].decode("utf-8", "replace")
+        elif field == b"id":
+            value = buf[value_start:end]
+            if b"\x00" not in value:
+                self._last_id = value.decode("utf-8", "replace")
+        # "retry" and unknown fields are ignored
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        if not self._data and self._event is None:
+            return None
+
+        data: Optional[Buffer]
+        if not self._data:
+            data = None
+        elif len(self._data) == 1:
+            data = self._data[0]
+        else:
+            data = b"\n".join(self._data)
+
+        event = SSEEvent(self._event or "message", data, self._last_id)
+        self._event = None
+        self._data = []
+        return event
+
+
+def iter_events(chunks: Iterable[Buffer]) -> Iterator[SSEEvent]:
+    """
+    Frame a synchronous byte stream into SSE events.
+
+    Args:
+        chunks: Iterable of raw body chunks, e.g. ``resp.iter_content()``
+
+    Yields:
+        Parsed SSE events
+    """
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_events(chunks: AsyncIterable[Buffer]) -> AsyncIterator[SSEEvent]:
+    """
+    Frame an asynchronous byte stream into SSE events.
+
+    Args:
+        chunks: Async iterable of raw body chunks, e.g. ``resp.aiter_content()``
+
+    Yields:
+        Parsed SSE events
+    """
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
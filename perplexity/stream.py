@@ -0,0 +1,774 @@
+"""
+Incremental streaming helpers for Perplexity AI search responses.
+
+Every SSE event sent by the ask endpoint carries a cumulative snapshot of
+the answer. This module folds those snapshots into small per-event deltas,
+keeps only the final payload for blocking searches, conflates snapshots for
+slow consumers and wraps streamed searches in iterator objects.
+"""
+
+import asyncio
+import re
+import threading
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+)
+
+from . import codec
+from .config import CLOSE_TIMEOUT
+from .logger import get_logger
+from .result import SearchResult
+from .sse import Buffer, SSEEvent
+
+logger = get_logger("stream")
+
+# Top-level ``text`` key and ``ask_text`` ``answer`` key of a raw ask payload, each followed
+# by the opening quote of its value, and the rest of a JSON string body up to its closing quote
+_TEXT_FIELD = re.compile(rb'"text"\s*:\s*"')
+_ANSWER_FIELD = re.compile(rb'"answer"\s*:\s*"')
+_STRING_BODY = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+
+
+class DeltaAccumulator:
+    """
+    Folds cumulative SSE snapshots into deltas.
+
+    The accumulator keeps the answer text, steps and citations seen so far and,
+    for each new snapshot, reports only what was appended since the previous
+    one. Only the steps appended to the ``text`` step list are decoded, and
+    the doubly encoded FINAL answer only once the FINAL step shows up.
+    ``feed_raw`` goes further and cuts the step list and the answer text out
+    of the raw payload before decoding it, decoding only what they gained
+    since the previous event, so the decoding work per event does not grow
+    with the length of the answer.
+
+    Example:
+        >>> acc = DeltaAccumulator()
+        >>> for event in events:
+        ...     delta = acc.feed(event)
+        ...     if delta:
+        ...         print(delta["answer"], end="")
+    """
+
+    def __init__(self) -> None:
+        self.answer = ""
+        self.steps: List[Dict[str, Any]] = []
+        self.web_results: List[Dict[str, Any]] = []
+        self.final = False
+        self.backend_uuid: Optional[str] = None
+        self._steps_head: Optional[str] = None
+        self._step_count = 0
+        self._raw_steps = bytearray()
+        self._raw_answer = bytearray()
+        self._raw_answer_length = 0
+        self._md_chunks = 0
+        self._seen_urls: Set[str] = set()
+
+    def feed(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Consume one decoded SSE event.
+
+        Args:
+            event: Decoded ``data:`` payload of a single SSE event
+
+        Returns:
+            Delta dict with ``answer`` (newly appended text), ``steps`` and
+            ``web_results`` (newly added items), ``final`` and
+            ``backend_uuid``; or None when the event adds nothing new.
+        """
+        if not isinstance(event, dict):
+            return None
+        return self._merge(event, self._feed_steps(event.get("text")))
+
+    def feed_raw(self, data: Buffer) -> Optional[Dict[str, Any]]:
+        """
+        Consume the raw ``data:`` payload of one SSE event.
+
+        Same as ``feed(codec.loads(data))``, except that the top-level ``text``
+        step list and the ``ask_text`` answer are cut out of the payload
+        before the rest is decoded. When they extend what previous events
+        sent, only the new tail of each is decoded.
+
+        Args:
+            data: Raw ``data:`` payload of a single SSE event
+
+        Returns:
+            Delta dict as returned by ``feed``, or None
+
+        Raises:
+            codec.JSONDecodeError: If the payload is not valid JSON
+        """
+        view = memoryview(data)
+        try:
+            text_span = self._locate(view, _TEXT_FIELD, self._raw_steps)
+            answer_span = self._locate(view, _ANSWER_FIELD, self._raw_answer)
+        except ValueError:
+            return self.feed(codec.loads(data))
+
+        pieces: List[memoryview] = []
+        position = 0
+        for start, _, end in sorted(span for span in (text_span, answer_span) if span):
+            pieces.append(view[position:start])
+            position = end
+        pieces.append(view[position:])
+        event = codec.loads(b"".join(pieces))
+
+        markdown_block = _answer_block(event) if answer_span else None
+        if not (
+            isinstance(event, dict)
+            and (text_span is None or event.get("text") == "")
+            and (answer_span is None or markdown_block is not None)
+        ):
+            # A cut-out string was not the step list or the answer after all
+            return self.feed(codec.loads(data))
+
+        new_steps = self._feed_raw_steps(view, text_span) if text_span else []
+        new_text = None
+        if answer_span and markdown_block is not None:
+            new_text = self._feed_raw_answer(view, answer_span, markdown_block)
+        return self._merge(event, new_steps, new_text)
+
+    def _merge(
+        self,
+        event: Dict[str, Any],
+        new_steps: List[Dict[str, Any]],
+        new_text: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Fold the rest of a decoded event into the state and build its delta."""
+        if event.get("backend_uuid"):
+            self.backend_uuid = event["backend_uuid"]
+
+        if new_text is None:
+            new_text = self._feed_blocks(event.get("blocks"))
+
+        new_results: List[Dict[str, Any]] = []
+        for block in event.get("blocks") or ():
+            if isinstance(block, dict) and isinstance(block.get("web_result_block"), dict):
+                new_results.extend(
+                    self._add_web_results(block["web_result_block"].get("web_results"))
+                )
+
+        for step in new_steps:
+            if step.get("step_type") != "FINAL":
+                continue
+            self.final = True
+            final_answer = self._decode_final(step.get("content"))
+            if final_answer is None:
+                continue
+            full_text = final_answer.get("answer", "")
+            if isinstance(full_text, str) and full_text.startswith(self.answer):
+                new_text += full_text[len(self.answer) :]
+                self.answer = full_text
+            new_results.extend(self._add_web_results(final_answer.get("web_results")))
+
+        if event.get("final") or event.get("status") == "COMPLETED":
+            self.final = True
+
+        if not (new_text or new_steps or new_results or self.final):
+            return None
+
+        return {
+            "answer": new_text,
+            "steps": new_steps,
+            "web_results": new_results,
+            "final": self.final,
+            "backend_uuid": self.backend_uuid,
+        }
+
+    def _locate(
+        self, view: memoryview, pattern: Pattern[bytes], known: bytearray
+    ) -> Optional[Tuple[int, int, int]]:
+        """
+        Find the string value of a key in a raw payload.
+
+        Returns the offsets of the start of the string body, of the end of the
+        part of it equal to ``known`` (the start when it does not begin with
+        ``known``) and of its closing quote; or None when the key is missing.
+
+        Raises:
+            ValueError: If the key is repeated or its value is malformed
+        """
+        match = pattern.search(view)
+        if match is None:
+            return None
+        if pattern.search(view, match.end()) is not None:
+            raise ValueError("key is repeated")
+
+        start = resume = match.end()
+        if known and known == view[start : start + len(known)]:
+            resume += len(known)
+        body = _STRING_BODY.match(view, resume)
+        end = body.end() if body is not None else resume
+        if view[end : end + 1] != b'"':
+            raise ValueError("unterminated string")
+        return start, resume, end
+
+    def _feed_raw_steps(self, view: memoryview, span: Tuple[int, int, int]) -> List[Dict[str, Any]]:
+        """Decode the steps appended to the escaped step list found at ``span``."""
+        start, resume, end = span
+        if end == start:
+            return []
+        closed = view[end - 1 : end] == b"]"
+        if resume > start and closed:
+            try:
+                tail = codec.loads(b'"' + view[resume:end] + b'"')
+            except codec.JSONDecodeError:
+                tail = None
+            if tail == "]":
+                return []
+            appended = self._decode_tail(tail) if isinstance(tail, str) else None
+            if appended is not None:
+                self._raw_steps += view[resume : end - 1]
+                return self._add_steps(appended)
+
+        try:
+            text = codec.loads(b'"' + view[start:end] + b'"')
+        except codec.JSONDecodeError:
+            return []
+        new_steps = self._replace_steps(text)
+        self._steps_head = None
+        self._raw_steps = bytearray(
+            view[start : end - 1] if new_steps is not None and closed else b""
+        )
+        return new_steps or []
+
+    def _feed_raw_answer(
+        self, view: memoryview, span: Tuple[int, int, int], markdown_block: Dict[str, Any]
+    ) -> str:
+        """Extract newly appended answer text from the escaped answer found at ``span``."""
+        start, resume, end = span
+        if resume - start == len(self._raw_answer) and len(self.answer) == self._raw_answer_length:
+            new_text: str = codec.loads(b'"' + view[resume:end] + b'"')
+            self._raw_answer += view[resume:end]
+            self.answer += new_text
+            self._raw_answer_length = len(self.answer)
+            return new_text
+
+        # Resent or rewritten answer: decode it whole and let _feed_blocks resync
+        answer = markdown_block["answer"] = codec.loads(b'"' + view[start:end] + b'"')
+        new_text = self._feed_blocks(
+            [{"intended_usage": "ask_text", "markdown_block": markdown_block}]
+        )
+        if self.answer == answer:
+            self._raw_answer = bytearray(view[start:end])
+            self._raw_answer_length = len(self.answer)
+        else:
+            self._raw_answer = bytearray()
+            self._raw_answer_length = -1
+        return new_text
+
+    def _feed_steps(self, raw_text: Any) -> List[Dict[str, Any]]:
+        """
+        Decode the steps appended to the ``text`` step list since the previous event.
+
+        When the list starts with the previous one minus its closing bracket,
+        only the rest is decoded; otherwise the whole list is.
+        """
+        if not raw_text:
+            return []
+
+        head = self._steps_head
+        if isinstance(raw_text, str) and head is not None and raw_text.startswith(head):
+            tail = raw_text[len(head) :]
+            if tail == "]":
+                return []
+            appended = self._decode_tail(tail) if tail.endswith("]") else None
+            if appended is not None:
+                self._steps_head = raw_text[:-1]
+                return self._add_steps(appended)
+
+        new_steps = self._replace_steps(raw_text)
+        closed = isinstance(raw_text, str) and raw_text.endswith("]")
+        self._steps_head = raw_text[:-1] if new_steps is not None and closed else None
+        self._raw_steps = bytearray()
+        return new_steps or []
+
+    def _decode_tail(self, tail: str) -> Optional[List[Any]]:
+        """Decode the steps in the part of a step list that follows the previous list."""
+        if self._step_count:
+            # The previous list continues only past a comma; anything else is resent
+            if not tail.startswith(","):
+                return None
+            tail = tail[1:]
+        try:
+            appended = codec.loads("[" + tail)
+        except codec.JSONDecodeError:
+            return None
+        return appended if isinstance(appended, list) else None
+
+    def _replace_steps(self, raw_text: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        Decode a whole step list and return the steps past the ones already seen.
+
+        Returns None when the list is malformed or shorter than the steps seen,
+        so it cannot be extended by its tail next time.
+        """
+        try:
+            steps = codec.loads(raw_text) if isinstance(raw_text, str) else raw_text
+        except (codec.JSONDecodeError, TypeError):
+            return None
+        if not isinstance(steps, list) or len(steps) < self._step_count:
+            return None
+        return self._add_steps(steps[self._step_count :])
+
+    def _add_steps(self, appended: List[Any]) -> List[Dict[str, Any]]:
+        """Record steps appended to the step list and return the well-formed ones."""
+        self._step_count += len(appended)
+        new_steps = [step for step in appended if isinstance(step, dict)]
+        self.steps.extend(new_steps)
+        return new_steps
+
+    def _feed_blocks(self, blocks: Any) -> str:
+        """Extract newly appended answer text from the ``ask_text`` markdown block."""
+        for block in blocks or ():
+            if not isinstance(block, dict) or block.get("intended_usage") != "ask_text":
+                continue
+            markdown_block = block.get("markdown_block")
+            if not isinstance(markdown_block, dict):
+                continue
+
+            chunks = markdown_block.get("chunks")
+            offset = markdown_block.get("chunk_starting_offset")
+            if isinstance(chunks, list) and isinstance(offset, int):
+                # Incremental block: only the chunks from ``offset`` onward are sent
+                fresh = chunks[max(0, self._md_chunks - offset) :]
+                self._md_chunks = offset + len(chunks)
+                new_text = "".join(c for c in fresh if isinstance(c, str))
+                self.answer += new_text
+                return new_text
+
+            answer = markdown_block.get("answer")
+            if isinstance(answer, str) and len(answer) > len(self.answer):
+                if answer.startswith(self.answer):
+                    new_text = answer[len(self.answer) :]
+                else:
+                    logger.debug("Answer snapshot diverged from accumulated text; resyncing")
+                    new_text = answer
+                self.answer = answer
+                return new_text
+        return ""
+
+    def _decode_final(self, content: Any) -> Optional[Dict[str, Any]]:
+        """Decode the FINAL step's doubly encoded answer payload."""
+        if not isinstance(content, dict) or "answer" not in content:
+            return None
+        raw_answer = content["answer"]
+        try:
+            answer = codec.loads(raw_answer) if isinstance(raw_answer, str) else raw_answer
+        except (codec.JSONDecodeError, TypeError):
+            return None
+        return answer if isinstance(answer, dict) else None
+
+    def _add_web_results(self, results: Any) -> List[Dict[str, Any]]:
+        """Record citations not seen before and return them."""
+        new_results = []
+        for result in results or ():
+            if not isinstance(result, dict):
+                continue
+            key = result.get("url") or result.get("name") or repr(result)
+            if key in self._seen_urls:
+                continue
+            self._seen_urls.add(key)
+            self.web_results.append(result)
+            new_results.append(result)
+        return new_results
+
+
+def _answer_block(event: Any) -> Optional[Dict[str, Any]]:
+    """Return the ``ask_text`` markdown block of a decoded event whose answer was cut out."""
+    if not isinstance(event, dict):
+        return None
+    for block in event.get("blocks") or ():
+        if isinstance(block, dict) and block.get("intended_usage") == "ask_text":
+            markdown_block = block.get("markdown_block")
+            if isinstance(markdown_block, dict) and markdown_block.get("answer") == "":
+                return markdown_block
+    return None
+
+
+class FinalSnapshot:
+    """
+    Keeps only the raw bytes of the latest ``data:`` payload of a stream.
+
+    Used by blocking searches, which only ever return the last snapshot:
+    intermediate events are framed but never decoded, and only the final
+    payload is handed to ``SearchResult``.
+
+    Example:
+        >>> snapshot = FinalSnapshot()
+        >>> for event in iter_events(resp.iter_content()):
+        ...     if snapshot.feed(event):
+        ...         break
+        >>> result = snapshot.decode()
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self) -> None:
+        self._data: Optional[Buffer] = None
+
+    def feed(self, event: SSEEvent) -> bool:
+        """
+        Consume one SSE event.
+
+        Args:
+            event: Event produced by the SSE framer
+
+        Returns:
+            True once the ``end_of_stream`` event has been seen
+        """
+        if event.event == "end_of_stream":
+            return True
+        if event.data is not None:
+            self._data = event.data
+        return False
+
+    @property
+    def received(self) -> bool:
+        """Whether any payload has arrived yet."""
+        return self._data is not None
+
+    @property
+    def payload(self) -> Optional[bytes]:
+        """The latest payload, or None if nothing was received."""
+        return bytes(self._data) if self._data is not None else None
+
+    def decode(self, partial: bool = False, elapsed: Optional[float] = None) -> SearchResult:
+        """
+        Wrap the latest payload in a lazily decoded result.
+
+        Args:
+            partial: Mark the result as cut short by a deadline
+            elapsed: Seconds the search ran, if known
+
+        Returns:
+            SearchResult over the final payload, empty if nothing was received
+        """
+        if self._data is None:
+            return SearchResult(partial=partial, elapsed=elapsed)
+        return SearchResult(bytes(self._data), partial=partial, elapsed=elapsed)
+
+
+class SearchStream:
+    """
+    Iterator over the results of a streamed search.
+
+    Yields what the underlying generator produces and exposes the results the
+    search's retention policy kept (see ``search(retain=...)``). The stream
+    owns the HTTP response: it is released as soon as the answer is complete,
+    iteration fails, ``close()`` is called, the ``with`` block exits or the
+    stream is garbage collected, so breaking out early does not leave the
+    connection draining in the background.
+
+    Example:
+        >>> with client.search("What is Python?", stream=True) as stream:
+        ...     for snapshot in stream:
+        ...         if done(snapshot):
+        ...             break
+    """
+
+    def __init__(
+        self,
+        results: Iterator[Any],
+        parser: Any,
+        close: Optional[Callable[[], None]] = None,
+    ):
+        self._results = results
+        self._parser = parser
+        self._close = close
+        self.closed = False
+
+    def __iter__(self) -> "SearchStream":
+        return self
+
+    def __next__(self) -> Any:
+        if self.closed:
+            raise StopIteration
+        try:
+            return next(self._results)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "SearchStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def close(self) -> None:
+        """Stop the stream, abort the transfer and release the connection."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close_results = getattr(self._results, "close", None)
+            if close_results is not None:
+                close_results()
+        finally:
+            if self._close is not None:
+                self._close()
+
+    @property
+    def retained(self) -> List[Any]:
+        """Results kept by the retention policy, oldest first."""
+        return list(self._parser.retained)
+
+    @property
+    def last(self) -> Any:
+        """Most recent retained result, or None."""
+        return self._parser.retained[-1] if self._parser.retained else None
+
+
+class AsyncSearchStream:
+    """
+    Async iterator over the results of a streamed search.
+
+    Async counterpart of ``SearchStream``, used with ``async with``. Cancelling
+    the consuming task or garbage collecting the stream aborts the transfer
+    without awaiting it; ``aclose()`` also waits until the connection is back
+    in the pool.
+    """
+
+    def __init__(
+        self,
+        results: AsyncIterator[Any],
+        parser: Any,
+        aclose: Optional[Callable[[], Awaitable[None]]] = None,
+        abort: Optional[Callable[[], None]] = None,
+    ):
+        self._results = results
+        self._parser = parser
+        self._aclose = aclose
+        self._abort = abort
+        self.closed = False
+
+    def __aiter__(self) -> "AsyncSearchStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            return await self._results.__anext__()
+        except asyncio.CancelledError:
+            self.abort()
+            raise
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def __aenter__(self) -> "AsyncSearchStream":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    def __del__(self) -> None:
+        if not getattr(self, "closed", True):
+            self.abort()
+
+    def abort(self) -> None:
+        """Abort the transfer without waiting; the connection is released in the background."""
+        if self.closed:
+            return
+        self.closed = True
+        cancel = getattr(self._results, "cancel", None)
+        if cancel is not None:
+            cancel()
+        if self._abort is not None:
+            self._abort()
+
+    async def aclose(self) -> None:
+        """Stop the stream, abort the transfer and wait for the connection to be released."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close_results = getattr(self._results, "aclose", None)
+            if close_results is not None:
+                await close_results()
+        finally:
+            if self._aclose is not None:
+                await self._aclose()
+
+    @property
+    def retained(self) -> List[Any]:
+        """Results kept by the retention policy, oldest first."""
+        return list(self._parser.retained)
+
+    @property
+    def last(self) -> Any:
+        """Most recent retained result, or None."""
+        return self._parser.retained[-1] if self._parser.retained else None
+
+
+class ConflatingIterator:
+    """
+    Latest-wins iterator for ``stream="latest"``.
+
+    A background thread drains the response body as fast as it arrives and
+    only frames the events; each ``next()`` hands out the newest snapshot
+    received since the previous one. Snapshots superseded in between are
+    dropped without being decoded, so a slow consumer never falls behind the
+    network.
+
+    The reader thread owns the response: ``close()`` aborts the transfer so
+    the reader stops waiting for the body, and the reader releases the
+    response itself on its way out, so it is never closed from one thread
+    while another reads it.
+
+    Args:
+        chunks: Iterable of raw body chunks, e.g. ``resp.iter_content()``
+        parser: ``ResponseParser`` in ``"latest"`` mode
+        abort: Aborts the transfer without waiting for it
+        release: Releases the response once the reader is done with it
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[Buffer],
+        parser: Any,
+        abort: Optional[Callable[[], None]] = None,
+        release: Optional[Callable[[], None]] = None,
+    ):
+        self._parser = parser
+        self._abort = abort
+        self._release = release
+        self._cond = threading.Condition()
+        self._finished = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._drain, args=(chunks,), name="perplexity-stream-reader", daemon=True
+        )
+        self._thread.start()
+
+    def _drain(self, chunks: Iterable[Buffer]) -> None:
+        try:
+            for chunk in chunks:
+                with self._cond:
+                    if self._closed:
+                        break
+                    self._parser.feed(chunk)
+                    self._cond.notify()
+                    if self._parser.done:
+                        break
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._parser.close()
+                self._finished = True
+                self._cond.notify()
+            if self._release is not None:
+                try:
+                    self._release()
+                except Exception as e:
+                    logger.debug(f"Releasing a conflated stream failed: {e}")
+
+    def __iter__(self) -> "ConflatingIterator":
+        return self
+
+    def __next__(self) -> SearchResult:
+        with self._cond:
+            while True:
+                snapshot: Optional[SearchResult] = self._parser.take_latest()
+                if snapshot is not None:
+                    return snapshot
+                if self._error is not None:
+                    raise self._error
+                if self._finished or self._closed:
+                    raise StopIteration
+                self._cond.wait()
+
+    def close(self) -> None:
+        """Stop handing out snapshots, abort the transfer and wait for the reader to exit."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._abort is not None:
+            self._abort()
+        if self._thread is not threading.current_thread():
+            # A stalled upstream may keep the reader blocked past the wait; it
+            # then exits, and releases the response, once curl gives up
+            self._thread.join(CLOSE_TIMEOUT)
+
+
+class AsyncConflatingIterator:
+    """
+    Latest-wins async iterator for ``stream="latest"``.
+
+    Async counterpart of ``ConflatingIterator``: a reader task drains the
+    body while the consumer awaits the newest snapshot.
+
+    Args:
+        chunks: Async iterable of raw body chunks, e.g. ``resp.aiter_content()``
+        parser: ``ResponseParser`` in ``"latest"`` mode
+    """
+
+    def __init__(self, chunks: AsyncIterable[Buffer], parser: Any):
+        self._parser = parser
+        self._wakeup = asyncio.Event()
+        self._finished = False
+        self._error: Optional[BaseException] = None
+        self._task = asyncio.ensure_future(self._drain(chunks))
+
+    async def _drain(self, chunks: AsyncIterable[Buffer]) -> None:
+        try:
+            async for chunk in chunks:
+                self._parser.feed(chunk)
+                self._wakeup.set()
+                if self._parser.done:
+                    break
+        except Exception as e:
+            self._error = e
+        finally:
+            self._parser.close()
+            self._finished = True
+            self._wakeup.set()
+
+    def __aiter__(self) -> "AsyncConflatingIterator":
+        return self
+
+    async def __anext__(self) -> SearchResult:
+        while True:
+            snapshot: Optional[SearchResult] = self._parser.take_latest()
+            if snapshot is not None:
+                return snapshot
+            if self._error is not None:
+                raise self._error
+            if self._finished:
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    def cancel(self) -> None:
+        """Cancel the reader task without waiting for it."""
+        if not self._task.done():
+            self._task.cancel()
+        self._finished = True
+
+    async def aclose(self) -> None:
+        """Cancel the reader task and wait for it to finish."""
+        self.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
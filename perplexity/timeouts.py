@@ -0,0 +1,222 @@
+"""
+Time limits for Perplexity AI requests.
+
+A search goes through distinct phases (connecting, waiting for the first SSE
+event, waiting between events) and may also have an overall deadline that
+covers attachment uploads. ``Timeouts`` configures each limit and
+``TimeoutTracker`` follows one search through them without doing any I/O:
+drivers ask it for per-request curl timeouts and how long they may wait for
+the next chunk, and the response parser reports every chunk to it.
+"""
+
+import math
+import time
+from typing import Callable, Optional, Tuple
+
+from .config import CONNECT_TIMEOUT, FIRST_EVENT_TIMEOUT, IDLE_TIMEOUT, SEARCH_DEADLINE
+from .exceptions import RequestTimeoutError, ValidationError
+
+
+class Timeouts:
+    """
+    Per-phase time limits, in seconds. ``None`` disables a limit.
+
+    Attributes:
+        connect: Establishing the connection and receiving response headers
+        first_event: From the response headers to the first SSE event
+        idle: Between two SSE events, and for each upload request; a storage
+            upload may take longer as long as it never stalls for this long
+        total: Whole search including uploads (overridden by ``deadline=``)
+
+    Example:
+        >>> client = Client(timeouts=Timeouts(idle=120, total=600))
+    """
+
+    __slots__ = ("connect", "first_event", "idle", "total")
+
+    def __init__(
+        self,
+        connect: Optional[float] = CONNECT_TIMEOUT,
+        first_event: Optional[float] = FIRST_EVENT_TIMEOUT,
+        idle: Optional[float] = IDLE_TIMEOUT,
+        total: Optional[float] = SEARCH_DEADLINE,
+    ):
+        for name, value in (
+            ("connect", connect),
+            ("first_event", first_event),
+            ("idle", idle),
+            ("total", total),
+        ):
+            if value is not None and (isinstance(value, bool) or not value > 0):
+                raise ValidationError(f"Timeout '{name}' must be a positive number or None")
+        self.connect = connect
+        self.first_event = first_event
+        self.idle = idle
+        self.total = total
+
+    def __repr__(self) -> str:
+        return (
+            f"Timeouts(connect={self.connect}, first_event={self.first_event}, "
+            f"idle={self.idle}, total={self.total})"
+        )
+
+
+class TimeoutTracker:
+    """
+    Follows one search through its time limits.
+
+    Args:
+        timeouts: Limits to apply (library defaults if None)
+        deadline: Seconds the whole search may take, overriding ``timeouts.total``
+        clock: Monotonic clock, replaceable in tests
+
+    Example:
+        >>> timer = TimeoutTracker(Timeouts(), deadline=60)
+        >>> timer.start_stream()
+        >>> timer.on_chunk(events=1)
+    """
+
+    def __init__(
+        self,
+        timeouts: Optional[Timeouts] = None,
+        deadline: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.timeouts = timeouts if timeouts is not None else Timeouts()
+        self._clock = clock
+        self.total = deadline if deadline is not None else self.timeouts.total
+        if self.total is not None and (isinstance(self.total, bool) or not self.total > 0):
+            raise ValidationError("deadline must be a positive number or None")
+        self.started = clock()
+        self.expires_at = self.started + self.total if self.total is not None else None
+        self.events = 0
+        self._last: Optional[float] = None
+
+    def elapsed(self) -> float:
+        """Seconds since the search started."""
+        return self._clock() - self.started
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without one."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self._clock())
+
+    def check_deadline(self) -> None:
+        """
+        Fail if the deadline has passed.
+
+        Raises:
+            RequestTimeoutError: If the deadline has passed
+        """
+        if self.expires_at is not None and self._clock() >= self.expires_at:
+            raise self.expired("deadline")
+
+    def request_timeout(self, read: Optional[float]) -> Optional[Tuple[float, float]]:
+        """
+        curl ``(connect, read)`` timeout for one request, bounded by the deadline.
+
+        curl uses the sum as the limit for the whole request, or for a streamed
+        request as a low-speed window that fails the transfer when nothing at
+        all arrives for that long.
+
+        Args:
+            read: Time allowed after connecting, None for no limit
+
+        Returns:
+            Timeout tuple, or None if no limit applies
+
+        Raises:
+            RequestTimeoutError: If the deadline has already passed
+        """
+        self.check_deadline()
+        connect = self.timeouts.connect
+        remaining = self.remaining()
+        if remaining is None:
+            if connect is None and read is None:
+                return None
+            # curl needs a finite value; a day stands in for "no limit"
+            return connect or read or 86400.0, read or 86400.0
+
+        connect = min(connect, remaining) if connect is not None else remaining
+        budget = remaining - connect
+        read = min(read, budget) if read is not None else budget
+        return connect, max(read, 0.001)
+
+    def stream_timeout(self) -> Optional[Tuple[float, float]]:
+        """curl timeout for the ask request: a backstop for completely silent streams."""
+        limits = [t for t in (self.timeouts.first_event, self.timeouts.idle) if t is not None]
+        return self.request_timeout(max(limits) if limits else None)
+
+    def start_stream(self) -> None:
+        """Mark the arrival of the response headers."""
+        self._last = self._clock()
+
+    @property
+    def phase(self) -> str:
+        """Limit currently running on the stream: 'first_event' or 'idle'."""
+        return "idle" if self.events else "first_event"
+
+    def wait_budget(self) -> Optional[float]:
+        """
+        How long a driver may wait for the next chunk.
+
+        Returns:
+            Seconds until the nearest limit expires (at least 0), or None
+        """
+        budgets = []
+        limit = self.timeouts.idle if self.events else self.timeouts.first_event
+        if limit is not None and self._last is not None:
+            budgets.append(self._last + limit - self._clock())
+        remaining = self.remaining()
+        if remaining is not None:
+            budgets.append(remaining)
+        return max(0.0, min(budgets)) if budgets else None
+
+    def on_chunk(self, events: int) -> None:
+        """
+        Account for a received chunk of the response body.
+
+        Args:
+            events: Number of SSE events the chunk completed
+
+        Raises:
+            RequestTimeoutError: If no event arrived within the current limit,
+                or the deadline has passed
+        """
+        now = self._clock()
+        if events:
+            self.events += events
+            self._last = now
+        else:
+            # Keep-alive bytes don't count as progress
+            limit = self.timeouts.idle if self.events else self.timeouts.first_event
+            if limit is not None and self._last is not None and now - self._last >= limit:
+                raise self.expired(self.phase)
+        self.check_deadline()
+
+    def expired(self, phase: Optional[str] = None) -> RequestTimeoutError:
+        """
+        Build the exception for an exceeded limit.
+
+        Args:
+            phase: Limit that was hit; by default the deadline if it has passed,
+                otherwise the stream's current phase
+
+        Returns:
+            RequestTimeoutError describing the limit
+        """
+        if phase is None:
+            remaining = self.remaining()
+            phase = "deadline" if remaining is not None and remaining <= 0 else self.phase
+        limit = {
+            "connect": self.timeouts.connect,
+            "first_event": self.timeouts.first_event,
+            "idle": self.timeouts.idle,
+            "deadline": self.total,
+        }.get(phase)
+        return RequestTimeoutError(
+            f"Request timed out ({phase.replace('_', ' ')} limit of {limit}s exceeded)",
+            phase=phase,
+            timeout=limit if limit is not None else math.inf,
+        )
@@ -0,0 +1,346 @@
+"""
+curl_cffi glue for the sans-IO search protocol.
+
+Translates ``HTTPRequest`` descriptions from ``perplexity.protocol`` into
+keyword arguments for ``curl_cffi`` sessions. Shared by the sync and async
+clients.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from curl_cffi import CurlError, CurlMime, ffi, lib
+from curl_cffi.requests.exceptions import Timeout as CurlTimeout
+
+from .config import CLOSE_TIMEOUT
+from .exceptions import RequestTimeoutError
+from .logger import get_logger
+from .protocol import HTTPRequest
+from .timeouts import TimeoutTracker
+
+logger = get_logger("transport")
+
+
+def request_kwargs(request: HTTPRequest) -> Dict[str, Any]:
+    """
+    Build ``Session.request`` keyword arguments for a protocol request.
+
+    Args:
+        request: Request described by the protocol core
+
+    Returns:
+        Keyword arguments (params, headers, data, multipart, timeout) for curl_cffi
+    """
+    kwargs: Dict[str, Any] = {}
+    if request.timeout is not None:
+        kwargs["timeout"] = request.timeout
+    if request.params:
+        kwargs["params"] = request.params
+    if request.headers:
+        kwargs["headers"] = request.headers
+    if request.data is not None:
+        kwargs["data"] = request.data
+    if request.multipart is not None:
+        upload = request.multipart.upload
+        mp = CurlMime()
+        for key, value in request.multipart.fields.items():
+            mp.addpart(name=key, data=value)
+        if upload.path is not None:
+            # libcurl reads the file while sending, so it is never loaded into memory
+            mp.addpart(
+                name="file",
+                content_type=upload.content_type,
+                filename=upload.filename,
+                local_path=upload.path,
+            )
+        elif isinstance(upload.data, (bytes, str)):
+            data = upload.data
+            mp.addpart(
+                name="file",
+                content_type=upload.content_type,
+                filename=upload.filename,
+                data=data.encode("utf-8") if isinstance(data, str) else data,
+            )
+        else:
+            _add_buffer_part(mp, "file", upload.content_type, upload.filename, upload.data)
+        kwargs["multipart"] = mp
+    return kwargs
+
+
+def _add_buffer_part(
+    mime: CurlMime, name: str, content_type: str, filename: str, data: Any
+) -> None:
+    """
+    Add a file part whose contents are a buffer (``mmap``, ``memoryview``, ``bytearray``).
+
+    ``CurlMime.addpart`` only takes bytes, and converting the buffer would copy
+    it before libcurl makes its own copy. The buffer is handed to
+    ``curl_mime_data`` directly instead, so libcurl's copy is the only one.
+    curl_cffi exposes no ``curl_mime_data_cb`` for streaming it without a copy.
+    """
+    part = lib.curl_mime_addpart(mime._form)
+    with memoryview(data) as view:
+        buffer = ffi.from_buffer(view)
+        ok = (
+            lib.curl_mime_name(part, name.encode()) == 0
+            and lib.curl_mime_type(part, content_type.encode()) == 0
+            and lib.curl_mime_filename(part, filename.encode()) == 0
+            and lib.curl_mime_data(part, buffer, view.nbytes) == 0
+        )
+        ffi.release(buffer)
+    if not ok:
+        raise CurlError("Add field failed.")
+
+
+# curl's messages for a timeout before the connection was established
+_CONNECT_TIMEOUTS = (
+    "Resolving timed out",
+    "Connection timed out",
+    "Failed to connect",
+    "SSL connection timeout",
+)
+
+
+def send_timeout_error(
+    request: HTTPRequest, stream: bool, error: Optional[BaseException] = None
+) -> RequestTimeoutError:
+    """
+    Translate a curl timeout raised while sending a request.
+
+    Only a timeout curl reports before the connection was up (resolving,
+    connecting or the TLS handshake) is a connect timeout; once connected the
+    request may have reached the server, so a streamed request that times out
+    waiting for its answer has run out of its first-event limit.
+
+    Args:
+        request: The request that timed out
+        stream: Whether it was sent as a streamed request, which only waits
+            for the response headers
+        error: The curl timeout, whose message tells where it happened
+
+    Returns:
+        RequestTimeoutError for the deadline if it has passed, otherwise for
+        the connect phase, the first event of a stream, a stalled storage
+        upload or the per-request limit
+    """
+    connect, read = request.timeout if request.timeout is not None else (0.0, 0.0)
+    if request.expires_at is not None and time.monotonic() >= request.expires_at:
+        phase, limit = "deadline", connect + read
+    elif error is not None and any(message in str(error) for message in _CONNECT_TIMEOUTS):
+        phase, limit = "connect", connect
+    elif stream and request.endpoint != "upload":
+        phase, limit = "first_event", read
+    else:
+        phase, limit = "idle", connect + read
+    return RequestTimeoutError(
+        f"{request.method} {request.url} timed out ({phase.replace('_', ' ')} limit exceeded)",
+        phase=phase,
+        timeout=limit,
+    )
+
+
+def read_body(resp: Any, request: HTTPRequest) -> bytes:
+    """
+    Whole body of a streamed response, closing it.
+
+    Storage uploads are sent as streamed requests so curl applies their
+    timeout as a low-speed window: a large upload may take as long as it
+    needs, as long as it never stalls for the whole window.
+
+    Args:
+        resp: Streamed curl_cffi response
+        request: The request it answers
+
+    Returns:
+        The body
+
+    Raises:
+        RequestTimeoutError: If the transfer stalled or the deadline passed
+    """
+    try:
+        return b"".join(resp.iter_content())
+    except CurlTimeout as e:
+        raise send_timeout_error(request, stream=True, error=e) from e
+    finally:
+        resp.close()
+
+
+async def aread_body(resp: Any, request: HTTPRequest) -> bytes:
+    """``read_body`` for an async response."""
+    try:
+        return b"".join([chunk async for chunk in resp.aiter_content()])
+    except CurlTimeout as e:
+        raise send_timeout_error(request, stream=True, error=e) from e
+    finally:
+        await resp.aclose()
+
+
+def iter_chunks(resp: Any, timer: TimeoutTracker) -> Iterator[bytes]:
+    """
+    Body chunks of a streamed response.
+
+    curl enforces the stream's low-speed window itself, so this only turns its
+    timeout into a ``RequestTimeoutError`` for the stream's current phase.
+
+    Args:
+        resp: Streamed curl_cffi response
+        timer: Timeout tracker of the search
+
+    Yields:
+        Raw body chunks
+    """
+    try:
+        yield from resp.iter_content()
+    except CurlTimeout as e:
+        raise timer.expired() from e
+
+
+async def aiter_chunks(resp: Any, timer: TimeoutTracker) -> AsyncIterator[bytes]:
+    """
+    Body chunks of a streamed async response, each awaited within the timer's budget.
+
+    Waiting is bounded by the nearest of the first-event, idle and deadline
+    limits; when it runs out the pending read is cancelled and
+    ``RequestTimeoutError`` raised, so a stalled stream fails as soon as its
+    limit is reached rather than when curl notices.
+
+    Args:
+        resp: Streamed curl_cffi async response
+        timer: Timeout tracker of the search
+
+    Yields:
+        Raw body chunks
+    """
+    chunks = resp.aiter_content().__aiter__()
+    while True:
+        budget = timer.wait_budget()
+        try:
+            if budget is None:
+                chunk = await chunks.__anext__()
+            else:
+                chunk = await asyncio.wait_for(chunks.__anext__(), budget)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise timer.expired() from None
+        except CurlTimeout as e:
+            raise timer.expired() from e
+        yield chunk
+
+
+class SessionPool:
+    """
+    Thread-safe pool of curl_cffi sessions.
+
+    A ``Session`` wraps a single curl handle and must not be used by two
+    threads at once. The pool lends each thread a session of its own for the
+    duration of one request and keeps idle sessions (and their warm
+    connections) for the next borrower, creating new ones only when every
+    session is busy.
+
+    Args:
+        primary: Session the pool starts with, lent out first
+        factory: Creates an additional session when all are busy
+
+    Example:
+        >>> pool = SessionPool(session, factory=make_session)
+        >>> with pool.session() as s:
+        ...     resp = s.get(url)
+    """
+
+    def __init__(self, primary: Any, factory: Callable[[], Any]):
+        self.primary = primary
+        self._factory = factory
+        self._idle: List[Any] = [primary]
+        self._lock = threading.Lock()
+        self.size = 1
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """Borrow a session for the duration of the ``with`` block."""
+        with self._lock:
+            session = self._idle.pop() if self._idle else None
+            if session is None:
+                self.size += 1
+        if session is None:
+            session = self._factory()
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._idle.append(session)
+
+
+def abort_response(resp: Any) -> None:
+    """
+    Ask curl to abort a streamed transfer without waiting for it.
+
+    curl_cffi checks ``quit_now`` whenever data arrives and fails the transfer
+    once it is set, after which the connection is released by the session's
+    own cleanup. Safe to call from ``__del__`` and cancellation handlers.
+
+    Args:
+        resp: Streamed curl_cffi response
+    """
+    quit_now = getattr(resp, "quit_now", None)
+    if quit_now is not None:
+        quit_now.set()
+
+
+def close_response(resp: Any, timeout: Optional[float] = CLOSE_TIMEOUT) -> None:
+    """
+    Abort a streamed response and release its connection.
+
+    curl only notices the abort when more data arrives, and ``resp.close()``
+    waits for the transfer to end. When it is still running after ``timeout``
+    seconds (a stalled upstream), the response is closed in the background
+    once curl gives up on it instead of blocking the caller.
+
+    Args:
+        resp: Streamed curl_cffi response
+        timeout: Seconds to wait for the transfer to end, or None to wait for good
+    """
+    abort_response(resp)
+    task = getattr(resp, "stream_task", None)
+    if timeout is not None and isinstance(task, Future):
+        try:
+            task.result(timeout)
+        except FutureTimeoutError:
+            logger.debug("Aborted transfer is stalled; closing it in the background")
+            task.add_done_callback(lambda _: resp.close())
+            return
+        except Exception:
+            pass
+    resp.close()
+
+
+async def aclose_response(resp: Any, timeout: Optional[float] = CLOSE_TIMEOUT) -> None:
+    """
+    Abort a streamed async response and wait until its connection is released.
+
+    ``AsyncResponse.aclose()`` on its own waits for the rest of the body, so the
+    transfer is aborted first. curl only notices the abort when more data
+    arrives, so a transfer still running after ``timeout`` seconds (a stalled
+    upstream) is cancelled, which removes it from curl and drops its connection.
+
+    Args:
+        resp: Streamed curl_cffi async response
+        timeout: Seconds to wait for the transfer to end, or None to wait for good
+    """
+    abort_response(resp)
+    if timeout is None:
+        await resp.aclose()
+        return
+    try:
+        await asyncio.wait_for(asyncio.shield(resp.aclose()), timeout)
+    except asyncio.TimeoutError:
+        task = getattr(resp, "astream_task", None)
+        if isinstance(task, asyncio.Future):
+            logger.debug("Aborted transfer is stalled; cancelling it")
+            task.cancel()
+            await asyncio.wait({task}, timeout=timeout)
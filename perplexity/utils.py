@@ -5,20 +5,26 @@ This module provides helper functions for retry logic, validation,
 and other common operations.
 """
 
+import io
+import os
 import time
 import random
 from functools import wraps
 from typing import Any, Callable, Optional, Tuple, Type
 
+from . import codec
 from .exceptions import ValidationError
 from .config import (
     RETRY_MAX_ATTEMPTS,
     RETRY_BACKOFF_FACTOR,
     SEARCH_MODES,
     SEARCH_SOURCES,
+    STREAM_MODES,
     MODEL_MAPPINGS,
     RATE_LIMIT_MIN_DELAY,
     RATE_LIMIT_MAX_DELAY,
+    RETENTION_POLICIES,
+    HANDSHAKE_MODES,
 )
 from .logger import get_logger
 
@@ -174,9 +180,90 @@ def validate_search_params(
         raise ValidationError("At least one source must be specified")
 
 
+def validate_stream_mode(stream: Any) -> None:
+    """
+    Validate the ``stream`` argument of a search call.
+
+    Args:
+        stream: True, False or one of the named streaming modes
+
+    Raises:
+        ValidationError: If the streaming mode is unknown
+
+    Example:
+        >>> validate_stream_mode("delta")
+    """
+    if isinstance(stream, bool):
+        return
+
+    if stream not in STREAM_MODES:
+        raise ValidationError(
+            f"Invalid stream mode '{stream}'. "
+            f"Must be True, False or one of: {', '.join(STREAM_MODES)}"
+        )
+
+
+def validate_retention(retain: str) -> None:
+    """
+    Validate the retention policy of a streamed search.
+
+    Args:
+        retain: One of 'none', 'last' or 'all'
+
+    Raises:
+        ValidationError: If the policy is unknown
+
+    Example:
+        >>> validate_retention("last")
+    """
+    if retain not in RETENTION_POLICIES:
+        raise ValidationError(
+            f"Invalid retention policy '{retain}'. "
+            f"Must be one of: {', '.join(RETENTION_POLICIES)}"
+        )
+
+
+def validate_handshake(handshake: str) -> None:
+    """
+    Validate when a client performs its session handshake.
+
+    Args:
+        handshake: One of 'eager', 'lazy' or 'background'
+
+    Raises:
+        ValidationError: If the mode is unknown
+
+    Example:
+        >>> validate_handshake("lazy")
+    """
+    if handshake not in HANDSHAKE_MODES:
+        raise ValidationError(
+            f"Invalid handshake mode '{handshake}'. "
+            f"Must be one of: {', '.join(HANDSHAKE_MODES)}"
+        )
+
+
+def validate_concurrency(value: int, name: str = "concurrency") -> None:
+    """
+    Validate a worker count or concurrency limit.
+
+    Args:
+        value: Requested number of concurrent operations
+        name: Parameter name used in the error message
+
+    Raises:
+        ValidationError: If the value is not a positive integer
+
+    Example:
+        >>> validate_concurrency(4, "max_workers")
+    """
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValidationError(f"{name} must be a positive integer, got {value!r}")
+
+
 def validate_query_limits(
-    copilot_remaining: int,
-    file_upload_remaining: int,
+    copilot_remaining: float,
+    file_upload_remaining: float,
     mode: str,
     files_count: int,
 ) -> None:
@@ -214,6 +301,10 @@ def validate_file_data(files: dict) -> None:
     """
     Validate file data dictionary.
 
+    File data is the contents as bytes or text, a ``pathlib.Path`` (or other
+    path-like object) of a file to upload, a file object opened in binary
+    mode, or a contiguous buffer such as ``mmap`` or ``memoryview``.
+
     Args:
         files: Dictionary with filenames as keys and file data as values
 
@@ -233,8 +324,25 @@ def validate_file_data(files: dict) -> None:
         if not filename.strip():
             raise ValidationError("Filename cannot be empty")
 
-        if not isinstance(data, (bytes, str)):
-            raise ValidationError(f"File data must be bytes or string, got {type(data)}")
+        if isinstance(data, (bytes, str)):
+            continue
+        if isinstance(data, os.PathLike):
+            if not os.path.isfile(data):
+                raise ValidationError(f"No file to upload at {os.fspath(data)!r}")
+        elif hasattr(data, "read"):
+            if isinstance(data, io.TextIOBase):
+                raise ValidationError(f"File '{filename}' must be opened in binary mode")
+        else:
+            try:
+                with memoryview(data) as view:
+                    contiguous = view.contiguous
+            except TypeError:
+                raise ValidationError(
+                    "File data must be bytes or string, a path, a binary file or a buffer, "
+                    f"got {type(data)}"
+                ) from None
+            if not contiguous:
+                raise ValidationError(f"Buffer for '{filename}' must be contiguous")
 
 
 def sanitize_query(query: str) -> str:
@@ -285,8 +393,6 @@ def parse_nested_json_response(content_json: dict) -> dict:
         >>> response = parse_nested_json_response(api_response)
         >>> print(response['answer'])
     """
-    import json
-
     if not isinstance(content_json, dict):
         return content_json
 
@@ -294,7 +400,7 @@ def parse_nested_json_response(content_json: dict) -> dict:
         try:
             raw_text = content_json["text"]
             if isinstance(raw_text, str):
-                text_parsed = json.loads(raw_text)
+                text_parsed = codec.loads(raw_text)
             else:
                 text_parsed = raw_text
 
@@ -306,18 +412,18 @@ def parse_nested_json_response(content_json: dict) -> dict:
                             try:
                                 ans_raw = final_content["answer"]
                                 if isinstance(ans_raw, str):
-                                    answer_data = json.loads(ans_raw)
+                                    answer_data = codec.loads(ans_raw)
                                 else:
                                     answer_data = ans_raw
                                 if isinstance(answer_data, dict):
                                     content_json["answer"] = answer_data.get("answer", "")
                                     content_json["chunks"] = answer_data.get("chunks", [])
-                            except (json.JSONDecodeError, TypeError):
+                            except (codec.JSONDecodeError, TypeError):
                                 pass
                         break
 
             content_json["text"] = text_parsed
-        except (json.JSONDecodeError, TypeError, KeyError):
+        except (codec.JSONDecodeError, TypeError, KeyError):
             pass
 
     return content_json
@@ -1,42 +1,77 @@
-import json
-import mimetypes
+import asyncio
 import random
 import re
-import sys
-from typing import Any, AsyncGenerator, Dict, List, Optional, Union
-from uuid import uuid4
+import time
+from collections import deque
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from curl_cffi import CurlMime, requests
+from curl_cffi import requests
+from curl_cffi.requests.exceptions import Timeout as CurlTimeout
 
+from perplexity.breaker import CircuitBreakers
+from perplexity.cache import ResponseCache, UploadCache, request_key
+from perplexity.coalesce import AsyncFlights, Flight, Subscription
+from perplexity.concurrency import AdaptiveConcurrency
 from perplexity.config import (
+    BATCH_CONCURRENCY,
     DEFAULT_HEADERS,
-    ENDPOINT_AUTH_SESSION,
     ENDPOINT_AUTH_SIGNIN,
     ENDPOINT_SSE_ASK,
-    ENDPOINT_UPLOAD_URL,
-    MODEL_MAPPINGS,
     SIGNIN_URL_PATTERN,
+    UPLOAD_CONCURRENCY,
 )
-from perplexity.exceptions import (
-    AccountCreationError,
-    AuthenticationError,
-    FileUploadError,
-    NetworkError,
-    RateLimitError,
-    ValidationError,
-)
+from perplexity.exceptions import AccountCreationError, RequestTimeoutError, ValidationError
+from perplexity.hooks import Hooks
 from perplexity.logger import get_logger
-from perplexity.utils import (
-    parse_nested_json_response,
-    validate_file_data,
-    validate_query_limits,
-    validate_search_params,
+from perplexity.optimize import UploadOptimizer
+from perplexity.protocol import (
+    FileData,
+    FileUpload,
+    HTTPRequest,
+    ResponseParser,
+    SearchProtocol,
+    check_search_status,
+    handshake_request,
 )
+from perplexity.ratelimit import RateLimiter
+from perplexity.result import SearchResult
+from perplexity.retry import RetryPolicy
+from perplexity.stream import AsyncConflatingIterator, AsyncSearchStream
+from perplexity.timeouts import Timeouts
+from perplexity.transport import (
+    abort_response,
+    aclose_response,
+    aiter_chunks,
+    aread_body,
+    request_kwargs,
+    send_timeout_error,
+)
+from perplexity.utils import validate_concurrency, validate_handshake
 from .emailnator import Emailnator
 
 logger = get_logger("async_client")
 
 
+async def _replay(results: List[Any]) -> AsyncIterator[Any]:
+    """
+    Async iterator over the results of a search served from the cache.
+    """
+    for result in results:
+        yield result
+
+
 class AsyncMixin:
     def __init__(self, *args, **kwargs):
         self.__storedargs = args, kwargs
@@ -60,11 +95,64 @@ class AsyncMixin:
 class Client(AsyncMixin):
     """
     A client for interacting with the Perplexity AI API asynchronously.
+
+    Args:
+        cookies: Perplexity account cookies, or None for an anonymous client
+        handshake: When to open the auth session: 'eager' (awaited during
+            construction, the default), 'lazy' (on the first request) or
+            'background' (started as a task during construction). Requests
+            issued before the handshake completes share and await it.
+        timeouts: Default time limits for every request (see ``Timeouts``)
+        retry: When to re-send a failed ask request; None (the default) sends
+            it once, ``RetryPolicy()`` retries with the default backoff. Waits
+            never block the event loop.
+        hooks: Instrumentation callbacks (see ``Hooks``)
+        rate_limiter: Token buckets every ask request draws from (see
+            ``RateLimiter``); pass the same limiter to several clients to share it
+        breakers: Per-endpoint circuit breakers (``CircuitBreakers()`` reporting to
+            ``hooks`` if None); requests to an endpoint whose circuit is open fail
+            at once with ``CircuitOpenError``
+        cache: Response cache for completed answers (see ``ResponseCache``); off if
+            None. Cache hits cost no request, quota or rate limiter token.
+        coalesce: Let identical searches in flight at the same time share one
+            answer stream (see ``perplexity.coalesce``); only searches a cache
+            could answer are coalesced
+        upload_cache: Reuses the URL of an attachment already uploaded with the
+            same contents, filename and MIME type (see ``UploadCache``); off if None
+        upload_concurrency: Most attachments of one search uploaded at once
+        upload_optimizer: Shrinks images and text documents before they are
+            uploaded (see ``UploadOptimizer``); off if None
     """
 
-    async def __ainit__(self, cookies: Optional[Dict[str, str]] = None):
+    async def __ainit__(
+        self,
+        cookies: Optional[Dict[str, str]] = None,
+        handshake: str = "eager",
+        timeouts: Optional[Timeouts] = None,
+        retry: Optional[RetryPolicy] = None,
+        hooks: Optional[Hooks] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        cache: Optional[ResponseCache] = None,
+        coalesce: bool = False,
+        upload_cache: Optional[UploadCache] = None,
+        upload_concurrency: int = UPLOAD_CONCURRENCY,
+        upload_optimizer: Optional[UploadOptimizer] = None,
+    ):
+        validate_handshake(handshake)
+        validate_concurrency(upload_concurrency, "upload_concurrency")
         if cookies is None:
             cookies = {}
+        self.timeouts = timeouts if timeouts is not None else Timeouts()
+        self.retry = retry if retry is not None else RetryPolicy(max_attempts=1)
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.rate_limiter = rate_limiter
+        self.breakers = breakers if breakers is not None else CircuitBreakers(hooks=self.hooks)
+        self.cache = cache
+        self.upload_cache = upload_cache
+        self.upload_concurrency = upload_concurrency
+        self.upload_optimizer = upload_optimizer
+        self._flights = AsyncFlights() if coalesce else None
         self.session = requests.AsyncSession(
             headers=DEFAULT_HEADERS.copy(),
             cookies=cookies,
@@ -75,10 +163,11 @@ class Client(AsyncMixin):
         self.file_upload = 0 if not cookies else float("inf")
         self.signin_regex = re.compile(SIGNIN_URL_PATTERN)
         self.timestamp = format(random.getrandbits(32), "08x")
-        try:
-            await self.session.get(ENDPOINT_AUTH_SESSION)
-        except Exception as e:
-            logger.warning(f"Initial async session handshake notice: {e}")
+        self._handshake_task: Optional[asyncio.Future] = None
+        if handshake == "eager":
+            await self._ensure_handshake()
+        elif handshake == "background":
+            self._handshake_task = asyncio.ensure_future(self._handshake())
 
     async def create_account(self, cookies: Dict[str, str], max_attempts: int = 5) -> bool:
         """
@@ -102,6 +191,7 @@ class Client(AsyncMixin):
             try:
                 emailnator_cli = await Emailnator(cookies)
 
+                await self._ensure_handshake()
                 cookie_csrf = self.session.cookies.get_dict().get("next-auth.csrf-token", "")
                 csrf_token = cookie_csrf.split("%")[0] if cookie_csrf else ""
 
@@ -158,12 +248,17 @@ class Client(AsyncMixin):
         mode: str = "auto",
         model: Optional[str] = None,
         sources: Optional[List[str]] = None,
-        files: Optional[Dict[str, Union[bytes, str]]] = None,
-        stream: bool = False,
+        files: Optional[Dict[str, FileData]] = None,
+        stream: Union[bool, str] = False,
         language: str = "en-US",
         follow_up: Optional[Dict[str, Any]] = None,
         incognito: bool = False,
-    ) -> Union[Dict[str, Any], AsyncGenerator[Dict[str, Any], None]]:
+        retain: str = "last",
+        timeouts: Optional[Timeouts] = None,
+        deadline: Optional[float] = None,
+        partial_ok: bool = False,
+        retry: Optional[RetryPolicy] = None,
+    ) -> Union[SearchResult, AsyncSearchStream]:
         """
         Query function asynchronously.
 
@@ -172,156 +267,501 @@ class Client(AsyncMixin):
         - mode: Search mode ('auto', 'pro', 'reasoning', 'deep research').
         - model: Specific model to use for the query.
         - sources: List of sources ('web', 'scholar', 'social').
-        - files: Dictionary of files to upload.
-        - stream: Whether to stream the response.
+        - files: Dictionary of files to upload: filename to contents (bytes or text),
+          a pathlib.Path, a binary file object or a buffer such as mmap. Files on
+          disk are streamed rather than loaded into memory.
+        - stream: Whether to stream the response. Pass "delta" to receive only the
+          newly appended answer text, steps and citations of each event, or
+          "latest" to receive only the newest snapshot whenever the consumer asks
+          for the next one (intermediate snapshots are dropped undecoded).
         - language: Language code (ISO 639).
         - follow_up: Information for follow-up queries.
         - incognito: Whether to enable incognito mode.
+        - retain: What a streamed search keeps after yielding each result: 'none',
+          'last' (default) or 'all' (debugging). Exposed as ``.retained``.
+        - timeouts: Time limits for this search, overriding the client's.
+        - deadline: Seconds the whole search (uploads and streaming included) may
+          take. Pending awaits are cancelled when it passes.
+        - partial_ok: When the deadline hits a blocking search mid-answer, cancel the
+          transfer and return the latest snapshot (``partial`` set, with ``elapsed``
+          seconds and the ``steps`` reached) instead of raising. Requires a deadline.
+        - retry: Retry policy for this search, overriding the client's. Only the ask
+          request is re-sent, and never once the answer stream has started.
 
         Returns:
-        - Response dict or async generator yielding response dicts if streaming.
-        """
-        if sources is None:
-            sources = ["web"]
-        if files is None:
-            files = {}
-
-        # Validate input parameters and query limits
-        validate_search_params(mode=mode, model=model, sources=sources, own_account=self.own)
-        if files:
-            validate_file_data(files)
-        validate_query_limits(
-            copilot_remaining=self.copilot,
-            file_upload_remaining=self.file_upload,
+        - SearchResult, or an AsyncSearchStream yielding SearchResult snapshots (or
+          delta dicts with stream="delta") if streaming. Use the stream in an
+          ``async with`` block (or await ``aclose()``) to release the connection
+          when stopping early.
+
+        Raises:
+        - RequestTimeoutError: If a time limit is exceeded; ``phase`` names which.
+        """
+        protocol = SearchProtocol(
+            query,
             mode=mode,
-            files_count=len(files),
+            model=model,
+            sources=sources,
+            files=files,
+            stream=stream,
+            language=language,
+            follow_up=follow_up,
+            incognito=incognito,
+            own_account=self.own,
+            retain=retain,
+            timeouts=timeouts if timeouts is not None else self.timeouts,
+            deadline=deadline,
+            partial_ok=partial_ok,
         )
 
-        if mode in ["pro", "reasoning", "deep research"]:
-            self.copilot = max(0, self.copilot - 1) if self.copilot != float("inf") else self.copilot
-        if files:
-            self.file_upload = (
-                max(0, self.file_upload - len(files))
-                if self.file_upload != float("inf")
-                else self.file_upload
-            )
+        key = self.cache.key(protocol) if self.cache is not None else None
+        if self.cache is not None and key is not None:
+            payload = self.cache.get(key)
+            self.hooks.emit("cache", hit=payload is not None, mode=mode)
+            if payload is not None:
+                parser, replayed = protocol.cached_parser(payload)
+                if stream:
+                    return AsyncSearchStream(_replay(replayed), parser)
+                return parser.result()
+
+        flights = self._flights
+        flight_key = request_key(protocol) if flights is not None else None
+        if flights is not None and flight_key is not None:
+            return await self._search_shared(flights, protocol, flight_key, key, retry)
+
+        resp = await self._open(protocol, retry)
+        parser = protocol.response_parser(keep_final=key is not None)
+        chunks = aiter_chunks(resp, protocol.timer)
+
+        async def stream_response():
+            async for chunk in chunks:
+                for item in parser.feed(chunk):
+                    yield item
+                if parser.done:
+                    return
+            for item in parser.close():
+                yield item
 
-        uploaded_files = []
-
-        for filename, file in files.items():
-            file_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-            file_size = len(file) if isinstance(file, (bytes, str)) else sys.getsizeof(file)
-            file_upload_resp = await self.session.post(
-                ENDPOINT_UPLOAD_URL,
-                params={"version": "2.18", "source": "default"},
-                json={
-                    "content_type": file_type,
-                    "file_size": file_size,
-                    "filename": filename,
-                    "force_image": False,
-                    "source": "default",
-                },
-            )
-            if not file_upload_resp.ok:
-                raise FileUploadError(f"Failed to get upload URL: {file_upload_resp.status_code}")
-
-            file_upload_info = file_upload_resp.json()
-
-            mp = CurlMime()
-            for key, value in file_upload_info.get("fields", {}).items():
-                mp.addpart(name=key, data=value)
-            mp.addpart(
-                name="file",
-                content_type=file_type,
-                filename=filename,
-                data=file,
+        if stream:
+            if stream == "latest":
+                results = AsyncConflatingIterator(chunks, parser)
+            else:
+                results = stream_response()
+            return AsyncSearchStream(
+                results,
+                parser,
+                aclose=partial(self._aclose_stream, resp, parser, key, mode),
+                abort=partial(abort_response, resp),
             )
 
-            upload_resp = await self.session.post(file_upload_info["s3_bucket_url"], multipart=mp)
+        # Blocking searches only return the last snapshot, so intermediate
+        # events are framed but never decoded
+        try:
+            async for chunk in chunks:
+                parser.feed(chunk)
+                if parser.done:
+                    break
+        except RequestTimeoutError as e:
+            return protocol.partial_result(parser, e)
+        finally:
+            # Tear the transfer down before returning, even if the upstream stalled
+            await aclose_response(resp)
+        parser.close()
+        self._cache_answer(key, mode, parser)
+
+        return parser.result()
+
+    def search_many(
+        self,
+        queries: Union[Iterable[str], AsyncIterable[str]],
+        concurrency: Union[int, AdaptiveConcurrency] = BATCH_CONCURRENCY,
+        return_exceptions: bool = False,
+        ordered: bool = False,
+        **kwargs: Any,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Runs many searches with bounded concurrency over the shared session.
+
+        Queries are pulled lazily and at most ``concurrency`` searches are in
+        flight at once, so memory stays flat however many queries are given.
 
-            if not upload_resp.ok:
-                raise FileUploadError(f"File upload to storage failed: {upload_resp.status_code}")
+        Parameters:
+        - queries: The search queries, as an iterable or async iterable.
+        - concurrency: Maximum number of searches in flight at once, or an
+          AdaptiveConcurrency controller: the window then follows its limit, which
+          grows while searches are healthy and shrinks on 429s and latency spikes.
+        - return_exceptions: Yield (query, exception) for failed searches instead of
+          raising and cancelling the rest.
+        - ordered: Yield results in the order of ``queries`` instead of as they complete.
+          A slow search then holds back the ones queued behind it.
+        - **kwargs: Options passed to search() for every query (streaming is not supported).
 
-            if "image/upload" in file_upload_info.get("s3_object_url", ""):
-                uploaded_url = re.sub(
-                    r"/private/s--.*?--/v\d+/user_uploads/",
-                    "/private/user_uploads/",
-                    upload_resp.json().get("secure_url", file_upload_info.get("s3_object_url", "")),
-                )
-            else:
-                uploaded_url = file_upload_info.get("s3_object_url", "")
-
-            uploaded_files.append(uploaded_url)
-
-        model_pref = MODEL_MAPPINGS.get(mode, {}).get(model, "turbo")
-
-        json_data = {
-            "query_str": query,
-            "params": {
-                "attachments": (
-                    uploaded_files + follow_up.get("attachments", [])
-                    if follow_up and isinstance(follow_up, dict)
-                    else uploaded_files
-                ),
-                "frontend_context_uuid": str(uuid4()),
-                "frontend_uuid": str(uuid4()),
-                "is_incognito": incognito,
-                "language": language,
-                "last_backend_uuid": (
-                    follow_up.get("backend_uuid") if follow_up and isinstance(follow_up, dict) else None
-                ),
-                "mode": "concise" if mode == "auto" else "copilot",
-                "model_preference": model_pref,
-                "source": "default",
-                "sources": sources,
-                "version": "2.18",
-            },
-        }
-
-        resp = await self.session.post(ENDPOINT_SSE_ASK, json=json_data, stream=True)
-
-        if resp.status_code == 429:
-            raise RateLimitError("Perplexity rate limit reached. Please wait before retrying.")
-        if resp.status_code in (401, 403):
-            raise AuthenticationError(f"Authentication failed: status code {resp.status_code}")
-        if resp.status_code >= 400:
-            raise NetworkError(f"Perplexity request failed with status code {resp.status_code}")
-
-        chunks: List[Dict[str, Any]] = []
-
-        async def stream_response(resp_obj):
-            async for chunk in resp_obj.aiter_lines(delimiter=b"\r\n\r\n"):
-                content = chunk.decode("utf-8") if isinstance(chunk, bytes) else str(chunk)
-
-                if "data: " in content:
+        Returns:
+        - Async iterator of (query, SearchResult) pairs. Searches still in flight are
+          cancelled when the caller stops iterating.
+        """
+        if not isinstance(concurrency, AdaptiveConcurrency):
+            validate_concurrency(concurrency)
+        if kwargs.get("stream"):
+            raise ValidationError("search_many() does not support streaming")
+
+        return self._search_many(queries, concurrency, return_exceptions, ordered, kwargs)
+
+    async def _search_many(
+        self,
+        queries: Union[Iterable[str], AsyncIterable[str]],
+        concurrency: Union[int, AdaptiveConcurrency],
+        return_exceptions: bool,
+        ordered: bool,
+        kwargs: Dict[str, Any],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Async generator behind search_many(); keeps a window of in-flight searches.
+        """
+        if isinstance(queries, AsyncIterable):
+            source = queries.__aiter__()
+
+            async def next_query() -> Optional[str]:
+                try:
+                    return await source.__anext__()
+                except StopAsyncIteration:
+                    return None
+
+        else:
+            source_iter = iter(queries)
+
+            async def next_query() -> Optional[str]:
+                return next(source_iter, None)
+
+        controller = concurrency if isinstance(concurrency, AdaptiveConcurrency) else None
+        window: Deque[Tuple[str, asyncio.Task]] = deque()
+        exhausted = False
+
+        async def fill() -> bool:
+            while len(window) < (
+                concurrency.limit if isinstance(concurrency, AdaptiveConcurrency) else concurrency
+            ):
+                query = await next_query()
+                if query is None:
+                    return True
+                if controller is None:
+                    search = self.search(query, **kwargs)
+                else:
+                    search = self._tracked_search(controller, query, kwargs)
+                window.append((query, asyncio.ensure_future(search)))
+            return False
+
+        try:
+            exhausted = await fill()
+            while window:
+                if ordered:
+                    await asyncio.wait([window[0][1]])
+                    finished = [window.popleft()]
+                else:
+                    done, _ = await asyncio.wait(
+                        [task for _, task in window], return_when=asyncio.FIRST_COMPLETED
+                    )
+                    finished = [item for item in window if item[1] in done]
+                    for item in finished:
+                        window.remove(item)
+
+                # Top the window up before handing results to the caller
+                if not exhausted:
+                    exhausted = await fill()
+
+                for query, task in finished:
                     try:
-                        data_str = content.split("data: ", 1)[1]
-                        content_json = json.loads(data_str)
-                        content_json = parse_nested_json_response(content_json)
-                        chunks.append(content_json)
-                        yield chunks[-1]
-                    except (json.JSONDecodeError, KeyError, IndexError):
-                        continue
-
-                elif "event: end_of_stream" in content:
+                        result: Any = task.result()
+                    except Exception as e:
+                        if not return_exceptions:
+                            raise
+                        result = e
+                    yield query, result
+        finally:
+            for _, task in window:
+                task.cancel()
+            if window:
+                await asyncio.gather(*(task for _, task in window), return_exceptions=True)
+
+    async def _tracked_search(
+        self, controller: AdaptiveConcurrency, query: str, kwargs: Dict[str, Any]
+    ) -> Any:
+        """
+        Runs one search of an adaptive batch and reports its outcome to the controller.
+        """
+        started = controller.start()
+        try:
+            result = await self.search(query, **kwargs)
+        except BaseException as e:
+            controller.finish(started, e)
+            raise
+        controller.finish(started)
+        return result
+
+    async def _open(self, protocol: SearchProtocol, retry: Optional[RetryPolicy]):
+        """
+        Charges the quota, uploads the attachments and returns the answer response.
+        """
+        self.copilot, self.file_upload = protocol.reserve_quota(self.copilot, self.file_upload)
+
+        await self._ensure_handshake()
+
+        attachments = await self._upload_files(protocol)
+        return await (retry or self.retry).acall(
+            partial(self._ask, protocol, attachments),
+            timer=protocol.timer,
+            hooks=self.hooks,
+            endpoint=ENDPOINT_SSE_ASK,
+        )
+
+    async def _search_shared(
+        self,
+        flights: AsyncFlights,
+        protocol: SearchProtocol,
+        flight_key: str,
+        cache_key: Optional[str],
+        retry: Optional[RetryPolicy],
+    ) -> Union[SearchResult, AsyncSearchStream]:
+        """
+        Runs a search on the identical search's answer stream, leading it if there is none.
+        """
+        flight, subscription, leader = flights.join(
+            flight_key, protocol.timer.timeouts, keep_all=protocol.stream in (True, "delta")
+        )
+        if leader:
+            # The request belongs to the flight, so cancelling the leader only makes it leave
+            flight.cancel = asyncio.ensure_future(
+                self._pump(flights, flight, protocol, retry, cache_key)
+            ).cancel
+        else:
+            self.hooks.emit("coalesce", mode=protocol.mode, subscribers=len(flight.subscriptions))
+
+        parser = ResponseParser(protocol.stream, protocol.retain)
+        results = self._follow(flights, protocol, flight, subscription, parser)
+        if protocol.stream:
+            return AsyncSearchStream(
+                results,
+                parser,
+                aclose=partial(flights.aleave, flight, subscription),
+                abort=partial(flights.leave, flight, subscription),
+            )
+        try:
+            async for _ in results:
+                pass
+        except RequestTimeoutError as e:
+            return protocol.partial_result(parser, e)
+        return parser.result()
+
+    async def _pump(
+        self,
+        flights: AsyncFlights,
+        flight: Flight,
+        protocol: SearchProtocol,
+        retry: Optional[RetryPolicy],
+        cache_key: Optional[str],
+    ) -> None:
+        """
+        Sends a shared search in a task of its own and hands its answer stream to
+        the subscribers.
+        """
+        try:
+            resp = await self._open(protocol, retry)
+        except Exception as e:
+            flights.finish(flight, e)
+            return
+
+        flight.timer.start_stream()
+        try:
+            async for chunk in aiter_chunks(resp, flight.timer):
+                if flights.feed(flight, chunk):
+                    break
+        except asyncio.CancelledError:
+            # Every search left
+            await aclose_response(resp)
+            raise
+        except Exception as e:
+            await aclose_response(resp)
+            flights.finish(flight, e)
+            return
+        payload = flight.latest if flight.complete else None
+        if self.cache is not None and cache_key is not None and payload is not None:
+            self.cache.put(cache_key, protocol.mode, payload)
+        flights.finish(flight)
+        try:
+            await aclose_response(resp)
+        except Exception as e:
+            logger.debug(f"Closing a shared answer stream failed: {e}")
+
+    async def _follow(
+        self,
+        flights: AsyncFlights,
+        protocol: SearchProtocol,
+        flight: Flight,
+        subscription: Subscription,
+        parser: ResponseParser,
+    ) -> AsyncIterator[Any]:
+        """
+        Yields one search's results from a shared answer stream, within its deadline.
+        """
+        try:
+            while True:
+                taken = await flights.take(flight, subscription, protocol.timer.remaining())
+                if taken is None:
+                    raise protocol.timer.expired("deadline")
+                payloads, done = taken
+                for item in parser.feed_payloads(payloads, end=done and flight.complete):
+                    yield item
+                if done:
+                    if flight.error is not None:
+                        raise flight.error
+                    for item in parser.close():
+                        yield item
                     return
+        finally:
+            flights.leave(flight, subscription)
 
-        if stream:
-            return stream_response(resp)
+    async def _ask(self, protocol: SearchProtocol, attachments: List[str]):
+        """
+        Sends the ask request and returns the response once its status is OK.
+        """
+        if self.rate_limiter is not None:
+            waited = await self.rate_limiter.aacquire(
+                protocol.mode, protocol.timer.remaining(), self.hooks
+            )
+            if waited is None:
+                # No token would be available before the deadline
+                raise protocol.timer.expired("deadline")
+        resp = await self._send(protocol.search_request(attachments), stream=True)
+        try:
+            check_search_status(resp.status_code, resp.headers)
+        except Exception:
+            await aclose_response(resp)
+            raise
+        return resp
+
+    async def _aclose_stream(
+        self, resp, parser: ResponseParser, key: Optional[str], mode: str
+    ) -> None:
+        """
+        Releases a streamed search's response, caching the answer if it completed.
+        """
+        await aclose_response(resp)
+        self._cache_answer(key, mode, parser)
 
-        async for chunk in resp.aiter_lines(delimiter=b"\r\n\r\n"):
-            content = chunk.decode("utf-8") if isinstance(chunk, bytes) else str(chunk)
+    def _cache_answer(self, key: Optional[str], mode: str, parser: ResponseParser) -> None:
+        """
+        Stores a completed answer in the response cache, if the search is cacheable.
+        """
+        payload = parser.final_payload() if key is not None else None
+        if self.cache is not None and key is not None and payload is not None:
+            self.cache.put(key, mode, payload)
 
-            if "data: " in content:
-                try:
-                    data_str = content.split("data: ", 1)[1]
-                    content_json = json.loads(data_str)
-                    content_json = parse_nested_json_response(content_json)
-                    chunks.append(content_json)
-                except (json.JSONDecodeError, KeyError, IndexError):
-                    continue
+    async def _upload_files(self, protocol: SearchProtocol) -> List[str]:
+        """
+        Uploads the attachments concurrently and returns their URLs in order.
+
+        The first failure is raised at once and cancels the other uploads.
+        """
+        if len(protocol.uploads) <= 1 or self.upload_concurrency == 1:
+            return [await self._upload_file(protocol, upload) for upload in protocol.uploads]
+
+        slots = asyncio.Semaphore(self.upload_concurrency)
+
+        async def upload_in_slot(upload: FileUpload) -> str:
+            async with slots:
+                return await self._upload_file(protocol, upload)
+
+        tasks = [asyncio.ensure_future(upload_in_slot(upload)) for upload in protocol.uploads]
+        try:
+            return list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
 
-            elif "event: end_of_stream" in content:
-                return chunks[-1] if chunks else {}
+    async def _upload_file(self, protocol: SearchProtocol, upload: FileUpload) -> str:
+        """
+        Uploads one attachment asynchronously and returns its URL, reusing a cached upload.
+        """
+        key: Optional[str] = None
+        url: Optional[str] = None
+        if self.upload_cache is not None:
+            if upload.path is not None:
+                # Hashing a file on disk reads all of it: keep that off the event loop
+                loop = asyncio.get_running_loop()
+                key = await loop.run_in_executor(None, self.upload_cache.key, upload)
+            else:
+                key = self.upload_cache.key(upload)
+            url = self.upload_cache.get(key)
+        cached = url is not None
+        sent = upload
+        if url is None:
+            if self.upload_optimizer is not None:
+                sent = await asyncio.wrap_future(self.upload_optimizer.submit(upload))
+            resp = await self._send(protocol.upload_url_request(sent))
+            upload_info = protocol.parse_upload_info(resp.status_code, resp.content)
+
+            # Streamed, so a large upload is only cut off if it stalls
+            request = protocol.upload_request(sent, upload_info)
+            upload_resp = await self._send(request, stream=True)
+            body = await aread_body(upload_resp, request)
+            url = protocol.uploaded_url(upload_info, upload_resp.status_code, body)
+            if self.upload_cache is not None and key is not None:
+                self.upload_cache.put(key, url)
+        self.hooks.emit(
+            "upload",
+            filename=upload.filename,
+            size=upload.size,
+            cached=cached,
+            saved=upload.size - sent.size,
+        )
+        return url
 
-        return chunks[-1] if chunks else {}
+    async def _ensure_handshake(self) -> None:
+        """
+        Performs the session handshake once; concurrent callers await the same task.
+        """
+        if self._handshake_task is None:
+            self._handshake_task = asyncio.ensure_future(self._handshake())
+        # Shielded so a cancelled request does not cancel the shared handshake
+        await asyncio.shield(self._handshake_task)
+
+    async def _handshake(self) -> None:
+        """
+        Sends the handshake request, logging instead of raising on failure.
+        """
+        try:
+            await self._send(handshake_request(self.timeouts))
+        except Exception as e:
+            logger.warning(f"Initial async session handshake notice: {e}")
+
+    async def _send(self, request: HTTPRequest, stream: bool = False):
+        """
+        Sends a request, through its endpoint's circuit breaker if it has one.
+        """
+        if request.endpoint is None:
+            return await self._transmit(request, stream)
+        breaker = self.breakers[request.endpoint]
+        breaker.allow()
+        try:
+            resp = await self._transmit(request, stream)
+        except BaseException as e:
+            breaker.record(error=e)
+            raise
+        breaker.record(resp.status_code)
+        return resp
+
+    async def _transmit(self, request: HTTPRequest, stream: bool = False):
+        """
+        Sends a request described by the protocol core over the async session.
+        """
+        send = getattr(self.session, request.method.lower())
+        pending = send(request.url, stream=stream, **request_kwargs(request))
+        try:
+            if request.expires_at is None:
+                return await pending
+            # Cancel the request, releasing its curl handle, once the deadline passes
+            return await asyncio.wait_for(pending, max(0.0, request.expires_at - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise send_timeout_error(request, stream) from None
+        except CurlTimeout as e:
+            raise send_timeout_error(request, stream, e) from e
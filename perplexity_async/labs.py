@@ -1,5 +1,4 @@
 import asyncio
-import json
 import random
 import socket
 import ssl
@@ -10,6 +9,7 @@ from typing import Any, AsyncGenerator, Dict, List, Optional, Union
 from curl_cffi import requests
 from websocket import WebSocketApp, WebSocketException
 
+from perplexity import codec
 from perplexity.config import DEFAULT_HEADERS, ENDPOINT_SOCKET_IO, LABS_MODELS
 from perplexity.exceptions import AuthenticationError, NetworkError, ValidationError
 from perplexity.logger import get_logger
@@ -51,7 +51,7 @@ class LabsClient(AsyncMixin):
             poll_url = f"{ENDPOINT_SOCKET_IO}?EIO=4&transport=polling&t={self.timestamp}"
             response = await self.session.get(poll_url)
             response.raise_for_status()
-            self.sid = json.loads(response.text[1:])["sid"]
+            self.sid = codec.loads(response.text[1:])["sid"]
             self.last_answer: Optional[Dict[str, Any]] = None
             self.history: List[Dict[str, Any]] = []
 
@@ -115,7 +115,7 @@ class LabsClient(AsyncMixin):
                 ws.send("3")
 
             elif message.startswith("42"):
-                response = json.loads(message[2:])[1]
+                response = codec.loads(message[2:])[1]
 
                 if isinstance(response, dict) and "final" in response:
                     self.last_answer = response
@@ -157,7 +157,7 @@ class LabsClient(AsyncMixin):
 
         self.ws.send(
             "42"
-            + json.dumps(
+            + codec.dumps(
                 [
                     "perplexity_labs",
                     {
@@ -0,0 +1,50 @@
+"""Fakes and fixtures shared by the test modules."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from perplexity_async.client import Client as AsyncClient
+
+
+class FakeClock:
+    """Monotonic clock that only moves when a test advances ``now``."""
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class AsyncAnswer:
+    """Minimal streamed async response carrying the given body chunks."""
+
+    headers: dict = {}
+
+    def __init__(self, *chunks: bytes, status_code: int = 200) -> None:
+        self.status_code = status_code
+        self.body = chunks
+        self.aclose = AsyncMock()
+
+    async def aiter_content(self):
+        for chunk in self.body:
+            yield chunk
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def async_client():
+    """Builds an async client that skips the handshake and sends through ``post``."""
+
+    async def build(post, *args, **kwargs) -> AsyncClient:
+        with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+            client = await AsyncClient(*args, **kwargs)
+        client.session.post = post
+        return client
+
+    return build
@@ -0,0 +1,144 @@
+"""Tests for the per-endpoint circuit breakers."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError
+
+from perplexity import CircuitBreakers, Hooks, RetryPolicy
+from perplexity.breaker import CircuitBreaker
+from perplexity.client import Client
+from perplexity.exceptions import (
+    CircuitOpenError,
+    NetworkError,
+    RequestTimeoutError,
+    ValidationError,
+)
+from perplexity_async.client import Client as AsyncClient
+
+BODY = b'data: {"blocks": []}\r\n\r\nevent: end_of_stream\r\n\r\n'
+
+
+def _fail(breaker: CircuitBreaker, times: int = 1) -> None:
+    for _ in range(times):
+        breaker.allow()
+        breaker.record(status_code=503)
+
+
+def test_opens_after_consecutive_failures_and_recovers(clock) -> None:
+    hooks = Hooks()
+    events = []
+    hooks.on("circuit", lambda event, data: events.append((data["previous"], data["state"])))
+    breaker = CircuitBreaker("ask", failure_threshold=3, recovery_time=10, hooks=hooks, clock=clock)
+
+    _fail(breaker, 2)
+    breaker.allow()
+    breaker.record(status_code=404)  # the service answered: not a failure
+    _fail(breaker, 2)
+    assert breaker.state == "closed"
+    _fail(breaker)
+    assert breaker.state == "open"
+
+    clock.now += 4
+    with pytest.raises(CircuitOpenError) as exc_info:
+        breaker.allow()
+    assert exc_info.value.endpoint == "ask"
+    assert exc_info.value.retry_in == pytest.approx(6)
+    assert isinstance(exc_info.value, NetworkError)
+
+    # One trial request once the recovery time has passed
+    clock.now += 6
+    breaker.allow()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(status_code=200)
+    assert breaker.state == "closed"
+
+    assert events == [("closed", "open"), ("open", "half_open"), ("half_open", "closed")]
+    assert hooks.metrics["circuit.ask"] == "closed"
+
+
+def test_failed_trial_reopens_and_cancellation_releases(clock) -> None:
+    breaker = CircuitBreaker("upload", failure_threshold=1, recovery_time=5, clock=clock)
+    _fail(breaker)
+    clock.now += 5
+    breaker.allow()
+    breaker.record(error=CurlConnectionError("refused"))
+    assert breaker.state == "open"
+
+    clock.now += 5
+    breaker.allow()
+    breaker.record(error=asyncio.CancelledError())  # no verdict, frees the trial slot
+    assert breaker.state == "half_open"
+    breaker.allow()
+    breaker.record(error=RequestTimeoutError("late", phase="deadline"))
+    assert breaker.state == "half_open"
+
+    with pytest.raises(ValidationError):
+        CircuitBreakers(failure_threshold=0)
+    never = CircuitBreaker("ask", failure_threshold=None)
+    _fail(never, 50)
+    assert never.state == "closed"
+
+
+def test_client_fails_fast_while_open() -> None:
+    post = MagicMock(side_effect=CurlConnectionError("Connection refused"))
+    breakers = CircuitBreakers(failure_threshold=2, recovery_time=60)
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        client = Client(retry=RetryPolicy(max_attempts=1), breakers=breakers)
+        for _ in range(2):
+            with pytest.raises(CurlConnectionError):
+                client.search("down")
+        with pytest.raises(CircuitOpenError):
+            client.search("down")
+
+    assert post.call_count == 2
+    assert breakers.states() == {"ask": "open"}
+
+
+def test_open_circuit_is_not_retried() -> None:
+    post = MagicMock(return_value=MagicMock(status_code=503, headers={}))
+    breakers = CircuitBreakers(failure_threshold=2)
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        client = Client(retry=RetryPolicy(max_attempts=5, base_delay=0), breakers=breakers)
+        with pytest.raises(CircuitOpenError):
+            client.search("down")
+    assert post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_client_shares_breakers() -> None:
+    class _Answer:
+        headers: dict = {}
+
+        def __init__(self, status: int) -> None:
+            self.status_code = status
+            self.aclose = AsyncMock()
+
+        async def aiter_content(self):
+            yield BODY
+
+    breakers = CircuitBreakers(failure_threshold=1, recovery_time=0.05)
+    clients = []
+    for _ in range(2):
+        with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+            client = await AsyncClient(retry=RetryPolicy(max_attempts=1), breakers=breakers)
+        clients.append(client)
+    clients[0].session.post = AsyncMock(return_value=_Answer(500))
+    clients[1].session.post = AsyncMock(return_value=_Answer(200))
+
+    with pytest.raises(NetworkError):
+        await clients[0].search("q")
+    with pytest.raises(CircuitOpenError):
+        await clients[1].search("q")
+    assert clients[1].session.post.await_count == 0
+
+    await asyncio.sleep(0.06)
+    await clients[1].search("q")
+    assert breakers["ask"].state == "closed"
@@ -0,0 +1,325 @@
+"""Tests for the response cache."""
+
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from perplexity import Hooks, ResponseCache, UploadCache
+from perplexity.cache import DiskCache, MemoryCache, search_key, upload_key
+from perplexity.client import Client
+from perplexity.config import ENDPOINT_UPLOAD_URL
+from perplexity.exceptions import ValidationError
+from perplexity.protocol import FileUpload, SearchProtocol
+from perplexity_async.client import Client as AsyncClient
+
+STEPS = [{"step_type": "FINAL", "content": {"answer": json.dumps({"answer": "Cached answer"})}}]
+PAYLOAD = json.dumps({"text": json.dumps(STEPS), "status": "COMPLETED"}).encode()
+BODY = b"data: " + PAYLOAD + b"\r\n\r\nevent: end_of_stream\r\n\r\n"
+
+
+def _answer(body: bytes = BODY) -> MagicMock:
+    resp = MagicMock(status_code=200, headers={})
+    resp.iter_content.return_value = [body]
+    return resp
+
+
+def test_memory_cache_lru_bounds_and_ttl(clock) -> None:
+    cache = MemoryCache(max_entries=2, max_bytes=100, clock=clock)
+    cache.set("a", b"1", ttl=10)
+    cache.set("b", b"2", ttl=10)
+    assert cache.get("a") == b"1"  # now most recently used
+    cache.set("c", b"3", ttl=10)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+
+    cache.set("big", b"x" * 60, ttl=10)
+    cache.set("bigger", b"x" * 60, ttl=10)  # the byte bound evicts down to one entry
+    assert len(cache) == 1 and cache.size == len("bigger") + 60
+    cache.set("huge", b"x" * 200, ttl=10)  # over the bound on its own: not stored
+    assert cache.get("huge") is None
+
+    clock.now += 10
+    assert cache.get("bigger") is None
+    assert cache.size == 0
+
+    with pytest.raises(ValidationError):
+        MemoryCache(max_entries=0)
+    with pytest.raises(TypeError, match="must be bytes"):
+        cache.set("dict", {}, ttl=10)  # type: ignore[arg-type]
+
+
+def test_disk_cache_compresses_expires_and_evicts(tmp_path, clock) -> None:
+    path = tmp_path / "nested" / "cache.sqlite3"
+    cache = DiskCache(path, max_bytes=2000, clock=clock)
+    cache.set("a", PAYLOAD * 20, ttl=10)
+    assert cache.get("a") == PAYLOAD * 20
+    assert cache.size < len(PAYLOAD) * 20
+
+    clock.now += 10
+    assert cache.get("a") is None and len(cache) == 0
+
+    blobs = {key: random.Random(key).randbytes(600) for key in "bcd"}  # incompressible
+    for key, value in blobs.items():
+        clock.now += 60
+        cache.set(key, value, ttl=1000)
+    clock.now += 60
+    assert cache.get("b") == blobs["b"]  # now the most recently used
+    cache.set("e", blobs["b"], ttl=1000)
+    assert cache.get("c") is None
+    assert cache.get("b") is not None and cache.get("e") is not None
+    assert cache.size <= 2000
+
+    with pytest.raises(ValidationError):
+        DiskCache(path, compress_level=10)
+    with pytest.raises(TypeError, match="must be bytes"):
+        cache.set("f", {}, ttl=10)  # type: ignore[arg-type]
+
+
+def test_disk_cache_is_shared_between_processes(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DiskCache(path)
+    cache.set("parent", b"from the parent", ttl=60)
+    code = (
+        "import sys; from perplexity.cache import DiskCache; "
+        "cache = DiskCache(sys.argv[1]); "
+        "assert cache.get('parent') == b'from the parent'; "
+        "cache.set('child', b'from the child', 60)"
+    )
+    subprocess.run([sys.executable, "-c", code, path], check=True)
+    assert cache.get("child") == b"from the child"
+
+
+def test_disk_cache_compaction_and_errors(tmp_path, clock) -> None:
+    cache = DiskCache(tmp_path / "cache.sqlite3", clock=clock)
+    for i in range(20):
+        cache.set(f"k{i}", bytes(1000), ttl=5 if i % 2 else 50)
+    clock.now += 10
+    assert cache.compact() == 10
+    assert len(cache) == 10
+
+    # A damaged entry reads as a miss instead of failing the search
+    conn = sqlite3.connect(tmp_path / "cache.sqlite3")
+    conn.execute("UPDATE entries SET value = x'00' WHERE key = 'k0'")
+    conn.commit()
+    conn.close()
+    assert cache.get("k0") is None
+    assert cache.get("k2") == bytes(1000)
+
+    # So does a database another process keeps locked
+    locked = DiskCache(tmp_path / "cache.sqlite3", timeout=0.05, clock=clock)
+    conn = sqlite3.connect(tmp_path / "cache.sqlite3", isolation_level=None)
+    conn.execute("BEGIN EXCLUSIVE")
+    try:
+        locked.clear()
+        assert locked.compact() == 0
+    finally:
+        conn.rollback()
+        conn.close()
+    assert len(cache) == 10
+
+
+def test_keys_are_normalised_and_bypassed() -> None:
+    assert search_key("What  is\tPython? ") == search_key("What is Python?")
+    assert search_key("q", sources=["scholar", "web"]) == search_key(
+        "q", sources=["web", "scholar"]
+    )
+    assert search_key("q", language="EN-us") == search_key("q")
+    assert search_key("q", mode="pro") != search_key("q")
+
+    cache = ResponseCache(ttl={"auto": 60})
+    assert cache.key(SearchProtocol("q")) == search_key("q")
+    assert cache.key(SearchProtocol("q", incognito=True)) is None
+    assert cache.key(SearchProtocol("q", follow_up={"backend_uuid": "b"})) is None
+    assert cache.key(SearchProtocol("q", files={"a.txt": "text"})) is None
+    assert cache.key(SearchProtocol("q", mode="pro", own_account=True)) is None  # no TTL
+
+    assert ResponseCache().ttl_for("deep research") == ResponseCache().ttl_for("pro")
+    with pytest.raises(ValidationError):
+        ResponseCache(ttl={"auto": -1})
+
+
+def test_client_serves_repeats_from_the_cache() -> None:
+    post = MagicMock(side_effect=lambda url, **kwargs: _answer())
+    hooks = Hooks()
+    events = []
+    hooks.on("cache", lambda event, data: events.append(data["hit"]))
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        client = Client(cache=ResponseCache(), hooks=hooks)
+        first = client.search("What is Python?")
+        second = client.search("What  is Python? ")
+        client.search("What is Python?", incognito=True)
+
+    assert post.call_count == 2
+    assert first.answer == second.answer == "Cached answer"
+    assert events == [False, True]
+
+
+def test_cached_stream_replays_one_event() -> None:
+    post = MagicMock(side_effect=lambda url, **kwargs: _answer())
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        client = Client(cache=ResponseCache())
+        live = list(client.search("q", stream=True))
+        with client.search("q", stream=True) as stream:
+            replayed = list(stream)
+        deltas = list(client.search("q", stream="delta"))
+        latest = list(client.search("q", stream="latest"))
+
+    assert post.call_count == 1
+    assert [r.answer for r in replayed] == [live[-1].answer]
+    assert len(deltas) == 1 and deltas[0]["answer"] == "Cached answer" and deltas[0]["final"]
+    assert [r.answer for r in latest] == ["Cached answer"]
+
+
+def test_incomplete_answers_are_not_cached() -> None:
+    truncated = b"data: " + PAYLOAD + b"\r\n\r\n"
+    post = MagicMock(side_effect=lambda url, **kwargs: _answer(truncated))
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        client = Client(cache=ResponseCache())
+        client.search("q")
+        client.search("q")
+        resp = _answer()
+        resp.iter_content.return_value = [truncated, b"event: end_of_stream\r\n\r\n"]
+        post.side_effect = [resp]
+        with client.search("q", stream=True) as stream:
+            next(stream)  # stopped before the end of the stream
+        post.side_effect = lambda url, **kwargs: _answer()
+        client.search("q")
+        client.search("q")
+
+    assert post.call_count == 4
+
+
+def test_empty_streams_are_not_cached() -> None:
+    empty = b"event: end_of_stream\r\n\r\n"
+    post = MagicMock(side_effect=lambda url, **kwargs: _answer(empty))
+    backend = MemoryCache()
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        client = Client(cache=ResponseCache(backend))
+        assert client.search("q").answer == ""
+        assert list(client.search("q", stream=True)) == []
+        client.search("q")
+
+    assert post.call_count == 3
+    assert len(backend) == 0
+
+
+def test_disk_cache_survives_client_restarts(tmp_path) -> None:
+    post = MagicMock(side_effect=lambda url, **kwargs: _answer())
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        for _ in range(2):
+            cache = ResponseCache(DiskCache(tmp_path / "cache.sqlite3"))
+            assert Client(cache=cache).search("q").answer == "Cached answer"
+    assert post.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_async_client_shares_the_cache() -> None:
+    class _Answer:
+        status_code = 200
+        headers: dict = {}
+
+        def __init__(self) -> None:
+            self.aclose = AsyncMock()
+
+        async def aiter_content(self):
+            yield BODY
+
+    cache = ResponseCache()
+    with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+        client = await AsyncClient(cache=cache)
+    client.session.post = AsyncMock(side_effect=lambda url, **kwargs: _Answer())
+
+    async with await client.search("q", stream=True) as stream:
+        live = [snapshot async for snapshot in stream]
+    replayed = [snapshot async for snapshot in await client.search("q", stream=True)]
+    result = await client.search("q")
+
+    assert client.session.post.await_count == 1
+    assert [r.answer for r in replayed] == [live[-1].answer] == [result.answer]
+
+
+def test_upload_keys_cover_contents_name_and_type() -> None:
+    key = upload_key(FileUpload("a.txt", b"abc"))
+    assert key.startswith("upload:")
+    assert upload_key(FileUpload("a.txt", "abc")) == key
+    assert upload_key(FileUpload("a.txt", b"abd")) != key
+    assert upload_key(FileUpload("b.txt", b"abc")) != key
+    assert upload_key(FileUpload("a.md", b"abc")) != key
+
+    with pytest.raises(ValidationError):
+        UploadCache(ttl=0)
+
+
+def test_client_reuses_uploaded_files() -> None:
+    def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            info = {"s3_bucket_url": "https://bucket", "s3_object_url": "https://obj/a.pdf"}
+            return MagicMock(status_code=200, content=json.dumps(info).encode())
+        if url == "https://bucket":
+            return MagicMock(status_code=204, content=b"")
+        return _answer()
+
+    hooks = Hooks()
+    events = []
+    hooks.on("upload", lambda event, data: events.append(data["cached"]))
+    backend = MemoryCache()
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", MagicMock(side_effect=post)
+    ) as mock_post:
+        client = Client({"cookie": "value"}, hooks=hooks, upload_cache=UploadCache(backend))
+        client.search("Summarise", files={"a.pdf": b"%PDF"})
+        client.search("List the authors", files={"a.pdf": b"%PDF"})
+        client.search("Summarise", files={"a.pdf": b"%PDF-changed"})
+
+    urls = [call.args[0] for call in mock_post.call_args_list]
+    assert urls.count(ENDPOINT_UPLOAD_URL) == 2 and urls.count("https://bucket") == 2
+    assert events == [False, True, False]
+    ask = json.loads(mock_post.call_args_list[3].kwargs["data"])
+    assert ask["params"]["attachments"] == ["https://obj/a.pdf"]
+    assert len(backend) == 2
+
+
+@pytest.mark.asyncio
+async def test_async_client_reuses_uploaded_files() -> None:
+    class _Answer:
+        status_code = 200
+        headers: dict = {}
+
+        def __init__(self) -> None:
+            self.aclose = AsyncMock()
+
+        async def aiter_content(self):
+            yield BODY
+
+    def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            info = {"s3_bucket_url": "https://bucket", "s3_object_url": "https://obj/a.pdf"}
+            return MagicMock(status_code=200, content=json.dumps(info).encode())
+        if url == "https://bucket":
+            return MagicMock(status_code=204, aclose=AsyncMock())
+        return _Answer()
+
+    uploads = UploadCache()
+    with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+        client = await AsyncClient({"cookie": "value"}, upload_cache=uploads)
+    client.session.post = AsyncMock(side_effect=post)
+
+    for _ in range(2):
+        await client.search("q", files={"a.pdf": b"%PDF"})
+    urls = [call.args[0] for call in client.session.post.await_args_list]
+    assert urls.count(ENDPOINT_UPLOAD_URL) == 1
@@ -1,9 +1,14 @@
 """Tests for Client and AsyncClient classes."""
 
+import asyncio
 import json
-from unittest.mock import MagicMock, patch
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from curl_cffi import requests
 
 from perplexity.client import Client
 from perplexity.exceptions import (
@@ -13,8 +18,11 @@ from perplexity.exceptions import (
     RateLimitError,
     ValidationError,
 )
+from perplexity.result import SearchResult
 from perplexity_async.client import Client as AsyncClient
 
+from tests.conftest import AsyncAnswer
+
 
 def test_client_init_defaults() -> None:
     with patch("curl_cffi.requests.Session.get") as mock_get:
@@ -64,15 +72,13 @@ def test_client_search_success_mock() -> None:
         
         mock_resp = MagicMock()
         mock_resp.status_code = 200
-        mock_resp.iter_lines.return_value = [
-            f"data: {json.dumps(mock_response_data)}".encode("utf-8"),
-            b"event: end_of_stream",
-        ]
+        mock_resp.iter_content.return_value = [sse_chunk]
         mock_post.return_value = mock_resp
 
         cli = Client()
         result = cli.search("What is Python?", mode="auto")
         assert isinstance(result, dict)
+        assert isinstance(result, SearchResult)
         assert result.get("answer") == "Python is a language"
 
 
@@ -101,3 +107,262 @@ def test_client_search_http_errors() -> None:
         mock_post.return_value = mock_500
         with pytest.raises(NetworkError):
             cli.search("test")
+
+
+def _answer_response(answer: str) -> MagicMock:
+    payload = {"blocks": [{"intended_usage": "ask_text", "markdown_block": {"answer": answer}}]}
+    body = f"data: {json.dumps(payload)}\r\n\r\nevent: end_of_stream\r\n\r\n".encode("utf-8")
+    resp = MagicMock(status_code=200)
+    resp.iter_content.return_value = [body]
+    return resp
+
+
+def _echo_post(barrier=None, delays=None, sessions=None):
+    """Session.post stand-in answering each search with its own query."""
+
+    def post(session, url, **kwargs):
+        query = json.loads(kwargs["data"])["query_str"]
+        if sessions is not None:
+            sessions.add(id(session))
+        if barrier is not None:
+            barrier.wait()
+        time.sleep((delays or {}).get(query, 0))
+        return _answer_response(f"answer to {query}")
+
+    return post
+
+
+def test_search_many_runs_searches_concurrently() -> None:
+    queries = ["a", "b", "c"]
+    sessions: set = set()
+    # Every search blocks until all three are in flight, so a serial run would time out
+    barrier = threading.Barrier(len(queries), timeout=5)
+
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch.object(
+        requests.Session, "post", autospec=True, side_effect=_echo_post(barrier, sessions=sessions)
+    ):
+        cli = Client()
+        results = list(cli.search_many(queries, max_workers=3, ordered=True))
+
+    assert [query for query, _ in results] == queries
+    answers = [result.blocks[0]["markdown_block"]["answer"] for _, result in results]
+    assert answers == [f"answer to {q}" for q in queries]
+    # Concurrent requests never share a curl handle
+    assert len(sessions) == 3
+
+
+def test_pooled_sessions_share_the_cookie_jar() -> None:
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)):
+        cli = Client({"cookie": "value"})
+    with cli._sessions.session() as first, cli._sessions.session() as second:
+        with cli._sessions.session() as third:
+            pass
+    assert cli._sessions.size == 3
+
+    # Set after the pool grew, through the primary session and a pooled one
+    cli.session.cookies.set("fresh", "1", domain=".perplexity.ai")
+    third.cookies.set("late", "2", domain=".perplexity.ai")
+    for session in (first, second, third):
+        assert session.cookies.get("cookie") == "value"
+        assert session.cookies.get("fresh") == "1"
+        assert session.cookies.get("late") == "2"
+
+
+def test_search_many_yields_as_completed() -> None:
+    post = _echo_post(delays={"slow": 0.3})
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch.object(
+        requests.Session, "post", autospec=True, side_effect=post
+    ):
+        cli = Client()
+        done = [query for query, _ in cli.search_many(["slow", "fast"], max_workers=2)]
+    assert done == ["fast", "slow"]
+
+
+def test_search_many_validation() -> None:
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)):
+        cli = Client()
+        with pytest.raises(ValidationError, match="max_workers"):
+            cli.search_many(["a"], max_workers=0)
+        with pytest.raises(ValidationError, match="streaming"):
+            cli.search_many(["a"], stream=True)
+
+
+def test_quota_ledger_is_atomic_across_threads() -> None:
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch.object(
+        requests.Session, "post", autospec=True, side_effect=_echo_post()
+    ):
+        cli = Client(cookies={"next-auth.session-token": "x"})
+        cli.copilot = 5
+
+        def pro_search(query):
+            try:
+                return cli.search(query, mode="pro")
+            except ValidationError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(pro_search, [str(i) for i in range(8)]))
+
+    assert sum(result is not None for result in results) == 5
+    assert cli.copilot == 0
+
+
+def _async_echo_post(delays=None, failing=(), stats=None):
+    """AsyncSession.post stand-in answering each search with its own query."""
+
+    async def post(url, **kwargs):
+        query = json.loads(kwargs["data"])["query_str"]
+        if stats is not None:
+            stats["in_flight"] += 1
+            stats["peak"] = max(stats["peak"], stats["in_flight"])
+        try:
+            await asyncio.sleep((delays or {}).get(query, 0.01))
+        except asyncio.CancelledError:
+            if stats is not None:
+                stats["cancelled"] += 1
+            raise
+        finally:
+            if stats is not None:
+                stats["in_flight"] -= 1
+        resp = AsyncAnswer(*_answer_response(f"answer to {query}").iter_content.return_value)
+        if query in failing:
+            resp.status_code = 500
+        return resp
+
+    return post
+
+
+@pytest.mark.asyncio
+async def test_async_search_many_bounds_concurrency(async_client) -> None:
+    stats = {"in_flight": 0, "peak": 0, "cancelled": 0}
+    client = await async_client(_async_echo_post(stats=stats))
+    queries = (f"q{i}" for i in range(20))
+
+    results = [pair async for pair in client.search_many(queries, concurrency=3)]
+
+    assert sorted(query for query, _ in results) == sorted(f"q{i}" for i in range(20))
+    assert all(isinstance(result, SearchResult) for _, result in results)
+    assert stats["peak"] == 3
+
+
+@pytest.mark.asyncio
+async def test_async_search_many_ordering(async_client) -> None:
+    delays = {"slow": 0.2, "fast": 0.01}
+    client = await async_client(_async_echo_post(delays=delays))
+
+    completed = [query async for query, _ in client.search_many(["slow", "fast"], concurrency=2)]
+    ordered = [
+        query
+        async for query, _ in client.search_many(["slow", "fast"], concurrency=2, ordered=True)
+    ]
+
+    assert completed == ["fast", "slow"]
+    assert ordered == ["slow", "fast"]
+
+
+@pytest.mark.asyncio
+async def test_async_search_many_error_isolation(async_client) -> None:
+    client = await async_client(_async_echo_post(failing={"bad"}))
+
+    results = dict(
+        [
+            pair
+            async for pair in client.search_many(
+                ["good", "bad"], return_exceptions=True, ordered=True
+            )
+        ]
+    )
+    assert isinstance(results["good"], SearchResult)
+    assert isinstance(results["bad"], NetworkError)
+
+    with pytest.raises(NetworkError):
+        async for _ in client.search_many(["bad", "good"], ordered=True):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_async_search_many_cancels_on_early_exit(async_client) -> None:
+    stats = {"in_flight": 0, "peak": 0, "cancelled": 0}
+    delays = {"first": 0.01, "second": 5, "third": 5}
+    client = await async_client(_async_echo_post(delays=delays, stats=stats))
+
+    batch = client.search_many(["first", "second", "third"], concurrency=3)
+    async for query, _ in batch:
+        assert query == "first"
+        break
+    await batch.aclose()
+
+    assert stats["cancelled"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_lazy_handshake_runs_once_on_first_request() -> None:
+    handshakes = []
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.1)
+        handshakes.append(time.monotonic())
+        return MagicMock(ok=True)
+
+    posts = []
+
+    def post(session, url, **kwargs):
+        posts.append(time.monotonic())
+        return _answer_response("ok")
+
+    with patch("curl_cffi.requests.Session.get", side_effect=slow_get), patch.object(
+        requests.Session, "post", autospec=True, side_effect=post
+    ):
+        cli = Client(handshake="lazy")
+        assert handshakes == []
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(cli.search, ["a", "b", "c", "d"]))
+        cli.search("e")
+
+    # Concurrent first requests shared one handshake and waited for it
+    assert len(handshakes) == 1
+    assert min(posts) >= handshakes[0]
+
+
+def test_background_handshake_does_not_block_construction() -> None:
+    released = threading.Event()
+
+    def blocked_get(*args, **kwargs):
+        released.wait(5)
+        return MagicMock(ok=True)
+
+    get = MagicMock(side_effect=blocked_get)
+
+    with patch("curl_cffi.requests.Session.get", get), patch.object(
+        requests.Session, "post", autospec=True, side_effect=_echo_post()
+    ):
+        cli = Client(handshake="background")
+        assert not released.is_set()
+        released.set()
+        cli.search("q")
+
+    assert get.call_count == 1
+
+
+def test_invalid_handshake_mode() -> None:
+    with pytest.raises(ValidationError, match="handshake"):
+        Client(handshake="sometimes")
+
+
+@pytest.mark.asyncio
+async def test_async_lazy_handshake_is_shared() -> None:
+    async def slow_get(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return MagicMock()
+
+    get = AsyncMock(side_effect=slow_get)
+    with patch("curl_cffi.requests.AsyncSession.get", get):
+        client = await AsyncClient(handshake="lazy")
+        assert get.call_count == 0
+
+        client.session.post = _async_echo_post()
+        await asyncio.gather(*(client.search(q) for q in ("a", "b", "c")))
+        await client.search("d")
+
+    assert get.call_count == 1
@@ -0,0 +1,232 @@
+"""Tests for single-flight coalescing of identical searches."""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from perplexity import Hooks, ResponseCache, RetryPolicy
+from perplexity.client import Client
+from perplexity.exceptions import NetworkError
+from perplexity_async.client import Client as AsyncClient
+
+END = b"event: end_of_stream\r\n\r\n"
+
+
+def _event(n: int) -> bytes:
+    return b"data: " + json.dumps({"status": "PENDING", "n": n}).encode() + b"\r\n\r\n"
+
+
+class _Upstream:
+    """Streamed response whose body chunks are pushed by the test."""
+
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self) -> None:
+        self.chunks: "queue.Queue" = queue.Queue()
+        self.quit_now = threading.Event()
+
+    def iter_content(self):
+        while not self.quit_now.is_set():
+            try:
+                chunk = self.chunks.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        pass
+
+
+def _wait_for(condition, timeout: float = 2.0) -> None:
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def sync_client():
+    upstream = _Upstream()
+    post = MagicMock(return_value=upstream)
+    hooks = Hooks()
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        yield Client(coalesce=True, hooks=hooks), upstream, post
+
+
+def test_identical_blocking_searches_share_one_request(sync_client) -> None:
+    client, upstream, post = sync_client
+    joined = []
+    client.hooks.on("coalesce", lambda event, data: joined.append(data["subscribers"]))
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(client.search, "Same question") for _ in range(3)]
+        _wait_for(lambda: len(joined) == 2)
+        upstream.chunks.put(_event(1) + _event(2) + END)
+        results = [future.result(timeout=2) for future in futures]
+
+    assert post.call_count == 1
+    assert [result["n"] for result in results] == [2, 2, 2]
+    assert sorted(joined) == [2, 3]
+    assert len(client._flights) == 0
+
+    # Incognito searches get their own request
+    upstream.quit_now.clear()
+    upstream.chunks.put(_event(3) + END)
+    assert client.search("Same question", incognito=True)["n"] == 3
+    assert post.call_count == 2
+
+
+def test_late_subscriber_starts_from_the_latest_snapshot(sync_client) -> None:
+    client, upstream, post = sync_client
+    first = client.search("q", stream=True)
+    upstream.chunks.put(_event(1))
+    assert next(first)["n"] == 1
+
+    second = client.search("q", stream=True)
+    upstream.chunks.put(_event(2))
+    upstream.chunks.put(_event(3) + END)
+
+    assert [snapshot["n"] for snapshot in first] == [2, 3]
+    assert [snapshot["n"] for snapshot in second] == [1, 2, 3]
+    assert post.call_count == 1
+
+
+def test_upstream_is_cancelled_when_the_last_subscriber_leaves(sync_client) -> None:
+    client, upstream, _ = sync_client
+    first = client.search("q", stream=True)
+    upstream.chunks.put(_event(1))
+    next(first)
+    second = client.search("q", stream=True)
+    next(second)
+
+    first.close()
+    assert not upstream.quit_now.is_set()
+    second.close()
+    assert upstream.quit_now.is_set()
+    assert len(client._flights) == 0
+
+
+def test_subscriber_deadline_does_not_end_the_flight(sync_client) -> None:
+    client, upstream, _ = sync_client
+    client.cache = ResponseCache()
+    leader = client.search("q", stream=True)
+    upstream.chunks.put(_event(1))
+    next(leader)
+
+    partial = client.search("q", deadline=0.05, partial_ok=True)
+    assert partial.partial and partial["n"] == 1
+
+    upstream.chunks.put(_event(2) + END)
+    assert [snapshot["n"] for snapshot in leader] == [2]
+    # The completed answer was cached for later searches
+    assert client.search("q")["n"] == 2
+
+
+def test_shared_stream_without_a_payload_is_not_cached(sync_client) -> None:
+    client, upstream, post = sync_client
+    client.cache = ResponseCache()
+    upstream.chunks.put(END)
+    client.search("q")
+    assert len(client.cache.backend) == 0
+
+    upstream.quit_now.clear()
+    upstream.chunks.put(_event(1) + END)
+    assert client.search("q")["n"] == 1
+    assert post.call_count == 2
+
+
+def test_request_errors_reach_every_subscriber() -> None:
+    gate = threading.Event()
+
+    def post(url, **kwargs):
+        gate.wait(2)
+        return MagicMock(status_code=503, headers={})
+
+    hooks = Hooks()
+    joined = []
+    hooks.on("coalesce", lambda event, data: joined.append(data))
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", MagicMock(side_effect=post)
+    ) as mock_post:
+        client = Client(coalesce=True, hooks=hooks, retry=RetryPolicy(max_attempts=1))
+        with ThreadPoolExecutor(2) as pool:
+            futures = [pool.submit(client.search, "q") for _ in range(2)]
+            _wait_for(lambda: len(joined) == 1)
+            gate.set()
+            for future in futures:
+                with pytest.raises(NetworkError):
+                    future.result(timeout=2)
+    assert mock_post.call_count == 1
+
+
+class _AsyncUpstream:
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self) -> None:
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.quit_now = MagicMock()
+        self.aclose = AsyncMock()
+
+    async def aiter_content(self):
+        while True:
+            chunk = await self.chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_async_searches_share_one_stream() -> None:
+    upstream = _AsyncUpstream()
+    with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+        client = await AsyncClient(coalesce=True)
+    client.session.post = AsyncMock(return_value=upstream)
+
+    blocking = [asyncio.ensure_future(client.search("q")) for _ in range(3)]
+    stream = await client.search("q", stream=True)
+    await asyncio.sleep(0.01)
+    upstream.chunks.put_nowait(_event(1))
+    assert (await stream.__anext__())["n"] == 1
+
+    late = await client.search("q", stream=True)
+    upstream.chunks.put_nowait(_event(2) + END)
+    results = await asyncio.gather(*blocking)
+
+    assert [snapshot["n"] async for snapshot in late] == [1, 2]
+    assert [snapshot["n"] async for snapshot in stream] == [2]
+    assert [result["n"] for result in results] == [2, 2, 2]
+    assert client.session.post.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_async_upstream_is_cancelled_with_its_last_subscriber() -> None:
+    upstream = _AsyncUpstream()
+    with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+        client = await AsyncClient(coalesce=True)
+    client.session.post = AsyncMock(return_value=upstream)
+
+    stream = await client.search("q", stream=True)
+    task = asyncio.ensure_future(client.search("q"))
+    await asyncio.sleep(0.01)
+    upstream.chunks.put_nowait(_event(1))
+    await stream.__anext__()
+
+    task.cancel()
+    await asyncio.sleep(0.01)
+    upstream.quit_now.set.assert_not_called()
+    await stream.aclose()
+    await asyncio.sleep(0.01)
+    upstream.quit_now.set.assert_called()
+    assert len(client._flights) == 0
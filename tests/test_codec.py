@@ -0,0 +1,44 @@
+"""Tests for the pluggable JSON codec."""
+
+import importlib.util
+
+import pytest
+
+from perplexity import codec
+from perplexity.exceptions import ValidationError
+
+AVAILABLE_BACKENDS = [
+    name for name in ("orjson", "msgspec") if importlib.util.find_spec(name) is not None
+] + ["json"]
+
+
+@pytest.fixture
+def restore_backend():
+    previous = codec.backend
+    yield
+    codec.set_backend(previous)
+
+
+@pytest.mark.parametrize("name", AVAILABLE_BACKENDS)
+def test_codec_round_trip(name: str, restore_backend) -> None:
+    assert codec.set_backend(name) == name
+    payload = {"query_str": "café", "params": {"sources": ["web"], "is_incognito": False}}
+
+    encoded = codec.dumpb(payload)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == payload
+    assert codec.loads(codec.dumps(payload)) == payload
+    assert codec.loads(memoryview(encoded)) == payload
+
+
+@pytest.mark.parametrize("name", AVAILABLE_BACKENDS)
+def test_codec_decode_error_type(name: str, restore_backend) -> None:
+    codec.set_backend(name)
+    with pytest.raises(codec.JSONDecodeError):
+        codec.loads(b"not json")
+
+
+def test_codec_rejects_unknown_backend(restore_backend) -> None:
+    with pytest.raises(ValidationError, match="Invalid JSON backend"):
+        codec.set_backend("simdjson-but-not-really")
+    assert codec.set_backend("auto") == AVAILABLE_BACKENDS[0]
@@ -0,0 +1,151 @@
+"""Tests for the adaptive (AIMD) concurrency controller."""
+
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from perplexity import AdaptiveConcurrency, Hooks, RetryPolicy
+from perplexity.client import Client
+from perplexity.exceptions import NetworkError, RateLimitError, ValidationError
+
+from tests.conftest import AsyncAnswer, FakeClock
+
+BODY = b'data: {"blocks": []}\r\n\r\nevent: end_of_stream\r\n\r\n'
+
+
+def _complete(controller: AdaptiveConcurrency, clock: FakeClock, latency: float, error=None):
+    started = controller.start()
+    clock.now += latency
+    controller.finish(started, error)
+
+
+def test_additive_increase_and_multiplicative_decrease(clock) -> None:
+    hooks = Hooks()
+    controller = AdaptiveConcurrency(initial=4, maximum=6, hooks=hooks, clock=clock)
+    assert hooks.metrics["concurrency_limit"] == 4
+
+    # About one step per round of `limit` healthy completions
+    for _ in range(5):
+        _complete(controller, clock, 1.0)
+    assert controller.limit == 5
+    for _ in range(20):
+        _complete(controller, clock, 1.0)
+    assert controller.limit == 6  # capped at the maximum
+
+    _complete(controller, clock, 1.0, RateLimitError())
+    assert controller.limit == 3
+    assert hooks.metrics["concurrency_limit"] == 3
+
+    # Other failures neither grow nor shrink the limit
+    _complete(controller, clock, 1.0, NetworkError(status_code=500))
+    assert controller.limit == 3
+
+
+def test_burst_of_429s_counts_once(clock) -> None:
+    controller = AdaptiveConcurrency(initial=8, clock=clock)
+    started = [controller.start() for _ in range(4)]
+    clock.now += 1
+    for start in started:
+        controller.finish(start, RateLimitError())
+    assert controller.limit == 4
+
+    # A search started after the cut can cut again
+    _complete(controller, clock, 1.0, RateLimitError())
+    assert controller.limit == 2
+
+
+def test_latency_spike_cuts_the_limit(clock) -> None:
+    controller = AdaptiveConcurrency(initial=8, maximum=8, clock=clock)
+    for _ in range(5):
+        _complete(controller, clock, 1.0)
+    assert controller.limit == 8
+
+    _complete(controller, clock, 10.0)
+    assert controller.limit == 4
+
+
+def test_validation() -> None:
+    with pytest.raises(ValidationError):
+        AdaptiveConcurrency(initial=10, maximum=5)
+    with pytest.raises(ValidationError):
+        AdaptiveConcurrency(backoff=1.5)
+
+
+def test_slot_blocks_threads_beyond_the_limit() -> None:
+    controller = AdaptiveConcurrency(initial=2, minimum=1, maximum=2)
+    peak = []
+    lock = threading.Lock()
+
+    def work() -> None:
+        with controller.slot():
+            with lock:
+                peak.append(controller.in_flight)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+    assert controller.in_flight == 0
+
+
+def test_sync_search_many_with_controller() -> None:
+    def post(url, **kwargs):
+        resp = MagicMock(status_code=200, headers={})
+        resp.iter_content.return_value = [BODY]
+        return resp
+
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", side_effect=post
+    ):
+        client = Client()
+        # Mocked searches take microseconds, so jitter would look like latency spikes
+        controller = AdaptiveConcurrency(initial=2, maximum=4, latency_factor=1e6)
+        results = list(client.search_many([f"q{i}" for i in range(8)], max_workers=controller))
+
+    assert len(results) == 8
+    assert controller.limit > 2
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_async_window_follows_the_controller(async_client) -> None:
+    stats = {"in_flight": 0, "peak": 0}
+
+    async def post(url, **kwargs):
+        query = json.loads(kwargs["data"])["query_str"]
+        stats["in_flight"] += 1
+        stats["peak"] = max(stats["peak"], stats["in_flight"])
+        await asyncio.sleep(0.01)
+        stats["in_flight"] -= 1
+        return AsyncAnswer(BODY, status_code=429 if query == "q5" else 200)
+
+    client = await async_client(post)
+    hooks = Hooks()
+    limits = []
+    hooks.on("metric", lambda event, data: limits.append(data["value"]))
+    controller = AdaptiveConcurrency(initial=2, maximum=8, latency_factor=1e6, hooks=hooks)
+
+    results = [
+        pair
+        async for pair in client.search_many(
+            (f"q{i}" for i in range(30)),
+            concurrency=controller,
+            return_exceptions=True,
+            retry=RetryPolicy(max_attempts=1),
+        )
+    ]
+
+    assert len(results) == 30
+    assert isinstance(dict(results)["q5"], RateLimitError)
+    assert stats["peak"] > 2
+    # Grew, was cut by the 429, and grew again
+    assert limits[0] == 2 and max(limits) > 2
+    assert any(later < earlier for earlier, later in zip(limits, limits[1:]))
+    assert controller.in_flight == 0
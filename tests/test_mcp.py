@@ -2,9 +2,15 @@
 
 from unittest.mock import MagicMock, patch
 
+import pytest
+
+from perplexity.cache import DiskCache, MemoryCache
+from perplexity import Hooks, mcp
 from perplexity.mcp import (
     _extract_answer,
     _get_client,
+    _get_concurrency,
+    _make_cache,
     perplexity_ask,
     perplexity_reason,
     perplexity_research,
@@ -55,3 +61,37 @@ def test_mcp_tool_handles_exceptions_gracefully() -> None:
 
         result = perplexity_ask("test query")
         assert "Error executing query" in result
+
+
+def test_make_cache_from_environment(monkeypatch, tmp_path) -> None:
+    monkeypatch.delenv("MCP_CACHE", raising=False)
+    assert _make_cache() is None
+
+    monkeypatch.setenv("MCP_CACHE", "memory")
+    assert isinstance(_make_cache().backend, MemoryCache)
+
+    monkeypatch.setenv("MCP_CACHE", "disk")
+    monkeypatch.setenv("MCP_CACHE_PATH", str(tmp_path / "mcp.sqlite3"))
+    cache = _make_cache()
+    assert isinstance(cache.backend, DiskCache)
+    assert cache.backend.path == str(tmp_path / "mcp.sqlite3")
+
+    monkeypatch.setenv("MCP_CACHE", "bogus")
+    assert _make_cache() is None
+
+
+@pytest.mark.parametrize(
+    "value, maximum, initial", [(None, 16, 4), ("2", 2, 2), ("0", 16, 4), ("lots", 16, 4)]
+)
+def test_concurrency_limit_from_environment(monkeypatch, value, maximum, initial) -> None:
+    if value is None:
+        monkeypatch.delenv("MCP_MAX_CONCURRENCY", raising=False)
+    else:
+        monkeypatch.setenv("MCP_MAX_CONCURRENCY", value)
+    monkeypatch.setattr(mcp, "concurrency", None)
+    monkeypatch.setattr(mcp, "client", MagicMock(hooks=Hooks()))
+
+    limiter = _get_concurrency()
+    assert (limiter.maximum, limiter.limit) == (maximum, initial)
+    assert _get_concurrency() is limiter
+    assert mcp.client.hooks.metrics["concurrency_limit"] == initial
@@ -0,0 +1,136 @@
+"""Tests for the sans-IO search protocol core (no network, no transport)."""
+
+import json
+
+import pytest
+
+from perplexity import codec
+from perplexity.config import ENDPOINT_SSE_ASK, ENDPOINT_UPLOAD_URL
+from perplexity.exceptions import (
+    AuthenticationError,
+    FileUploadError,
+    NetworkError,
+    RateLimitError,
+    ValidationError,
+)
+from perplexity.protocol import ResponseParser, SearchProtocol, check_search_status
+from perplexity.result import SearchResult
+
+
+def _body(*answers: str) -> bytes:
+    frames = []
+    for answer in answers:
+        payload = {"blocks": [{"intended_usage": "ask_text", "markdown_block": {"answer": answer}}]}
+        frames.append(f"event: message\r\ndata: {json.dumps(payload)}\r\n\r\n")
+    frames.append("event: end_of_stream\r\ndata: {}\r\n\r\n")
+    return "".join(frames).encode("utf-8")
+
+
+def test_search_request_payload() -> None:
+    follow_up = SearchResult({"backend_uuid": "prev", "attachments": ["https://old"]})
+    protocol = SearchProtocol(
+        "What is Python?", mode="pro", model="sonar", follow_up=follow_up, own_account=True
+    )
+    request = protocol.search_request(["https://new"])
+
+    assert request.method == "POST"
+    assert request.url == ENDPOINT_SSE_ASK
+    params = codec.loads(request.data)["params"]
+    assert params["attachments"] == ["https://new", "https://old"]
+    assert params["last_backend_uuid"] == "prev"
+    assert params["mode"] == "copilot"
+    assert params["model_preference"] == "experimental"
+
+
+def test_protocol_validation_and_quota() -> None:
+    with pytest.raises(ValidationError, match="Invalid mode"):
+        SearchProtocol("q", mode="bogus")
+    with pytest.raises(ValidationError, match="Invalid stream mode"):
+        SearchProtocol("q", stream="bogus")
+
+    protocol = SearchProtocol("q", mode="pro", files={"a.txt": b"abc"})
+    assert protocol.reserve_quota(5, 10) == (4, 9)
+    assert protocol.reserve_quota(float("inf"), float("inf")) == (float("inf"), float("inf"))
+    with pytest.raises(ValidationError, match="No remaining enhanced queries"):
+        protocol.reserve_quota(0, 10)
+
+
+def test_upload_flow() -> None:
+    protocol = SearchProtocol("q", files={"notes.txt": "héllo"})
+    (upload,) = protocol.uploads
+    assert upload.content_type == "text/plain"
+    assert upload.size == len("héllo".encode("utf-8"))
+
+    request = protocol.upload_url_request(upload)
+    assert request.url == ENDPOINT_UPLOAD_URL
+    assert codec.loads(request.data)["filename"] == "notes.txt"
+
+    with pytest.raises(FileUploadError, match="Failed to get upload URL"):
+        protocol.parse_upload_info(500, b"")
+
+    info = protocol.parse_upload_info(
+        200,
+        b'{"s3_bucket_url": "https://bucket", "s3_object_url": "https://obj", "fields": {"k": "v"}}',
+    )
+    storage_request = protocol.upload_request(upload, info)
+    assert storage_request.url == "https://bucket"
+    assert storage_request.multipart.fields == {"k": "v"}
+
+    assert protocol.uploaded_url(info, 204, b"") == "https://obj"
+    with pytest.raises(FileUploadError, match="File upload to storage failed"):
+        protocol.uploaded_url(info, 403, b"")
+
+    image_info = {"s3_object_url": "https://cdn/image/upload/x.png"}
+    secure = b'{"secure_url": "https://cdn/private/s--abc--/v12/user_uploads/x.png"}'
+    assert (
+        protocol.uploaded_url(image_info, 200, secure) == "https://cdn/private/user_uploads/x.png"
+    )
+
+
+@pytest.mark.parametrize(
+    "status,exc",
+    [
+        (429, RateLimitError),
+        (401, AuthenticationError),
+        (403, AuthenticationError),
+        (502, NetworkError),
+    ],
+)
+def test_check_search_status(status: int, exc: type) -> None:
+    with pytest.raises(exc):
+        check_search_status(status)
+    check_search_status(200)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 4096])
+def test_response_parser_modes(chunk_size: int) -> None:
+    body = _body("Hel", "Hello")
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    outputs = {}
+    for stream in (False, True, "delta"):
+        parser = ResponseParser(stream)
+        items = []
+        for chunk in chunks:
+            items.extend(parser.feed(chunk))
+        assert parser.done
+        outputs[stream] = (items, parser.result())
+
+    items, final = outputs[False]
+    assert items == []
+    assert final["blocks"][0]["markdown_block"]["answer"] == "Hello"
+
+    items, _ = outputs[True]
+    assert [i["blocks"][0]["markdown_block"]["answer"] for i in items] == ["Hel", "Hello"]
+
+    items, _ = outputs["delta"]
+    assert [i["answer"] for i in items] == ["Hel", "lo"]
+
+
+def test_response_parser_close_flushes_unterminated_event() -> None:
+    parser = ResponseParser(stream=True)
+    assert parser.feed(b'data: {"answer": "x"}') == []
+    (snapshot,) = parser.close()
+    assert snapshot["answer"] == "x"
+    assert parser.done
+    assert parser.feed(b'data: {"answer": "y"}\n\n') == []
@@ -0,0 +1,129 @@
+"""Tests for the token-bucket rate limiter."""
+
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from perplexity import Hooks, RateLimiter
+from perplexity.client import Client
+from perplexity.exceptions import RequestTimeoutError, ValidationError
+from perplexity.ratelimit import TokenBucket
+from perplexity_async.client import Client as AsyncClient
+
+BODY = b'data: {"blocks": []}\r\n\r\nevent: end_of_stream\r\n\r\n'
+
+
+def test_bucket_bursts_then_queues_reservations(clock) -> None:
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    # Reservations on credit are served in order, half a second apart
+    assert [bucket.reserve() for _ in range(2)] == [0.5, 1.0]
+    assert bucket.reserve(max_wait=1) is None
+    assert bucket.available == -2
+
+    clock.now += 10
+    assert bucket.available == 3  # never refills beyond the burst
+    bucket.refund()
+    assert bucket.available == 3
+
+    with pytest.raises(ValidationError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValidationError):
+        bucket.reserve(tokens=4)
+
+
+def test_limiter_buckets_per_mode() -> None:
+    limiter = RateLimiter({"auto": (1, 1), "enhanced": (1, 1), "deep research": (1, 1)})
+    assert limiter.bucket_for("auto") == "auto"
+    assert limiter.bucket_for("pro") == "enhanced"
+    assert limiter.bucket_for("reasoning") == "enhanced"
+    assert limiter.bucket_for("deep research") == "deep research"
+    assert RateLimiter({"*": (1, 1)}).bucket_for("pro") == "*"
+    assert RateLimiter({"auto": (1, 1)}).bucket_for("pro") is None
+
+
+def test_limiter_is_shared_between_threads() -> None:
+    limiter = RateLimiter({"auto": (50, 2)})
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.acquire, args=("auto",)) for _ in range(7)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 2 from the burst, then 5 more at 50 per second
+    assert 0.09 <= time.monotonic() - start < 0.5
+    assert limiter.buckets["auto"].available < 1
+
+
+def _sync_client(limiter: RateLimiter, hooks: Hooks) -> tuple:
+    resp = MagicMock(status_code=200, headers={})
+    resp.iter_content.side_effect = lambda: iter([BODY])
+    post = MagicMock(return_value=resp)
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)):
+        client = Client(rate_limiter=limiter, hooks=hooks)
+    return client, post
+
+
+def test_client_throttles_ask_requests() -> None:
+    hooks = Hooks()
+    events = []
+    hooks.on("throttle", lambda event, data: events.append(data))
+    limiter = RateLimiter({"auto": (20, 1)})
+    client, post = _sync_client(limiter, hooks)
+
+    with patch("curl_cffi.requests.Session.post", post):
+        client.search("first")
+        client.search("second")
+        # The next token is further away than the deadline allows
+        limiter.buckets["auto"].reserve()
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            client.search("third", deadline=0.01)
+
+    assert exc_info.value.phase == "deadline"
+    assert post.call_count == 2
+    assert len(events) == 1
+    assert events[0]["bucket"] == "auto"
+    assert events[0]["wait"] == pytest.approx(0.05, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_async_acquire_does_not_block_and_refunds_on_cancel() -> None:
+    limiter = RateLimiter({"enhanced": (1, 1)})
+    await limiter.aacquire("pro")
+
+    waiter = asyncio.ensure_future(limiter.aacquire("pro"))
+    await asyncio.sleep(0.05)  # the loop keeps running while the waiter sleeps
+    assert not waiter.done()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.buckets["enhanced"].available == pytest.approx(0.05, abs=0.03)
+
+
+@pytest.mark.asyncio
+async def test_async_clients_share_a_limiter() -> None:
+    limiter = RateLimiter({"auto": (20, 1)})
+
+    class _Answer:
+        status_code = 200
+        headers: dict = {}
+        aclose = AsyncMock()
+
+        async def aiter_content(self):
+            yield BODY
+
+    clients = []
+    for _ in range(2):
+        with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+            client = await AsyncClient(rate_limiter=limiter)
+        client.session.post = AsyncMock(side_effect=lambda *a, **k: _Answer())
+        clients.append(client)
+
+    start = time.monotonic()
+    await asyncio.gather(*(client.search(f"q{i}") for i, client in enumerate(clients * 2)))
+    assert time.monotonic() - start >= 0.14
@@ -0,0 +1,96 @@
+"""Tests for the lazy SearchResult container."""
+
+import json
+import logging
+from unittest.mock import patch
+
+from perplexity import codec
+from perplexity.mcp import _extract_answer
+from perplexity.result import SearchResult
+from perplexity.utils import parse_nested_json_response
+
+
+def _payload() -> dict:
+    final_answer = json.dumps(
+        {"answer": "42", "chunks": ["4", "2"], "web_results": [{"url": "https://a"}]}
+    )
+    steps = [
+        {"step_type": "SEARCH", "content": {}},
+        {"step_type": "FINAL", "content": {"answer": final_answer}},
+    ]
+    return {
+        "backend_uuid": "uuid-1",
+        "text": json.dumps(steps),
+        "blocks": [{"intended_usage": "ask_text", "markdown_block": {"answer": "42"}}],
+    }
+
+
+def test_search_result_matches_nested_parser() -> None:
+    raw = json.dumps(_payload()).encode("utf-8")
+    result = SearchResult(raw)
+
+    assert result["answer"] == "42"
+    assert result.get("chunks") == ["4", "2"]
+    assert [s["step_type"] for s in result["text"]] == ["SEARCH", "FINAL"]
+    assert result.steps == result["text"]
+    assert result.web_results == [{"url": "https://a"}]
+    assert result["backend_uuid"] == "uuid-1"
+    assert result.get("missing", "default") == "default"
+
+    expected = parse_nested_json_response(_payload())
+    materialised = result.to_dict()
+    for key, value in expected.items():
+        assert materialised[key] == value
+
+
+def test_search_result_is_a_dict() -> None:
+    result = SearchResult(json.dumps(_payload()).encode("utf-8"))
+    assert isinstance(result, dict)
+    assert result.answer == "42"
+
+    assert json.loads(json.dumps(result)) == result.to_dict()
+    assert result == SearchResult(json.dumps(_payload())) == dict(result)
+    assert json.dumps(SearchResult()) == "{}"
+
+    result["answer"] = "forty-two"
+    result["note"] = "edited"
+    assert result.answer == "forty-two"
+    assert result["note"] == "edited" and "note" in result
+    assert result.pop("backend_uuid") == "uuid-1"
+    assert "backend_uuid" not in result.to_dict()
+
+
+def test_search_result_decodes_lazily_and_memoises() -> None:
+    result = SearchResult(json.dumps(_payload()).encode("utf-8"))
+
+    with patch("perplexity.result.codec.loads", wraps=codec.loads) as mock_loads:
+        assert result["backend_uuid"] == "uuid-1"
+        assert mock_loads.call_count == 1  # outer payload only
+
+        assert result.answer == "42"
+        assert mock_loads.call_count == 3  # step list and FINAL answer
+
+        assert result["chunks"] == ["4", "2"]
+        assert result.answer == "42"
+        assert mock_loads.call_count == 3
+
+
+def test_search_result_empty_and_invalid_payloads() -> None:
+    assert dict(SearchResult()) == {}
+    assert SearchResult().answer == ""
+    assert len(SearchResult(b"not json")) == 0
+    assert "answer" not in SearchResult({"text": "not valid json"})
+    assert SearchResult({"text": "not valid json"})["text"] == "not valid json"
+
+
+def test_empty_result_is_not_decoded(caplog) -> None:
+    with caplog.at_level(logging.DEBUG):
+        result = SearchResult()
+        assert result.answer == "" and result.to_dict() == {}
+    assert caplog.records == []
+
+
+def test_search_result_works_with_mcp_extraction() -> None:
+    result = SearchResult(json.dumps(_payload()))
+    assert _extract_answer(result) == "42"
+    assert not hasattr(result, "__dict__")
@@ -0,0 +1,161 @@
+"""Tests for the retry policy and its integration in both clients."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from curl_cffi.const import CurlECode
+from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError
+
+from perplexity import Hooks, RetryPolicy
+from perplexity.client import Client
+from perplexity.exceptions import (
+    AuthenticationError,
+    NetworkError,
+    RateLimitError,
+    RequestTimeoutError,
+    ValidationError,
+)
+from perplexity.protocol import check_search_status, parse_retry_after
+from perplexity_async.client import Client as AsyncClient
+
+BODY = b'data: {"blocks": []}\r\n\r\nevent: end_of_stream\r\n\r\n'
+
+
+def test_retryable_errors() -> None:
+    retryable = RetryPolicy.retryable
+    assert retryable(RateLimitError())
+    assert retryable(NetworkError(status_code=503))
+    assert retryable(CurlConnectionError("refused", CurlECode.COULDNT_CONNECT))
+    assert retryable(RequestTimeoutError("slow", phase="connect"))
+
+    assert not retryable(NetworkError(status_code=404))
+    assert not retryable(AuthenticationError())
+    assert not retryable(RequestTimeoutError("slow", phase="first_event"))
+    assert not retryable(RequestTimeoutError("late", phase="deadline"))
+    assert not retryable(ValueError())
+    assert not retryable(CurlConnectionError("reset", CurlECode.RECV_ERROR))
+    assert not retryable(CurlConnectionError("empty reply", CurlECode.GOT_NOTHING))
+
+
+def test_full_jitter_backoff_and_retry_after() -> None:
+    policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=3, rand=lambda: 0.5)
+    error = NetworkError(status_code=502)
+    assert [policy.next_delay(n, error) for n in range(1, 6)] == [0.5, 1.0, 1.5, 1.5, None]
+
+    assert policy.next_delay(1, RateLimitError(retry_after=2)) == 2
+    # The server asks for longer than we are willing to wait
+    assert policy.next_delay(1, RateLimitError(retry_after=60)) is None
+    # Not enough time left before the deadline
+    assert policy.next_delay(1, RateLimitError(retry_after=2), remaining=1) is None
+
+    with pytest.raises(ValidationError):
+        RetryPolicy(max_attempts=0)
+
+
+def test_retry_after_header() -> None:
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == 10
+    assert parse_retry_after("soon") is None
+
+    with pytest.raises(RateLimitError) as exc_info:
+        check_search_status(429, {"retry-after": "3"})
+    assert exc_info.value.retry_after == 3
+    with pytest.raises(NetworkError) as exc_info:
+        check_search_status(503, {})
+    assert exc_info.value.status_code == 503
+
+
+def _response(status: int, retry_after: str = "") -> MagicMock:
+    resp = MagicMock(status_code=status, headers={"retry-after": retry_after})
+    resp.iter_content.return_value = [BODY]
+    return resp
+
+
+def test_search_retries_rate_limits() -> None:
+    hooks = Hooks()
+    events = []
+    hooks.on("retry", lambda event, data: events.append(data))
+    post = MagicMock(side_effect=[_response(429, "0"), _response(503), _response(200)])
+
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        policy = RetryPolicy(base_delay=0.01)
+        result = Client(retry=policy, hooks=hooks).search("busy")
+
+    assert result.partial is False
+    assert post.call_count == 3
+    assert [e["attempt"] for e in events] == [1, 2]
+    assert events[0]["delay"] == 0
+    assert isinstance(events[1]["error"], NetworkError)
+    assert events[0]["endpoint"].endswith("/rest/sse/perplexity_ask")
+
+
+def test_search_does_not_retry_client_errors() -> None:
+    post = MagicMock(return_value=_response(403))
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        cli = Client(retry=RetryPolicy(base_delay=0))
+        with pytest.raises(AuthenticationError):
+            cli.search("forbidden")
+        assert post.call_count == 1
+
+        post.return_value = _response(429)
+        with pytest.raises(RateLimitError):
+            cli.search("limited", retry=RetryPolicy(max_attempts=1))
+        assert post.call_count == 2
+
+
+def test_search_is_not_retried_by_default() -> None:
+    post = MagicMock(return_value=_response(503))
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        with pytest.raises(NetworkError):
+            Client().search("unavailable")
+        assert post.call_count == 1
+
+
+def test_failing_hook_does_not_break_search() -> None:
+    hooks = Hooks()
+    hooks.on("*", MagicMock(side_effect=RuntimeError("broken hook")))
+    post = MagicMock(side_effect=[_response(500), _response(200)])
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", post
+    ):
+        Client(retry=RetryPolicy(base_delay=0), hooks=hooks).search("q")
+    assert post.call_count == 2
+
+
+class _AsyncResponse:
+    def __init__(self, status: int) -> None:
+        self.status_code = status
+        self.headers = {}
+        self.aclose = AsyncMock()
+
+    async def aiter_content(self):
+        yield BODY
+
+
+@pytest.mark.asyncio
+async def test_async_search_retries_without_blocking_the_loop() -> None:
+    with patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())):
+        client = await AsyncClient(retry=RetryPolicy(base_delay=0.2, rand=lambda: 1.0))
+    client.session.post = AsyncMock(side_effect=[_AsyncResponse(502), _AsyncResponse(200)])
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.ensure_future(ticker())
+    await client.search("flaky")
+    task.cancel()
+
+    assert client.session.post.await_count == 2
+    assert ticks >= 10
@@ -0,0 +1,67 @@
+"""Tests for the byte-level SSE framer."""
+
+import pytest
+
+from perplexity.sse import SSEDecoder, aiter_events, iter_events
+
+
+def _collect(chunks):
+    return [
+        (e.event, bytes(e.data) if e.data is not None else None, e.id) for e in iter_events(chunks)
+    ]
+
+
+def test_sse_decoder_handles_all_line_endings() -> None:
+    for newline in (b"\r\n", b"\n", b"\r"):
+        body = newline.join([b"event: message", b"data: {}", b"", b"data: [1]", b"", b""])
+        assert _collect([body]) == [("message", b"{}", None), ("message", b"[1]", None)]
+
+
+def test_sse_decoder_reassembles_split_frames() -> None:
+    body = b'event: message\r\ndata: {"a": 1}\r\n\r\nevent: end_of_stream\r\n\r\n'
+    expected = [("message", b'{"a": 1}', None), ("end_of_stream", None, None)]
+
+    for size in range(1, len(body) + 1):
+        chunks = [body[i : i + size] for i in range(0, len(body), size)]
+        assert _collect(chunks) == expected, f"chunk size {size}"
+
+
+def test_sse_decoder_spec_fields() -> None:
+    body = (
+        b": keep-alive comment\n"
+        b"id: 7\n"
+        b"event: update\n"
+        b"data: first\n"
+        b"data:second\n"
+        b"retry: 1000\n"
+        b"\n"
+        b"data\n"
+        b"\n"
+    )
+    assert _collect([body]) == [("update", b"first\nsecond", "7"), ("message", b"", "7")]
+
+
+def test_sse_decoder_data_is_zero_copy_view() -> None:
+    chunk = b'data: {"answer": "x"}\n\n'
+    (event,) = SSEDecoder().feed(chunk)
+    assert isinstance(event.data, memoryview)
+    assert event.data.obj is chunk
+    assert bytes(event.data) == b'{"answer": "x"}'
+
+
+def test_sse_decoder_flushes_unterminated_event() -> None:
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: tail") == []
+    (event,) = decoder.flush()
+    assert bytes(event.data) == b"tail"
+    assert decoder.flush() == []
+
+
+@pytest.mark.asyncio
+async def test_aiter_events() -> None:
+    async def chunks():
+        for piece in (b"data: a\r", b"\n\r\ndata: b\r\n\r\n"):
+            yield piece
+
+    events = [bytes(e.data) async for e in aiter_events(chunks())]
+    assert events == [b"a", b"b"]
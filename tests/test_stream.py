@@ -0,0 +1,528 @@
+"""Tests for incremental (delta) streaming of search responses."""
+
+import asyncio
+import gc
+import json
+import threading
+import time
+import tracemalloc
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from perplexity import codec
+from perplexity.client import Client
+from perplexity.exceptions import ValidationError
+from perplexity.protocol import ResponseParser
+from perplexity.sse import iter_events
+from perplexity.stream import AsyncConflatingIterator, DeltaAccumulator, FinalSnapshot
+from perplexity_async.client import Client as AsyncClient
+
+
+def _ask_event(answer: str, steps=None, web_results=None) -> dict:
+    blocks = [{"intended_usage": "ask_text", "markdown_block": {"answer": answer}}]
+    if web_results:
+        blocks.append(
+            {"intended_usage": "web_results", "web_result_block": {"web_results": web_results}}
+        )
+    event = {"backend_uuid": "uuid-1", "blocks": blocks}
+    if steps is not None:
+        event["text"] = json.dumps(steps)
+    return event
+
+
+def test_delta_accumulator_yields_only_new_text() -> None:
+    acc = DeltaAccumulator()
+
+    first = acc.feed(_ask_event("Python", steps=[{"step_type": "SEARCH", "content": {}}]))
+    assert first["answer"] == "Python"
+    assert [s["step_type"] for s in first["steps"]] == ["SEARCH"]
+    assert first["backend_uuid"] == "uuid-1"
+
+    second = acc.feed(_ask_event("Python is", steps=[{"step_type": "SEARCH", "content": {}}]))
+    assert second["answer"] == " is"
+    assert second["steps"] == []
+
+    # An identical snapshot carries nothing new
+    assert acc.feed(_ask_event("Python is")) is None
+    assert acc.answer == "Python is"
+
+
+def test_delta_accumulator_final_step_and_citations() -> None:
+    acc = DeltaAccumulator()
+    acc.feed(_ask_event("Python", web_results=[{"url": "https://a"}]))
+
+    final_answer = json.dumps(
+        {
+            "answer": "Python is a language",
+            "web_results": [{"url": "https://a"}, {"url": "https://b"}],
+        }
+    )
+    steps = [
+        {"step_type": "SEARCH", "content": {}},
+        {"step_type": "FINAL", "content": {"answer": final_answer}},
+    ]
+    delta = acc.feed({"text": json.dumps(steps)})
+
+    assert delta["final"] is True
+    assert delta["answer"] == " is a language"
+    assert [r["url"] for r in delta["web_results"]] == ["https://b"]
+    assert [r["url"] for r in acc.web_results] == ["https://a", "https://b"]
+
+
+def test_delta_accumulator_incremental_chunks() -> None:
+    acc = DeltaAccumulator()
+    block = {
+        "intended_usage": "ask_text",
+        "markdown_block": {"chunks": ["a", "b"], "chunk_starting_offset": 0},
+    }
+    assert acc.feed({"blocks": [block]})["answer"] == "ab"
+
+    block["markdown_block"] = {"chunks": ["c"], "chunk_starting_offset": 2}
+    assert acc.feed({"blocks": [block]})["answer"] == "c"
+    assert acc.answer == "abc"
+
+
+# About 80 characters of answer per event, with characters that need escaping
+_ANSWER_CHUNK = 'Python is "readable" \\ and ü-friendly.\n' * 2
+
+
+def _step_snapshots(count: int) -> list:
+    """Raw payloads of a stream whose answer and step list grow on every event."""
+    steps, payloads = [], []
+    for i in range(count):
+        steps.append({"step_type": "SEARCH", "content": {"query": f'say "hi" \\ {i:04d} ü\n'}})
+        event = _ask_event(_ANSWER_CHUNK * (i + 1), steps=steps)
+        event["status"] = "PENDING"
+        payloads.append(json.dumps(event).encode("utf-8"))
+    return payloads
+
+
+def test_delta_accumulator_feed_raw_matches_feed() -> None:
+    payloads = _step_snapshots(20)
+    # A rewritten answer and step list, an event without steps and an unchanged one
+    rewritten = _ask_event("Rewritten " + _ANSWER_CHUNK * 12, steps=[{"step_type": "OTHER"}])
+    payloads.insert(10, json.dumps(rewritten).encode())
+    payloads.insert(15, json.dumps(_ask_event(_ANSWER_CHUNK * 15)).encode())
+    payloads.append(payloads[-1])
+    final_answer = json.dumps(
+        {"answer": _ANSWER_CHUNK * 20 + " done", "web_results": [{"url": "u"}]}
+    )
+    steps = json.loads(json.loads(payloads[-1])["text"])
+    steps.append({"step_type": "FINAL", "content": {"answer": final_answer}})
+    payloads.append(json.dumps({"text": json.dumps(steps), "status": "COMPLETED"}).encode())
+
+    raw, decoded = DeltaAccumulator(), DeltaAccumulator()
+    for payload in payloads:
+        assert raw.feed_raw(memoryview(payload)) == decoded.feed(json.loads(payload))
+
+    assert raw.steps == decoded.steps
+    assert raw.answer == decoded.answer == _ANSWER_CHUNK * 20 + " done"
+    assert raw.final is True
+
+
+def test_delta_accumulator_per_event_decoding_stays_flat() -> None:
+    decoded = []
+    real_loads = codec.loads
+
+    def spy(data):
+        decoded.append(len(data))
+        return real_loads(data)
+
+    acc = DeltaAccumulator()
+    payloads = _step_snapshots(400)
+    with patch("perplexity.stream.codec.loads", side_effect=spy):
+        per_event = []
+        for payload in payloads:
+            decoded.clear()
+            acc.feed_raw(payload)
+            per_event.append(sum(decoded))
+
+    assert len(acc.steps) == 400
+    assert acc.answer == _ANSWER_CHUNK * 400
+    # Payloads grow with the answer, but every event decodes the same number of bytes
+    assert len(payloads[-1]) > 200 * len(payloads[0])
+    assert max(per_event[1:]) == min(per_event[1:])
+
+
+def test_client_search_delta_stream() -> None:
+    with patch("curl_cffi.requests.Session.get") as mock_get, patch(
+        "curl_cffi.requests.Session.post"
+    ) as mock_post:
+        mock_get.return_value = MagicMock(ok=True)
+
+        mock_resp = MagicMock(status_code=200)
+        body = (
+            f"event: message\r\ndata: {json.dumps(_ask_event('Hel'))}\r\n\r\n"
+            f"event: message\r\ndata: {json.dumps(_ask_event('Hello'))}\r\n\r\n"
+            "event: end_of_stream\r\ndata: {}\r\n\r\n"
+        ).encode("utf-8")
+        # Deliver the body in small pieces so events straddle chunk boundaries
+        mock_resp.iter_content.return_value = [body[i : i + 7] for i in range(0, len(body), 7)]
+        mock_post.return_value = mock_resp
+
+        cli = Client()
+        deltas = list(cli.search("greeting", stream="delta"))
+        assert "".join(d["answer"] for d in deltas) == "Hello"
+        assert [d["answer"] for d in deltas] == ["Hel", "lo"]
+
+        with pytest.raises(ValidationError, match="Invalid stream mode"):
+            cli.search("greeting", stream="bogus")
+
+
+def test_final_snapshot_keeps_only_last_event() -> None:
+    snapshot = FinalSnapshot()
+    assert snapshot.decode() == {}
+
+    body = (
+        f"event: message\r\ndata: {json.dumps(_ask_event('Hel'))}\r\n\r\n"
+        f"event: message\r\ndata: {json.dumps(_ask_event('Hello'))}\r\n\r\n"
+        "event: end_of_stream\r\ndata: {}\r\n\r\n"
+    ).encode("utf-8")
+    events = list(iter_events([body]))
+
+    with patch("perplexity.result.codec.loads", wraps=codec.loads) as mock_loads:
+        assert snapshot.feed(events[0]) is False
+        assert snapshot.feed(events[1]) is False
+        assert snapshot.feed(events[2]) is True
+        assert mock_loads.call_count == 0
+
+        result = snapshot.decode()
+        assert isinstance(result.raw, bytes)
+        assert result["blocks"][0]["markdown_block"]["answer"] == "Hello"
+        assert mock_loads.call_count == 1
+
+
+def _growing_body(events: int, step: int):
+    """Lazily produce a cumulative SSE stream, one event per chunk."""
+    for i in range(1, events + 1):
+        payload = {
+            "blocks": [
+                {"intended_usage": "ask_text", "markdown_block": {"answer": "x" * (step * i)}}
+            ]
+        }
+        yield f"event: message\r\ndata: {json.dumps(payload)}\r\n\r\n".encode("utf-8")
+    yield b"event: end_of_stream\r\n\r\n"
+
+
+def _streamed_peak(retain: str, events: int, step: int) -> int:
+    with patch("curl_cffi.requests.Session.get") as mock_get, patch(
+        "curl_cffi.requests.Session.post"
+    ) as mock_post:
+        mock_get.return_value = MagicMock(ok=True)
+        mock_resp = MagicMock(status_code=200)
+        mock_resp.iter_content.side_effect = lambda: _growing_body(events, step)
+        mock_post.return_value = mock_resp
+
+        cli = Client()
+        tracemalloc.start()
+        try:
+            stream = cli.search("long answer", stream=True, retain=retain)
+            count = 0
+            for _ in stream:
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert count == events
+        assert len(stream.retained) == {"none": 0, "last": 1, "all": events}[retain]
+        return peak
+
+
+def test_streamed_search_memory_is_bounded_by_final_answer() -> None:
+    events, step = 200, 2000
+    final_answer_size = events * step
+
+    peak_last = _streamed_peak("last", events, step)
+    peak_none = _streamed_peak("none", events, step)
+    peak_all = _streamed_peak("all", events, step)
+
+    # One cumulative snapshot in flight plus the one retained: O(final answer)
+    assert peak_last < 8 * final_answer_size
+    assert peak_none < 8 * final_answer_size
+    # Keeping everything is O(events * final answer)
+    assert peak_all > 30 * final_answer_size
+
+
+def test_search_rejects_unknown_retention_policy() -> None:
+    with patch("curl_cffi.requests.Session.get") as mock_get:
+        mock_get.return_value = MagicMock(ok=True)
+        with pytest.raises(ValidationError, match="Invalid retention policy"):
+            Client().search("q", stream=True, retain="forever")
+
+
+def test_latest_stream_drops_snapshots_for_slow_consumer() -> None:
+    body = b"".join(_growing_body(50, 10))
+    chunks = [body[i : i + 64] for i in range(0, len(body), 64)]
+
+    with patch("curl_cffi.requests.Session.get") as mock_get, patch(
+        "curl_cffi.requests.Session.post"
+    ) as mock_post:
+        mock_get.return_value = MagicMock(ok=True)
+        mock_resp = MagicMock(status_code=200)
+        mock_resp.iter_content.return_value = chunks
+        mock_post.return_value = mock_resp
+
+        with patch("perplexity.result.codec.loads", wraps=codec.loads) as mock_loads:
+            stream = Client().search("slow consumer", stream="latest")
+            stream._results._thread.join(5)
+            results = list(stream)
+            assert mock_loads.call_count == 0
+
+        # The consumer only ever sees the newest snapshot
+        assert len(results) == 1
+        assert results[0]["blocks"][0]["markdown_block"]["answer"] == "x" * 500
+        assert stream.last is results[0]
+
+
+@pytest.mark.asyncio
+async def test_async_latest_stream_conflates() -> None:
+    gate = asyncio.Event()
+
+    async def chunks():
+        for i, chunk in enumerate(_growing_body(20, 10)):
+            if i == 1:
+                await gate.wait()
+            yield chunk
+
+    parser = ResponseParser(stream="latest")
+    stream = AsyncConflatingIterator(chunks(), parser)
+
+    first = await stream.__anext__()
+    assert first["blocks"][0]["markdown_block"]["answer"] == "x" * 10
+
+    gate.set()
+    rest = [snapshot async for snapshot in stream]
+    assert rest[-1]["blocks"][0]["markdown_block"]["answer"] == "x" * 200
+    assert parser.dropped + len(rest) == 19
+
+
+class _Connections:
+    """Counts streamed responses whose connection has not been released."""
+
+    def __init__(self) -> None:
+        self.open = 0
+
+
+class _FakeStreamResponse:
+    """Mimics a curl_cffi streamed response: the transfer stops once quit_now is set."""
+
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, pool: _Connections, chunks) -> None:
+        self.pool = pool
+        self.chunks = chunks
+        self.quit_now = threading.Event()
+        self.released = False
+        pool.open += 1
+
+    def _release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.pool.open -= 1
+
+    def iter_content(self):
+        for chunk in self.chunks:
+            if self.quit_now.is_set():
+                break
+            yield chunk
+        self._release()
+
+    def close(self) -> None:
+        self.quit_now.set()
+        self._release()
+
+
+class _FakeAsyncStreamResponse:
+    """Async counterpart: a background task performs the transfer, like AsyncSession."""
+
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, pool: _Connections, chunks) -> None:
+        self.pool = pool
+        self.quit_now = asyncio.Event()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        pool.open += 1
+        self.astream_task = asyncio.ensure_future(self._perform(chunks))
+
+    async def _perform(self, chunks) -> None:
+        try:
+            for chunk in chunks:
+                await asyncio.sleep(0.001)
+                if self.quit_now.is_set():
+                    break
+                await self.queue.put(chunk)
+        finally:
+            self.pool.open -= 1
+            await self.queue.put(None)
+
+    async def aiter_content(self):
+        while True:
+            chunk = await self.queue.get()
+            if chunk is None:
+                await self.aclose()
+                return
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.astream_task
+
+
+def _endless_body(events: int = 3, trailer: bool = True):
+    """An answer followed by keep-alive comments the server never stops sending."""
+    for chunk in _growing_body(events, 10):
+        if chunk.startswith(b"event: end_of_stream") and not trailer:
+            continue
+        yield chunk
+    while True:
+        time.sleep(0.0005)
+        yield b": keep-alive\n\n"
+
+
+def _sync_client(pool: _Connections, body_factory):
+    get_patch = patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True))
+    post_patch = patch(
+        "curl_cffi.requests.Session.post",
+        side_effect=lambda *args, **kwargs: _FakeStreamResponse(pool, body_factory()),
+    )
+    return get_patch, post_patch
+
+
+@pytest.mark.parametrize("stream_mode", [True, "delta", "latest"])
+def test_stream_context_manager_releases_connection_on_break(stream_mode) -> None:
+    pool = _Connections()
+    get_patch, post_patch = _sync_client(pool, lambda: _endless_body(trailer=False))
+    with get_patch, post_patch:
+        with Client().search("early exit", stream=stream_mode) as stream:
+            for _ in stream:
+                assert pool.open == 1
+                break
+        assert pool.open == 0
+        assert stream.closed
+
+
+def test_latest_stream_close_stops_reader_before_releasing_response() -> None:
+    pool = _Connections()
+    responses = []
+
+    class _TrackedResponse(_FakeStreamResponse):
+        reading = False
+
+        def iter_content(self):
+            self.reading = True
+            try:
+                yield from super().iter_content()
+            finally:
+                self.reading = False
+
+        def close(self) -> None:
+            # The response must not be closed while another thread reads it
+            assert not self.reading
+            super().close()
+
+    def post(*args, **kwargs):
+        responses.append(_TrackedResponse(pool, _endless_body(trailer=False)))
+        return responses[0]
+
+    get_patch = patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True))
+    with get_patch, patch("curl_cffi.requests.Session.post", side_effect=post):
+        stream = Client().search("mid-body", stream="latest")
+        next(stream)
+        reader = stream._results._thread
+        assert reader.is_alive()
+        stream.close()
+
+    assert not reader.is_alive()
+    assert responses[0].quit_now.is_set()
+    assert pool.open == 0
+
+
+def test_stream_releases_connection_after_final_event() -> None:
+    pool = _Connections()
+    get_patch, post_patch = _sync_client(pool, _endless_body)
+    with get_patch, post_patch:
+        snapshots = list(Client().search("complete", stream=True))
+    assert len(snapshots) == 3
+    assert pool.open == 0
+
+
+def test_stream_releases_connection_when_garbage_collected() -> None:
+    pool = _Connections()
+    get_patch, post_patch = _sync_client(pool, lambda: _endless_body(trailer=False))
+    with get_patch, post_patch:
+        stream = Client().search("abandoned", stream=True)
+        next(stream)
+        del stream
+        gc.collect()
+    assert pool.open == 0
+
+
+def test_blocking_search_releases_connection() -> None:
+    pool = _Connections()
+    get_patch, post_patch = _sync_client(pool, _endless_body)
+    with get_patch, post_patch:
+        result = Client().search("blocking")
+    assert result["blocks"][0]["markdown_block"]["answer"] == "x" * 30
+    assert pool.open == 0
+
+
+def _async_patches(pool: _Connections, body_factory):
+    async def post(*args, **kwargs):
+        return _FakeAsyncStreamResponse(pool, body_factory())
+
+    return (
+        patch("curl_cffi.requests.AsyncSession.get", AsyncMock(return_value=MagicMock())),
+        patch("curl_cffi.requests.AsyncSession.post", side_effect=post),
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream_mode", [True, "latest"])
+async def test_async_stream_context_manager_releases_connection(stream_mode) -> None:
+    pool = _Connections()
+    get_patch, post_patch = _async_patches(pool, lambda: _endless_body(trailer=False))
+    with get_patch, post_patch:
+        client = await AsyncClient()
+        async with await client.search("early exit", stream=stream_mode) as stream:
+            async for _ in stream:
+                assert pool.open == 1
+                break
+    assert pool.open == 0
+
+
+@pytest.mark.asyncio
+async def test_async_stream_cancellation_releases_connection() -> None:
+    pool = _Connections()
+    get_patch, post_patch = _async_patches(pool, lambda: _endless_body(trailer=False))
+    first = asyncio.Event()
+
+    async def consume(client) -> None:
+        async for _ in await client.search("cancelled", stream=True):
+            first.set()
+
+    with get_patch, post_patch:
+        client = await AsyncClient()
+        task = asyncio.ensure_future(consume(client))
+        await first.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        for _ in range(100):
+            if pool.open == 0:
+                break
+            await asyncio.sleep(0.001)
+    assert pool.open == 0
+
+
+@pytest.mark.asyncio
+async def test_async_blocking_search_releases_connection() -> None:
+    pool = _Connections()
+    get_patch, post_patch = _async_patches(pool, _endless_body)
+    with get_patch, post_patch:
+        client = await AsyncClient()
+        result = await client.search("blocking")
+    assert result["blocks"][0]["markdown_block"]["answer"] == "x" * 30
+    assert pool.open == 0
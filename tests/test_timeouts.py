@@ -0,0 +1,357 @@
+"""Tests for per-phase timeouts and deadlines."""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from curl_cffi import requests
+from curl_cffi.requests.exceptions import Timeout as CurlTimeout
+
+from perplexity import Timeouts
+from perplexity.client import Client
+from perplexity.config import CLOSE_TIMEOUT, ENDPOINT_UPLOAD_URL
+from perplexity.exceptions import NetworkError, RequestTimeoutError, ValidationError
+from perplexity.protocol import ResponseParser
+from perplexity.timeouts import TimeoutTracker
+from perplexity.transport import close_response
+
+EVENT = b'data: {"blocks": []}\r\n\r\n'
+KEEP_ALIVE = b": ping\r\n\r\n"
+END = b"event: end_of_stream\r\n\r\n"
+FAST = Timeouts(first_event=0.1, idle=0.2)
+
+
+def test_tracker_first_event_and_idle_limits(clock) -> None:
+    timer = TimeoutTracker(Timeouts(first_event=5, idle=2), clock=clock)
+    timer.start_stream()
+
+    clock.now += 4
+    timer.on_chunk(events=0)  # keep-alive within the first-event limit
+    clock.now += 1
+    with pytest.raises(RequestTimeoutError) as exc_info:
+        timer.on_chunk(events=0)
+    assert exc_info.value.phase == "first_event"
+    assert exc_info.value.timeout == 5
+
+    timer.on_chunk(events=1)  # a late event is still delivered
+    assert timer.wait_budget() == 2
+    clock.now += 2
+    with pytest.raises(RequestTimeoutError) as exc_info:
+        timer.on_chunk(events=0)
+    assert exc_info.value.phase == "idle"
+
+
+def test_tracker_deadline_bounds_request_timeouts(clock) -> None:
+    timer = TimeoutTracker(Timeouts(connect=10, idle=30), deadline=12, clock=clock)
+
+    assert timer.request_timeout(timer.timeouts.idle) == (10, 2)
+    clock.now += 11
+    connect, read = timer.stream_timeout()
+    assert connect + read == pytest.approx(1, abs=0.01)
+    assert timer.wait_budget() == 1
+
+    clock.now += 1
+    with pytest.raises(RequestTimeoutError) as exc_info:
+        timer.request_timeout(30)
+    assert exc_info.value.phase == "deadline"
+    assert isinstance(exc_info.value, NetworkError)
+    assert isinstance(exc_info.value, TimeoutError)
+
+
+def test_tracker_without_limits() -> None:
+    timer = TimeoutTracker(Timeouts(connect=None, first_event=None, idle=None))
+    timer.start_stream()
+    assert timer.request_timeout(None) is None
+    assert timer.wait_budget() is None
+
+
+def test_timeouts_validation() -> None:
+    with pytest.raises(ValidationError, match="idle"):
+        Timeouts(idle=0)
+    with pytest.raises(ValidationError, match="deadline"):
+        TimeoutTracker(deadline=-1)
+
+
+def test_parser_ignores_limits_after_end_of_stream(clock) -> None:
+    timer = TimeoutTracker(Timeouts(first_event=1), clock=clock)
+    timer.start_stream()
+    parser = ResponseParser(timer=timer)
+    clock.now += 5
+    parser.feed(EVENT + END)
+    parser.feed(KEEP_ALIVE)
+    assert parser.done
+
+
+def _stalling_body():
+    yield EVENT
+    while True:
+        time.sleep(0.02)
+        yield KEEP_ALIVE
+
+
+def _sync_patches(post):
+    return (
+        patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)),
+        patch("curl_cffi.requests.Session.post", post),
+    )
+
+
+def test_search_fails_when_stream_goes_idle() -> None:
+    resp = MagicMock(status_code=200)
+    resp.iter_content.side_effect = _stalling_body
+    post = MagicMock(return_value=resp)
+    get_patch, post_patch = _sync_patches(post)
+
+    with get_patch, post_patch:
+        cli = Client(timeouts=Timeouts(idle=0.1))
+        start = time.monotonic()
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            cli.search("stalls")
+
+    assert exc_info.value.phase == "idle"
+    assert time.monotonic() - start < 1
+    resp.close.assert_called_once()
+    # The ask request carries curl's (connect, read) timeout
+    assert post.call_args.kwargs["timeout"] == (10, 30)
+
+
+def test_search_stream_deadline() -> None:
+    def slow_events():
+        while True:
+            time.sleep(0.05)
+            yield EVENT
+
+    resp = MagicMock(status_code=200)
+    resp.iter_content.side_effect = slow_events
+    get_patch, post_patch = _sync_patches(MagicMock(return_value=resp))
+
+    with get_patch, post_patch:
+        stream = Client().search("endless", stream=True, deadline=0.2)
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            for _ in stream:
+                pass
+
+    assert exc_info.value.phase == "deadline"
+    assert stream.closed
+
+
+def test_curl_timeouts_are_translated() -> None:
+    resp = MagicMock(status_code=200)
+    resp.iter_content.side_effect = CurlTimeout("Operation too slow")
+    get_patch, post_patch = _sync_patches(MagicMock(return_value=resp))
+    with get_patch, post_patch:
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            Client().search("silent")
+    assert exc_info.value.phase == "first_event"
+
+    refused = CurlTimeout(
+        "Failed to perform, curl: (28) Connection timed out after 10001 milliseconds"
+    )
+    get_patch, post_patch = _sync_patches(MagicMock(side_effect=refused))
+    with get_patch, post_patch:
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            Client().search("unreachable")
+    assert exc_info.value.phase == "connect"
+
+    unanswered = CurlTimeout(
+        "Failed to perform, curl: (28) Operation timed out after 30001 milliseconds with 0 bytes received"
+    )
+    get_patch, post_patch = _sync_patches(MagicMock(side_effect=unanswered))
+    with get_patch, post_patch:
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            Client().search("unanswered")
+    assert exc_info.value.phase == "first_event"
+
+
+def _slow_storage(server: socket.socket) -> None:
+    """Accepts one upload and reads it 16 KiB at a time, then answers 204."""
+    conn, _ = server.accept()
+    with conn:
+        head = b""
+        while b"\r\n\r\n" not in head:
+            head += conn.recv(1)
+        headers = head.decode().lower()
+        length = int(headers.split("content-length:")[1].split("\r\n")[0])
+        if "100-continue" in headers:
+            conn.sendall(b"HTTP/1.1 100 Continue\r\n\r\n")
+        while length > 0:
+            length -= len(conn.recv(16384))
+            time.sleep(0.01)
+        conn.sendall(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+
+
+def test_slow_upload_is_not_cut_off_while_it_progresses() -> None:
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)  # keeps the upload slow
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    threading.Thread(target=_slow_storage, args=(server,), daemon=True).start()
+    bucket = "http://127.0.0.1:%d/" % server.getsockname()[1]
+    send = requests.Session.post
+
+    def post(session, url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            info = {"s3_bucket_url": bucket, "s3_object_url": "https://obj/big.bin"}
+            return MagicMock(status_code=200, content=json.dumps(info).encode())
+        if url == bucket:
+            return send(session, url, **kwargs)
+        resp = MagicMock(status_code=200)
+        resp.iter_content.return_value = [EVENT, END]
+        return resp
+
+    get_patch, post_patch = _sync_patches(post)
+    with get_patch, post_patch:
+        cli = Client({"cookie": "value"}, timeouts=Timeouts(connect=0.5, idle=0.5))
+        start = time.monotonic()
+        cli.search("q", files={"big.bin": b"x" * 2**20})
+    server.close()
+    # Far longer than the limit: only a stall of that long would fail the upload
+    assert time.monotonic() - start > 1.5
+
+
+class _SilentAsyncResponse:
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, events: int = 0) -> None:
+        self.events = events
+        self.aclose = AsyncMock()
+
+    async def aiter_content(self):
+        for _ in range(self.events):
+            yield EVENT
+        await asyncio.sleep(60)
+        yield END
+
+
+@pytest.mark.asyncio
+async def test_async_search_fails_fast_on_silent_stream(async_client) -> None:
+    resp = _SilentAsyncResponse()
+    client = await async_client(AsyncMock(return_value=resp), timeouts=FAST)
+
+    start = time.monotonic()
+    with pytest.raises(RequestTimeoutError) as exc_info:
+        await client.search("silent")
+    assert exc_info.value.phase == "first_event"
+    assert time.monotonic() - start < 1
+
+    client.session.post = AsyncMock(return_value=_SilentAsyncResponse(events=1))
+    stream = await client.search("silent after one event", stream=True)
+    received = []
+    with pytest.raises(RequestTimeoutError) as exc_info:
+        async for snapshot in stream:
+            received.append(snapshot)
+    assert exc_info.value.phase == "idle"
+    assert len(received) == 1
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_async_deadline_cancels_pending_request(async_client) -> None:
+    cancelled = asyncio.Event()
+
+    async def hanging_post(*args, **kwargs):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    client = await async_client(hanging_post, timeouts=FAST)
+    with pytest.raises(RequestTimeoutError) as exc_info:
+        await client.search("hangs", deadline=0.1)
+
+    assert exc_info.value.phase == "deadline"
+    assert cancelled.is_set()
+
+
+STEP_EVENT = b'data: {"text": "[{\\"step_type\\": \\"SEARCH_WEB\\"}]"}\r\n\r\n'
+
+
+def test_partial_ok_returns_latest_snapshot_at_deadline() -> None:
+    def slow_steps():
+        yield STEP_EVENT
+        while True:
+            time.sleep(0.05)
+            yield KEEP_ALIVE
+
+    resp = MagicMock(status_code=200)
+    resp.iter_content.side_effect = slow_steps
+    get_patch, post_patch = _sync_patches(MagicMock(return_value=resp))
+
+    with get_patch, post_patch:
+        result = Client().search("slow", deadline=0.2, partial_ok=True)
+
+    assert result.partial
+    assert result.steps == [{"step_type": "SEARCH_WEB"}]
+    assert 0.2 <= result.elapsed < 1
+    resp.close.assert_called_once()
+
+
+def test_partial_ok_validation_and_empty_stream() -> None:
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)):
+        cli = Client()
+    with pytest.raises(ValidationError, match="deadline"):
+        cli.search("no deadline", partial_ok=True)
+    with pytest.raises(ValidationError, match="blocking"):
+        cli.search("streamed", stream=True, deadline=1, partial_ok=True)
+
+    # Nothing to return if no snapshot arrived before the deadline
+    def keep_alives_only():
+        while True:
+            time.sleep(0.02)
+            yield KEEP_ALIVE
+
+    resp = MagicMock(status_code=200)
+    resp.iter_content.side_effect = keep_alives_only
+    get_patch, post_patch = _sync_patches(MagicMock(return_value=resp))
+    with get_patch, post_patch:
+        with pytest.raises(RequestTimeoutError) as exc_info:
+            Client().search("silent", deadline=0.1, partial_ok=True)
+    assert exc_info.value.phase == "deadline"
+
+
+@pytest.mark.asyncio
+async def test_async_partial_ok_cancels_transfer(async_client) -> None:
+    resp = _SilentAsyncResponse(events=1)
+    resp.quit_now = MagicMock()
+    # curl only notices the abort once more bytes arrive, which a stalled upstream never sends
+    resp.astream_task = asyncio.ensure_future(asyncio.sleep(60))
+
+    async def wait_for_transfer():
+        await resp.astream_task
+
+    resp.aclose = AsyncMock(side_effect=wait_for_transfer)
+    client = await async_client(AsyncMock(return_value=resp), timeouts=FAST)
+    client.timeouts = Timeouts()
+
+    start = time.monotonic()
+    result = await client.search("slow", deadline=0.1, partial_ok=True)
+
+    assert result.partial
+    assert result.elapsed >= 0.1
+    assert time.monotonic() - start < CLOSE_TIMEOUT + 1
+    assert resp.quit_now.set.called
+    resp.aclose.assert_awaited_once()
+    # The stalled transfer was torn down before the partial result was returned
+    assert resp.astream_task.cancelled()
+
+
+def test_close_response_does_not_block_on_stalled_transfer() -> None:
+    resp = MagicMock()
+    resp.stream_task = Future()
+
+    start = time.monotonic()
+    close_response(resp, timeout=0.05)
+    assert time.monotonic() - start < 0.5
+    resp.quit_now.set.assert_called_once()
+    resp.close.assert_not_called()
+
+    # Once curl gives up on the transfer, the response is closed in the background
+    resp.stream_task.set_result(None)
+    resp.close.assert_called_once()
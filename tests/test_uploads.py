@@ -0,0 +1,324 @@
+"""Tests for attachment uploads."""
+
+import asyncio
+import codecs
+import io
+import json
+import mmap
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from curl_cffi import requests
+
+from perplexity import Hooks
+from perplexity.cache import upload_key
+from perplexity.client import Client
+from perplexity.config import ENDPOINT_UPLOAD_URL
+from perplexity.exceptions import FileUploadError, ValidationError
+from perplexity.optimize import UploadOptimizer
+from perplexity.protocol import FileUpload, HTTPRequest, MultipartBody
+from perplexity.transport import request_kwargs
+from perplexity.utils import validate_file_data
+
+from tests.conftest import AsyncAnswer
+
+ANSWER = b'data: {"status": "COMPLETED", "text": "[]"}\r\n\r\nevent: end_of_stream\r\n\r\n'
+COOKIES = {"cookie": "value"}
+FILES = {f"{name}.txt": name.encode() for name in ("a", "b", "c", "d")}
+
+
+def _upload_info(kwargs) -> MagicMock:
+    filename = json.loads(kwargs["data"])["filename"]
+    info = {
+        "s3_bucket_url": f"https://bucket/{filename}",
+        "s3_object_url": f"https://obj/{filename}",
+    }
+    return MagicMock(status_code=200, content=json.dumps(info).encode())
+
+
+def _answer() -> MagicMock:
+    resp = MagicMock(status_code=200, headers={})
+    resp.iter_content.return_value = [ANSWER]
+    return resp
+
+
+def _attachments(post) -> list:
+    ask = next(
+        call
+        for call in post.call_args_list
+        if call.args[0] != ENDPOINT_UPLOAD_URL and "bucket" not in call.args[0]
+    )
+    return json.loads(ask.kwargs["data"])["params"]["attachments"]
+
+
+def test_files_on_disk_are_streamed(tmp_path) -> None:
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF" * 1000)
+
+    from_path = FileUpload("report.pdf", path)
+    with open(path, "rb") as f:
+        from_file = FileUpload("report.pdf", f)
+    assert from_path.path == from_file.path == str(path) and from_path.data is None
+    assert from_path.size == from_file.size == 4000
+    assert upload_key(from_path) == upload_key(FileUpload("report.pdf", b"%PDF" * 1000))
+
+    with patch("perplexity.transport.CurlMime") as mime:
+        request_kwargs(MagicMock(multipart=MagicMock(fields={}, upload=from_path)))
+    assert mime.return_value.addpart.call_args.kwargs["local_path"] == str(path)
+
+
+def test_file_objects_and_buffers_are_sized_by_length(tmp_path) -> None:
+    with open(tmp_path / "notes.txt", "wb+") as f:
+        f.write(b"x" * 10)
+        f.seek(4)  # partly read: only the rest is uploaded
+        assert FileUpload("notes.txt", f).data == b"x" * 6
+        f.flush()
+        with mmap.mmap(f.fileno(), 0) as mapped:
+            upload = FileUpload("notes.txt", mapped)
+            assert upload.size == 10 and upload.path is None
+            assert upload_key(upload) == upload_key(FileUpload("notes.txt", b"x" * 10))
+
+    assert FileUpload("a.bin", io.BytesIO(b"abc")).size == 3
+    assert FileUpload("a.bin", memoryview(b"abcd")).size == 4
+
+
+@pytest.mark.parametrize("wrap", [bytearray, memoryview])
+def test_buffers_are_sent_without_a_python_copy(wrap) -> None:
+    received = []
+
+    class Storage(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            received.append(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Storage)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    url = "http://127.0.0.1:%d/" % server.server_port
+    upload = FileUpload("big.bin", wrap(b"x" * 2**22))
+
+    tracemalloc.start()
+    try:
+        kwargs = request_kwargs(HTTPRequest("POST", url, multipart=MultipartBody({}, upload)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 2**20  # libcurl's copy of the 4 MiB buffer is the only one
+
+    assert requests.Session().post(url, **kwargs).status_code == 204
+    server.server_close()
+    assert b'filename="big.bin"' in received[0] and b"x" * 2**22 in received[0]
+
+
+def test_file_data_validation(tmp_path) -> None:
+    (tmp_path / "a.pdf").write_bytes(b"")
+    files = {"a": tmp_path / "a.pdf", "b": io.BytesIO(), "c": bytearray(), "d": memoryview(b"")}
+    validate_file_data(files)
+    with pytest.raises(ValidationError, match="No file to upload"):
+        validate_file_data({"a.pdf": tmp_path})
+    with pytest.raises(ValidationError, match="binary mode"):
+        validate_file_data({"a.txt": io.StringIO("text")})
+    with pytest.raises(ValidationError, match="contiguous"):
+        validate_file_data({"a.bin": memoryview(b"abcd")[::2]})
+    with pytest.raises(ValidationError, match="File data must be"):
+        validate_file_data({"a.bin": 12345})
+
+
+def test_uploads_run_concurrently_and_keep_their_order() -> None:
+    barrier = threading.Barrier(3, timeout=2)
+
+    def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            return _upload_info(kwargs)
+        if url.startswith("https://bucket/"):
+            if not url.endswith("d.txt"):
+                barrier.wait()  # only passes once three uploads are in flight
+            return MagicMock(status_code=204, content=b"")
+        return _answer()
+
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", MagicMock(side_effect=post)
+    ) as mock_post:
+        client = Client({"cookie": "value"}, upload_concurrency=3)
+        client.search("q", files=FILES)
+
+    assert _attachments(mock_post) == [f"https://obj/{name}" for name in FILES]
+
+    with pytest.raises(ValidationError):
+        Client(upload_concurrency=0)
+
+
+def test_a_failed_upload_fails_the_search_at_once() -> None:
+    started = []
+    stored = []
+    release = threading.Event()
+
+    def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            filename = json.loads(kwargs["data"])["filename"]
+            started.append(filename)
+            if filename == "a.txt":
+                return MagicMock(status_code=500, content=b"")
+            release.wait(2)
+            return _upload_info(kwargs)
+        stored.append(url)
+        return MagicMock(status_code=204, content=b"")
+
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", MagicMock(side_effect=post)
+    ):
+        client = Client({"cookie": "value"}, upload_concurrency=2)
+        try:
+            with pytest.raises(FileUploadError):
+                client.search("q", files=FILES)  # without waiting for "b.txt"
+            assert "d.txt" not in started
+        finally:
+            release.set()
+        for thread in threading.enumerate():
+            if thread.name.startswith("perplexity-upload"):
+                thread.join(2)
+    assert stored == []  # "b.txt" stopped before sending its file
+
+
+@pytest.mark.asyncio
+async def test_async_uploads_are_gathered_in_order(async_client) -> None:
+    in_flight = []
+    peak = []
+
+    async def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            return _upload_info(kwargs)
+        if url.startswith("https://bucket/"):
+            in_flight.append(url)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(url)
+            return MagicMock(status_code=204, aclose=AsyncMock())
+        return AsyncAnswer(ANSWER)
+
+    client = await async_client(AsyncMock(side_effect=post), COOKIES, upload_concurrency=2)
+    await client.search("q", files=FILES)
+
+    assert max(peak) == 2
+    assert _attachments(client.session.post) == [f"https://obj/{name}" for name in FILES]
+
+
+@pytest.mark.asyncio
+async def test_async_failed_upload_cancels_the_others(async_client) -> None:
+    cancelled = []
+
+    async def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            if json.loads(kwargs["data"])["filename"] == "a.txt":
+                await asyncio.sleep(0.01)
+                return MagicMock(status_code=500, content=b"")
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(url)
+                raise
+        return MagicMock(status_code=204, aclose=AsyncMock())
+
+    client = await async_client(AsyncMock(side_effect=post), COOKIES)
+    with pytest.raises(FileUploadError):
+        await asyncio.wait_for(client.search("q", files=FILES), 2)
+    await asyncio.sleep(0)
+    assert len(cancelled) == 3
+
+
+def test_optimizer_normalises_text_encodings(tmp_path) -> None:
+    optimizer = UploadOptimizer(min_bytes=1)
+    text = "Café menu\n" * 100
+    path = tmp_path / "menu.txt"
+    path.write_bytes(text.encode("utf-16"))
+
+    optimized = optimizer.optimize(FileUpload("menu.txt", path))
+    assert optimized.filename == "menu.txt"
+    assert optimized.data == ("Café menu\n" * 100).encode("utf-8")
+
+    for unchanged in (
+        FileUpload("menu.txt", "already text"),
+        FileUpload("menu.txt", b"plain utf-8"),
+        FileUpload("menu.txt", "Café".encode("latin-1")),  # unknown encoding
+        FileUpload("data.bin", text.encode("utf-16")),
+    ):
+        assert optimizer.optimize(unchanged) is unchanged
+    small = FileUpload("menu.txt", codecs.BOM_UTF8 + b"x")
+    assert optimizer.optimize(small).data == b"x"
+    assert UploadOptimizer(min_bytes=8).optimize(small) is small
+
+    with pytest.raises(ValidationError):
+        UploadOptimizer(quality=100)
+
+
+def test_optimizer_shrinks_images() -> None:
+    Image = pytest.importorskip("PIL.Image")
+    original = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    Image.new("RGB", (3000, 1500), "red").save(original, "JPEG", quality=100, exif=exif)
+    upload = FileUpload("photo.jpg", original.getvalue())
+
+    optimized = UploadOptimizer(max_dimension=1000).optimize(upload)
+    assert optimized.size < upload.size
+    with Image.open(io.BytesIO(optimized.data)) as image:
+        assert image.size == (1000, 500)
+        assert not image.getexif()
+
+
+def test_client_reports_bytes_saved() -> None:
+    saved = []
+
+    def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            assert json.loads(kwargs["data"])["file_size"] == 4
+            return _upload_info(kwargs)
+        if url.startswith("https://bucket/"):
+            assert kwargs["multipart"] is not None
+            return MagicMock(status_code=204, content=b"")
+        return _answer()
+
+    hooks = Hooks()
+    hooks.on("upload", lambda event, data: saved.append(data["saved"]))
+    with patch("curl_cffi.requests.Session.get", return_value=MagicMock(ok=True)), patch(
+        "curl_cffi.requests.Session.post", MagicMock(side_effect=post)
+    ):
+        optimizer = UploadOptimizer(min_bytes=1)
+        client = Client({"cookie": "value"}, hooks=hooks, upload_optimizer=optimizer)
+        client.search("q", files={"a.txt": codecs.BOM_UTF16_LE + "text".encode("utf-16-le")})
+    assert saved == [6]
+
+
+@pytest.mark.asyncio
+async def test_async_client_optimises_on_the_worker_pool(async_client) -> None:
+    threads = []
+    optimizer = UploadOptimizer(min_bytes=1)
+    optimize = optimizer.optimize
+
+    def spy(upload):
+        threads.append(threading.current_thread().name)
+        return optimize(upload)
+
+    async def post(url, **kwargs):
+        if url == ENDPOINT_UPLOAD_URL:
+            return _upload_info(kwargs)
+        if url.startswith("https://bucket/"):
+            return MagicMock(status_code=204, aclose=AsyncMock())
+        return AsyncAnswer(ANSWER)
+
+    with patch.object(optimizer, "optimize", spy):
+        client = await async_client(
+            AsyncMock(side_effect=post), COOKIES, upload_optimizer=optimizer
+        )
+        await client.search("q", files={"a.txt": "text".encode("utf-16")})
+    optimizer.close()
+    assert threads and threads[0].startswith("perplexity-optimize")